@@ -1,4 +1,5 @@
 import axios from 'axios';
+import Dish from '../models/Dish.js';
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001';
 
@@ -126,6 +127,30 @@ export const forecastCanteenDemand = async (req, res) => {
   }
 };
 
+export const forecastBatchDemand = async (req, res) => {
+  try {
+    const { canteenIds, days = 7 } = req.body;
+
+    const response = await axios.post(
+      `${ML_SERVICE_URL}/api/forecast/batch`,
+      {
+        canteen_ids: canteenIds,
+        days_ahead: parseInt(days)
+      },
+      { timeout: 10000 }
+    );
+
+    res.json(response.data);
+  } catch (error) {
+    console.error('Error forecasting batch demand:', error.message);
+    res.status(500).json({
+      success: false,
+      error: 'Failed to forecast demand',
+      message: error.message
+    });
+  }
+};
+
 // ==================== SENTIMENT ANALYSIS METHODS ====================
 
 export const analyzeSentiment = async (req, res) => {
@@ -185,18 +210,55 @@ export const analyzeBatchSentiment = async (req, res) => {
 export const getDishSentimentSummary = async (req, res) => {
   try {
     const { dishId } = req.params;
+    const { timeWindow } = req.query;
 
-    // Get reviews for this dish from DB and analyze them
-    res.json({
-      success: true,
-      sentiment: 'neutral',
-      message: 'Dish sentiment feature coming soon - analyze reviews in batch'
-    });
+    const dish = await Dish.findById(dishId).select('canteen');
+    if (!dish) {
+      return res.status(404).json({
+        success: false,
+        error: 'Dish not found'
+      });
+    }
+
+    const response = await axios.get(
+      `${ML_SERVICE_URL}/api/sentiment/dishes/${dish.canteen}/${dishId}`,
+      {
+        params: { time_window: timeWindow },
+        timeout: 5000
+      }
+    );
+
+    res.json(response.data);
   } catch (error) {
     console.error('Error getting dish sentiment summary:', error.message);
     res.status(500).json({
       success: false,
-      error: 'Failed to get sentiment summary'
+      error: 'Failed to get sentiment summary',
+      message: error.message
+    });
+  }
+};
+
+export const getCanteenDishRankings = async (req, res) => {
+  try {
+    const { canteenId } = req.params;
+    const { limit = 5, minReviews = 3 } = req.query;
+
+    const response = await axios.get(
+      `${ML_SERVICE_URL}/api/sentiment/dishes/${canteenId}`,
+      {
+        params: { limit, min_reviews: minReviews },
+        timeout: 5000
+      }
+    );
+
+    res.json(response.data);
+  } catch (error) {
+    console.error('Error getting dish rankings:', error.message);
+    res.status(500).json({
+      success: false,
+      error: 'Failed to get dish rankings',
+      message: error.message
     });
   }
 };
@@ -237,7 +299,8 @@ export const trainRecommendationModel = async (req, res) => {
       { timeout: 30000 }
     );
 
-    res.json(response.data);
+    // 202 with a job id; poll /api/ml/jobs/:jobId for the result
+    res.status(response.status).json(response.data);
   } catch (error) {
     console.error('Error training recommendation model:', error.message);
     res.status(500).json({
@@ -257,7 +320,7 @@ export const trainForecastingModel = async (req, res) => {
       { timeout: 30000 }
     );
 
-    res.json(response.data);
+    res.status(response.status).json(response.data);
   } catch (error) {
     console.error('Error training forecasting model:', error.message);
     res.status(500).json({
@@ -267,6 +330,26 @@ export const trainForecastingModel = async (req, res) => {
   }
 };
 
+export const getTrainingJob = async (req, res) => {
+  try {
+    const { jobId } = req.params;
+
+    const response = await axios.get(
+      `${ML_SERVICE_URL}/api/jobs/${encodeURIComponent(jobId)}`,
+      { timeout: 5000 }
+    );
+
+    res.json(response.data);
+  } catch (error) {
+    console.error('Error fetching training job:', error.message);
+    const status = error.response?.status === 404 ? 404 : 500;
+    res.status(status).json({
+      success: false,
+      error: status === 404 ? 'Job not found' : 'Failed to fetch training job'
+    });
+  }
+};
+
 // ==================== HEALTH CHECK ====================
 
 export const checkMLServiceHealth = async (req, res) => {
@@ -3,6 +3,7 @@ import Canteen from "../models/Canteen.js"
 import Dish from "../models/Dish.js"
 import Order from "../models/Order.js"
 import axios from 'axios'
+import mongoose from "mongoose"
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001'
 
@@ -25,13 +26,18 @@ export const createReview = async (req, res) => {
       }
     }
 
-    // Analyze sentiment using ML service
+    // Analyze sentiment using ML service; with the review's id and canteen it
+    // also counts towards the canteen's and dish's sentiment insights (once per review)
+    const reviewId = new mongoose.Types.ObjectId()
     let sentimentData = null
     if (comment) {
       try {
+        // A dish review's canteen is the dish's
+        const dish = !canteenId && dishId ? await Dish.findById(dishId).select("canteen") : null
+        const sentimentCanteenId = canteenId || (dish ? dish.canteen.toString() : null)
         const sentimentResponse = await axios.post(
           `${ML_SERVICE_URL}/api/sentiment/analyze`,
-          { text: comment },
+          { text: comment, review_id: reviewId.toString(), canteen_id: sentimentCanteenId, dish_id: dishId || null },
           { timeout: 5000 }
         )
         if (sentimentResponse.data.success) {
@@ -43,6 +49,7 @@ export const createReview = async (req, res) => {
     }
 
     const review = await Review.create({
+      _id: reviewId,
       reviewer: req.user.id,
       canteen: canteenId || null,
       dish: dishId || null,
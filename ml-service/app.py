@@ -3,10 +3,9 @@ from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 
-# Import ML modules
-from services.recommendations import RecommendationService
-from services.forecasting import ForecastingService
-from services.sentiment import SentimentService
+# ML modules (and the numeric libraries behind them) are imported by the registry
+from services.registry import LazyService, ServiceRegistry, ModelWatcher
+from services.jobs import JobManager
 
 load_dotenv()
 
@@ -16,16 +15,57 @@ app = Flask(__name__)
 allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:5000').split(',')
 CORS(app, origins=allowed_origins, supports_credentials=True)
 
-# Initialize services
-recommendation_service = RecommendationService()
-forecasting_service = ForecastingService()
-sentiment_service = SentimentService()
+# Initialize services: built on first use or by the warm-up thread (ML_WARMUP)
+service_registry = ServiceRegistry()
+# Recommendations are re-ranked with the sentiment service's per-dish scores
+recommendation_service = service_registry.register(
+    'recommendations', 'services.recommendations', 'RecommendationService',
+    sentiment=LazyService(service_registry, 'sentiment')
+)
+forecasting_service = service_registry.register('forecasting', 'services.forecasting', 'ForecastingService')
+sentiment_service = service_registry.register('sentiment', 'services.sentiment', 'SentimentService')
+job_manager = JobManager()
+model_watcher = ModelWatcher(service_registry)
+# Not in training worker processes, which import this module as __mp_main__
+# when the service is started with `python app.py`
+if __name__ != '__mp_main__':
+    service_registry.start_warmup()
+    # Reload models that other gunicorn workers train (ML_RELOAD_INTERVAL)
+    model_watcher.start()
+
+def _flag(value):
+    """Boolean option from JSON (true/false) or a query string ('true', '0', ...)"""
+    return str(value).lower() in ('true', '1')
+
+def _run_in_background(options):
+    """Train endpoints queue a background job unless the caller passes wait=true"""
+    return not _flag(options.get('wait', False))
+
+def _job_accepted(job, message):
+    """202 response for a queued training job"""
+    return jsonify({
+        "success": True,
+        "message": message,
+        "job": job,
+        "status_url": f"/api/jobs/{job['job_id']}"
+    }), 202
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "service": "ml-service"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once every service has loaded its libraries and models, else 503 with per-service states"""
+    ready = service_registry.is_ready()
+    return jsonify({
+        "status": "ready" if ready else "loading",
+        "warmup_mode": service_registry.mode,
+        "services": service_registry.status(),
+        "model_reload": model_watcher.status()
+    }), 200 if ready else 503
+
 # ============= RECOMMENDATION ENDPOINTS =============
 
 @app.route('/api/recommendations/user/<user_id>', methods=['GET'])
@@ -34,11 +74,14 @@ def get_user_recommendations(user_id):
     try:
         limit = request.args.get('limit', 10, type=int)
         canteen_id = request.args.get('canteen_id')
+        # Optional override of the sentiment re-ranking weight (0 disables it)
+        sentiment_weight = request.args.get('sentiment_weight', type=float)
         
         recommendations = recommendation_service.get_recommendations(
             user_id=user_id,
             limit=limit,
-            canteen_id=canteen_id
+            canteen_id=canteen_id,
+            sentiment_weight=sentiment_weight
         )
         
         return jsonify({
@@ -50,13 +93,50 @@ def get_user_recommendations(user_id):
 
 @app.route('/api/recommendations/train', methods=['POST'])
 def train_recommendation_model():
-    """Train/retrain the recommendation model"""
+    """
+    Train/retrain the recommendation model
+    
+    Accepts either a JSON body {"orders": [...]} or an NDJSON stream
+    (Content-Type: application/x-ndjson, optionally gzip-compressed) with
+    one order per line; training options then come from the query string.
+    
+    Training runs as a background job: the response (202) carries the job
+    id to poll at /api/jobs/<job_id>. Pass wait=true to train inline.
+    
+    Each canteen in the orders gets its own model; train_global=false skips
+    the global fallback model, canteen_id trains only that canteen's model.
+    """
     try:
-        data = request.json
-        orders_data = data.get('orders', [])
+        from services.ingestion import is_ndjson_request, read_order_stream
+        streamed = is_ndjson_request(request)
+        data = request.args if streamed else request.json
         
-        result = recommendation_service.train_model(orders_data)
+        # Optional association rule thresholds
+        rule_params = {
+            key: float(data[key]) if key != 'max_rules_per_item' else int(data[key])
+            for key in ('min_support', 'min_confidence', 'min_lift', 'max_rules_per_item')
+            if key in data
+        }
+        half_life_days = data.get('half_life_days')
+        train_params = dict(
+            basket_mode=data.get('basket_mode', 'user'),
+            half_life_days=float(half_life_days) if half_life_days else None,
+            canteen_id=data.get('canteen_id'),
+            train_global=_flag(data.get('train_global', True)),
+            **rule_params
+        )
+        
+        if streamed:
+            interactions_df, _ = read_order_stream(request.stream, request.headers.get('Content-Encoding'))
+            train, training_data = recommendation_service.train_from_interactions, interactions_df
+        else:
+            train, training_data = recommendation_service.train_model, data.get('orders', [])
+        
+        if _run_in_background(data):
+            job = job_manager.submit('recommendations.train', train, training_data, params=train_params, **train_params)
+            return _job_accepted(job, "Recommendation training queued")
         
+        result = train(training_data, **train_params)
         return jsonify({
             "success": True,
             "message": "Model trained successfully",
@@ -65,6 +145,28 @@ def train_recommendation_model():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/recommendations/update', methods=['POST'])
+def update_recommendation_model():
+    """Fold orders placed since the last training into the recommendation models (JSON or NDJSON)"""
+    try:
+        from services.ingestion import is_ndjson_request, read_order_stream
+        streamed = is_ndjson_request(request)
+        data = request.args if streamed else request.json
+        partition = dict(canteen_id=data.get('canteen_id'), train_global=_flag(data.get('train_global', True)))
+        if streamed:
+            interactions_df, orders_count = read_order_stream(request.stream, request.headers.get('Content-Encoding'))
+            result = recommendation_service.update_from_interactions(interactions_df, orders_count, **partition)
+        else:
+            result = recommendation_service.update_model(data.get('orders', []), **partition)
+        
+        return jsonify({
+            "success": True,
+            "message": "Model updated successfully",
+            "metrics": result
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 # ============= FORECASTING ENDPOINTS =============
 
 @app.route('/api/forecast/demand', methods=['POST'])
@@ -77,6 +179,23 @@ def forecast_demand():
         days_ahead = data.get('days_ahead', 7)
         historical_data = data.get('historical_data', [])
         
+        # Canteens that already have models answer from them while a
+        # background job refits on changed history (one job per canteen);
+        # unchanged history needs no job at all
+        if historical_data and len(historical_data) >= 14 and forecasting_service.has_models(canteen_id):
+            from services.forecasting import history_frame
+            history = history_frame(historical_data)
+            if forecasting_service.history_changed(canteen_id, history):
+                job_manager.submit(
+                    'forecast.train',
+                    forecasting_service.train_from_frame,
+                    canteen_id,
+                    history,
+                    dedupe_key=('forecast.train', canteen_id),
+                    params={"canteen_id": canteen_id}
+                )
+            historical_data = None
+        
         forecast = forecasting_service.predict_demand(
             canteen_id=canteen_id,
             dish_id=dish_id,
@@ -91,16 +210,54 @@ def forecast_demand():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/forecast/batch', methods=['POST'])
+def forecast_batch():
+    """
+    Forecast every dish of one or more canteens in one vectorized pass
+    
+    Body: {"canteen_ids": [...]} (or "canteen_id"), "days_ahead": 7.
+    Returns columnar arrays with one row per dish.
+    """
+    try:
+        data = request.json
+        canteen_ids = data.get('canteen_ids') or [data.get('canteen_id')]
+        days_ahead = int(data.get('days_ahead', 7))
+        
+        forecast = forecasting_service.predict_batch(canteen_ids, days_ahead=days_ahead)
+        
+        return jsonify({
+            "success": True,
+            "forecast": forecast
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/forecast/train', methods=['POST'])
 def train_forecast_model():
-    """Train/retrain the forecasting model"""
+    """
+    Train/retrain the forecasting model
+    
+    Accepts a JSON body or an NDJSON stream of history rows with
+    canteen_id in the query string. Runs as a background job like
+    /api/recommendations/train (wait=true trains inline).
+    """
     try:
-        data = request.json
-        canteen_id = data.get('canteen_id')
-        historical_data = data.get('historical_data', [])
+        from services.ingestion import is_ndjson_request, read_history_stream
+        if is_ndjson_request(request):
+            options = request.args
+            history = read_history_stream(request.stream, request.headers.get('Content-Encoding'))
+            train = forecasting_service.train_from_frame
+        else:
+            options = request.json
+            history = options.get('historical_data', [])
+            train = forecasting_service.train_model
+        canteen_id = options.get('canteen_id')
         
-        result = forecasting_service.train_model(canteen_id, historical_data)
+        if _run_in_background(options):
+            job = job_manager.submit('forecast.train', train, canteen_id, history, params={"canteen_id": canteen_id})
+            return _job_accepted(job, "Forecasting training queued")
         
+        result = train(canteen_id, history)
         return jsonify({
             "success": True,
             "message": "Forecasting model trained successfully",
@@ -109,11 +266,55 @@ def train_forecast_model():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/forecast/stats', methods=['GET'])
+def get_forecast_stats():
+    """Forecasting model counts, model reuse (fingerprint hit/miss) and prediction cache metrics"""
+    try:
+        return jsonify({
+            "success": True,
+            "stats": forecasting_service.get_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============= TRAINING JOB ENDPOINTS =============
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress, timing and (once finished) result of a training job"""
+    try:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "job": job
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Most recent training jobs, optionally filtered by ?kind="""
+    try:
+        jobs = job_manager.list_jobs(
+            kind=request.args.get('kind'),
+            limit=request.args.get('limit', 20, type=int)
+        )
+        
+        return jsonify({
+            "success": True,
+            "jobs": jobs
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 # ============= SENTIMENT ANALYSIS ENDPOINTS =============
 
 @app.route('/api/sentiment/analyze', methods=['POST'])
 def analyze_sentiment():
-    """Analyze sentiment of review text"""
+    """Analyze sentiment of review text (added to canteen insights when canteen_id is given)"""
     try:
         data = request.json
         text = data.get('text', '')
@@ -122,6 +323,9 @@ def analyze_sentiment():
             return jsonify({"success": False, "error": "Text is required"}), 400
         
         result = sentiment_service.analyze(text)
+        if data.get('canteen_id'):
+            # review_id, dish_id and created_at are optional
+            sentiment_service.record_reviews([data], [result])
         
         return jsonify({
             "success": True,
@@ -151,14 +355,84 @@ def analyze_sentiment_batch():
 
 @app.route('/api/sentiment/insights/<canteen_id>', methods=['GET'])
 def get_sentiment_insights(canteen_id):
-    """Get sentiment insights for a canteen"""
+    """Get sentiment insights for a canteen (plus totals over ?time_window=30d)"""
     try:
-        insights = sentiment_service.get_insights(canteen_id)
+        insights = sentiment_service.get_insights(canteen_id, time_window=request.args.get('time_window'))
         
         return jsonify({
             "success": True,
             "insights": insights
         }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/sentiment/dishes/<canteen_id>', methods=['GET'])
+def get_dish_rankings(canteen_id):
+    """Best and worst reviewed dishes of a canteen (?limit=5, ?min_reviews=3)"""
+    try:
+        rankings = sentiment_service.get_dish_rankings(
+            canteen_id,
+            limit=int(request.args.get('limit', 5)),
+            min_reviews=int(request.args.get('min_reviews', 3))
+        )
+
+        return jsonify({
+            "success": True,
+            "rankings": rankings
+        }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/sentiment/dishes/<canteen_id>/<dish_id>', methods=['GET'])
+def get_dish_sentiment_insights(canteen_id, dish_id):
+    """Get sentiment insights for one dish of a canteen (plus totals over ?time_window=30d)"""
+    try:
+        insights = sentiment_service.get_insights(
+            canteen_id, time_window=request.args.get('time_window'), dish_id=dish_id
+        )
+
+        return jsonify({
+            "success": True,
+            "insights": insights
+        }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/sentiment/trend/<canteen_id>', methods=['GET'])
+def get_sentiment_trend(canteen_id):
+    """Daily or weekly sentiment of a canteen (or ?dish_id=) between ?start= and ?end= (YYYY-MM-DD)"""
+    try:
+        trend = sentiment_service.get_trend(
+            canteen_id,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            granularity=request.args.get('granularity', 'day'),
+            dish_id=request.args.get('dish_id')
+        )
+        
+        return jsonify({
+            "success": True,
+            "trend": trend
+        }), 200
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/sentiment/stats', methods=['GET'])
+def get_sentiment_stats():
+    """Sentiment result cache metrics (size, hit rate, persistence)"""
+    try:
+        return jsonify({
+            "success": True,
+            "stats": sentiment_service.get_stats()
+        }), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
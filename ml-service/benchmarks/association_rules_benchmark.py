@@ -0,0 +1,99 @@
+"""
+Association rule mining benchmark
+
+Compares the sparse co-occurrence miner in RecommendationService against the
+previous nested-loop pair counter on synthetic order logs, and checks that
+both produce the same rule confidences.
+
+Usage (from ml-service/):
+    python benchmarks/association_rules_benchmark.py
+    python benchmarks/association_rules_benchmark.py --orders 10000 100000 --items 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict, Counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recommendations import RecommendationService
+
+
+def synthetic_interactions(n_orders, n_users, n_items, rng):
+    """Flattened (user_id, dish_id, quantity, order_id) rows with Zipf-like dish popularity"""
+    basket_sizes = rng.integers(1, 5, size=n_orders)
+    users = np.repeat(rng.integers(0, n_users, size=n_orders), basket_sizes)
+    orders = np.repeat(np.arange(n_orders), basket_sizes)
+    weights = 1 / np.arange(1, n_items + 1)
+    dishes = rng.choice(n_items, size=basket_sizes.sum(), p=weights / weights.sum())
+    return pd.DataFrame({
+        'user_id': [f"user_{u}" for u in users],
+        'dish_id': [f"dish_{d:04d}" for d in dishes],
+        'quantity': 1,
+        'order_id': orders
+    })
+
+
+def legacy_mine(interactions_df, min_support=3):
+    """The previous implementation: Python loops over every basket pair"""
+    association_rules = {}
+    baskets = interactions_df.groupby('user_id')['dish_id'].apply(list).tolist()
+    pair_counts = defaultdict(int)
+    item_counts = Counter()
+    for basket in baskets:
+        unique_items = list(set(basket))
+        item_counts.update(unique_items)
+        for i, item1 in enumerate(unique_items):
+            for item2 in unique_items[i+1:]:
+                pair = tuple(sorted([item1, item2]))
+                pair_counts[pair] += 1
+    for (item1, item2), count in pair_counts.items():
+        if count >= min_support:
+            association_rules.setdefault(item1, []).append((item2, count / item_counts[item1]))
+            association_rules.setdefault(item2, []).append((item1, count / item_counts[item2]))
+    for item in association_rules:
+        association_rules[item].sort(key=lambda x: x[1], reverse=True)
+    return association_rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    service = RecommendationService(model_path=os.path.join(tempfile.mkdtemp(), 'model.pkl'))
+    print(f"{'orders':>8} {'legacy s':>10} {'sparse s':>10} {'speedup':>8} {'rules match':>12}")
+
+    for n_orders in args.orders:
+        interactions_df = synthetic_interactions(n_orders, args.users, args.items, rng)
+        item_codes, item_ids = pd.factorize(interactions_df['dish_id'], sort=True)
+        interactions_df['item_code'] = item_codes
+        service.item_ids = list(item_ids)
+
+        started = time.perf_counter()
+        legacy_rules = legacy_mine(interactions_df)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        service._mine_association_rules(interactions_df, max_rules_per_item=len(item_ids))
+        sparse_seconds = time.perf_counter() - started
+
+        match = legacy_rules.keys() == service.association_rules.keys() and all(
+            sorted((dish, round(conf, 6)) for dish, conf in legacy_rules[item])
+            == sorted((dish, round(conf, 6)) for dish, conf in service.association_rules[item])
+            for item in legacy_rules
+        )
+        print(f"{n_orders:>8} {legacy_seconds:>10.3f} {sparse_seconds:>10.3f} "
+              f"{legacy_seconds / sparse_seconds:>7.1f}x {str(match):>12}")
+
+
+if __name__ == '__main__':
+    main()
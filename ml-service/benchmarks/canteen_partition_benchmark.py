@@ -0,0 +1,94 @@
+"""
+Canteen-partitioned recommendation benchmark
+
+Trains on synthetic orders spread over several canteens (each with its own
+dishes, students ordering mostly from one canteen) twice: one global model
+only, and one model per canteen without the global one. Reports training
+time, the size of the item similarity matrices and the latency of
+canteen-filtered requests, served from the canteen's model or from the
+global model filtered to the canteen's dishes (the fallback), and checks
+that every recommended dish belongs to the requested canteen.
+
+Usage (from ml-service/):
+    python benchmarks/canteen_partition_benchmark.py
+    python benchmarks/canteen_partition_benchmark.py --canteens 5 20 --orders 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recommendations import RecommendationService
+
+
+def synthetic_orders(n_orders, n_canteens, n_users, dishes_per_canteen, rng):
+    """Orders in the /api/recommendations/train format; 90% of a student's orders go to their home canteen"""
+    home = rng.integers(0, n_canteens, size=n_users)
+    users = rng.integers(0, n_users, size=n_orders)
+    canteens = np.where(rng.random(n_orders) < 0.9, home[users], rng.integers(0, n_canteens, size=n_orders))
+    dishes = rng.integers(0, dishes_per_canteen, size=(n_orders, 3))
+    return [
+        {
+            "student": f"user_{users[i]}",
+            "canteen": f"canteen_{canteens[i]}",
+            "items": [{"dish": f"canteen_{canteens[i]}_dish_{dish}", "quantity": 1} for dish in dishes[i]],
+            "createdAt": f"2025-03-{1 + i % 28:02d}T12:00:00Z"
+        }
+        for i in range(n_orders)
+    ]
+
+
+def latency_ms(service, users, canteens):
+    """p50 and p99 of canteen-filtered requests; fails if a dish of another canteen comes back"""
+    timings = []
+    for user_id, canteen_id in zip(users, canteens):
+        started = time.perf_counter()
+        recommendations = service.get_recommendations(user_id, limit=10, canteen_id=canteen_id)
+        timings.append(time.perf_counter() - started)
+        assert all(rec['dish_id'].startswith(canteen_id + '_') for rec in recommendations), "dish from another canteen"
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--canteens', type=int, nargs='+', default=[2, 10])
+    parser.add_argument('--orders', type=int, default=40000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--dishes', type=int, default=60, help="Dishes per canteen")
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    print(f"{'canteens':>8} {'layout':>11} {'train s':>8} {'similarity nnz':>15} {'p50 ms':>7} {'p99 ms':>7}")
+    for n_canteens in args.canteens:
+        orders = synthetic_orders(args.orders, n_canteens, args.users, args.dishes, rng)
+        users = [f"user_{u}" for u in rng.integers(0, args.users, size=args.requests)]
+        canteens = [f"canteen_{c}" for c in rng.integers(0, n_canteens, size=args.requests)]
+
+        for layout in ('global', 'partitioned'):
+            service = RecommendationService(model_path=os.path.join(tempfile.mkdtemp(), 'model.pkl'))
+            started = time.perf_counter()
+            if layout == 'global':
+                # Without canteens only the global model is trained
+                service.train_model([{**order, "canteen": None} for order in orders])
+            else:
+                service.train_model(orders, train_global=False)
+            train_seconds = time.perf_counter() - started
+            if layout == 'global':
+                # The dish canteens it would have learned, for the fallback filter
+                for order in orders:
+                    service.item_canteens.update({item['dish']: order['canteen'] for item in order['items']})
+                similarity_nnz = service.item_similarity.nnz
+            else:
+                similarity_nnz = sum(model.item_similarity.nnz for model in service.canteen_models.values())
+            p50, p99 = latency_ms(service, users, canteens)
+            print(f"{n_canteens:>8} {layout:>11} {train_seconds:>8.2f} {similarity_nnz:>15} {p50:>7.3f} {p99:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Menu-wide forecast benchmark
+
+Times a weekly forecast for every dish of a canteen through
+ForecastingService.predict_batch (one vectorized pass over the stored model
+components) against the previous per-dish loop (model.forecast, per-day
+date arithmetic and dicts, pandas groupby insights, ±20% bounds). Models
+are fitted before timing, so only serving cost is measured.
+
+Usage (from ml-service/):
+    python benchmarks/forecast_batch_benchmark.py
+    python benchmarks/forecast_batch_benchmark.py --dishes 50 200 --days 60
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.forecasting import ForecastingService
+
+
+def synthetic_history(n_dishes, n_days, rng):
+    """Daily history frame with a weekly pattern per dish"""
+    dates = pd.date_range('2025-01-01', periods=n_days)
+    day = np.arange(n_days)
+    frames = []
+    for dish in range(n_dishes):
+        quantity = 15 + dish % 10 + 6 * np.sin(day * 2 * np.pi / 7 + dish) + rng.normal(0, 3, n_days)
+        frames.append(pd.DataFrame({'date': dates, 'dish_id': f"dish_{dish}", 'quantity': np.maximum(quantity, 0)}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def legacy_models(history):
+    """Per-dish models in the previous stored form: statsmodels results plus the full series"""
+    models = []
+    for _, dish_df in history.groupby('dish_id'):
+        series = dish_df.set_index('date')['quantity'].resample('D').sum()
+        model = ExponentialSmoothing(series, seasonal_periods=7, trend='add', seasonal='add').fit()
+        models.append({'model': model, 'historical_data': series, 'last_date': series.index[-1]})
+    return models
+
+
+def legacy_predict_dish(model_data, days_ahead):
+    """The previous _predict_dish: model.forecast, then per-day dicts and groupby insights"""
+    forecast_values = model_data['model'].forecast(steps=days_ahead).values
+    predictions = []
+    for i in range(days_ahead):
+        pred_value = max(0, round(forecast_values[i]))
+        predictions.append({
+            "date": (model_data['last_date'] + timedelta(days=i + 1)).strftime('%Y-%m-%d'),
+            "predicted_quantity": pred_value,
+            "confidence_interval": [max(0, int(pred_value * 0.8)), int(pred_value * 1.2)]
+        })
+    historical = model_data['historical_data']
+    day_of_week_avg = historical.groupby(historical.index.dayofweek).mean()
+    return {
+        "predictions": predictions,
+        "insights": {
+            "peak_day": int(day_of_week_avg.idxmax()),
+            "average_daily": round(np.mean([p['predicted_quantity'] for p in predictions]), 1)
+        }
+    }
+
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dishes', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--days-ahead', type=int, default=7)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    print(f"{'dishes':>7} {'loop ms':>9} {'batch ms':>9} {'speedup':>8}")
+
+    for n_dishes in args.dishes:
+        history = synthetic_history(n_dishes, args.days, rng)
+        service = ForecastingService(models_path=os.path.join(tempfile.mkdtemp(), 'models.pkl'))
+        service.train_from_frame('canteen', history)
+        models = legacy_models(history)
+
+        loop_ms = best_of(args.repeats, lambda: [legacy_predict_dish(m, args.days_ahead) for m in models])
+        batch_ms = best_of(args.repeats, lambda: service.predict_batch(['canteen'], args.days_ahead))
+        print(f"{n_dishes:>7} {loop_ms:>9.2f} {batch_ms:>9.2f} {loop_ms / batch_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
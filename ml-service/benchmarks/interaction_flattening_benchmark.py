@@ -0,0 +1,103 @@
+"""
+Order flattening benchmark
+
+Times RecommendationService._orders_to_interactions (columnar build with
+categorical ids) against the previous DataFrame.iterrows() flattening used
+by train_model, at 100k, 1M and 10M order items.
+
+The iterrows path is only run up to --legacy-max-items, since it takes
+minutes at the larger sizes. 10M items needs several GB of RAM just to hold
+the synthetic orders list.
+
+Usage (from ml-service/):
+    python benchmarks/interaction_flattening_benchmark.py
+    python benchmarks/interaction_flattening_benchmark.py --items 100000 1000000 --legacy-max-items 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recommendations import RecommendationService
+
+ITEMS_PER_ORDER = 3
+
+
+def synthetic_orders(n_items, n_users=50000, n_dishes=300, seed=11):
+    """Orders in the /api/recommendations/train format, ITEMS_PER_ORDER items each"""
+    rng = np.random.default_rng(seed)
+    n_orders = n_items // ITEMS_PER_ORDER
+    users = rng.integers(0, n_users, size=n_orders).tolist()
+    dishes = rng.integers(0, n_dishes, size=n_orders * ITEMS_PER_ORDER).tolist()
+    quantities = rng.integers(1, 3, size=n_orders * ITEMS_PER_ORDER).tolist()
+    base = pd.Timestamp('2025-01-01T08:00:00Z')
+    minutes = rng.integers(0, 60 * 24 * 120, size=n_orders)
+    stamps = (base + pd.to_timedelta(minutes, unit='m')).strftime('%Y-%m-%dT%H:%M:%S.000Z').tolist()
+    orders = []
+    for i in range(n_orders):
+        offset = i * ITEMS_PER_ORDER
+        orders.append({
+            "student": f"user_{users[i]}",
+            "items": [
+                {"dish": f"dish_{dishes[offset + k]}", "quantity": quantities[offset + k]}
+                for k in range(ITEMS_PER_ORDER)
+            ],
+            "createdAt": stamps[i]
+        })
+    return orders
+
+
+def legacy_flatten(orders_data):
+    """The previous train_model path: DataFrame.iterrows() into a list of dicts"""
+    df = pd.DataFrame(orders_data)
+    rows = []
+    for order_pos, order in df.iterrows():
+        user_id = str(order['student'])
+        for item in order['items']:
+            rows.append({
+                'user_id': user_id,
+                'dish_id': str(item['dish']),
+                'quantity': item.get('quantity', 1),
+                'order_id': order_pos,
+                'created_at': order.get('createdAt')
+            })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, nargs='+', default=[100000, 1000000, 10000000])
+    parser.add_argument('--legacy-max-items', type=int, default=1000000)
+    args = parser.parse_args()
+
+    service = RecommendationService(model_path=os.path.join(tempfile.mkdtemp(), 'model.pkl'))
+    print(f"{'items':>10} {'iterrows s':>11} {'columnar s':>11} {'speedup':>8} {'frame MB':>9}")
+
+    for n_items in args.items:
+        orders = synthetic_orders(n_items)
+
+        started = time.perf_counter()
+        interactions_df = service._orders_to_interactions(orders)
+        columnar_seconds = time.perf_counter() - started
+        frame_mb = interactions_df.memory_usage(deep=True).sum() / 1e6
+        del interactions_df
+
+        if n_items <= args.legacy_max_items:
+            started = time.perf_counter()
+            legacy_flatten(orders)
+            legacy_seconds = time.perf_counter() - started
+            print(f"{n_items:>10} {legacy_seconds:>11.2f} {columnar_seconds:>11.2f} "
+                  f"{legacy_seconds / columnar_seconds:>7.1f}x {frame_mb:>9.1f}")
+        else:
+            print(f"{n_items:>10} {'-':>11} {columnar_seconds:>11.2f} {'-':>8} {frame_mb:>9.1f}")
+        del orders
+
+
+if __name__ == '__main__':
+    main()
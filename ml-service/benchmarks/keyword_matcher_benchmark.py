@@ -0,0 +1,85 @@
+"""
+Keyword and aspect matching micro-benchmark
+
+Times KeywordMatcher.match (one split into words, intersected with the
+vocabulary) against the previous loops (one substring `in` check per
+keyword, then per aspect term) on synthetic cleaned review texts, and
+counts the texts whose results differ, i.e. where a term only occurred
+inside another word ("good" in "goodness", "fast" in "breakfast").
+
+--extra-terms pads both vocabularies with made-up terms to show how each
+approach scales with vocabulary size.
+
+Usage (from ml-service/):
+    python benchmarks/keyword_matcher_benchmark.py
+    python benchmarks/keyword_matcher_benchmark.py --texts 20000 --extra-terms 0 200 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sentiment import DEFAULT_VOCABULARY, KeywordMatcher
+
+WORDS = ['the', 'food', 'food.', 'was', 'good', 'good,', 'goodness', 'breakfast', 'fast', 'service', 'served', 'cold',
+         'coldness', 'price', 'priceless', 'dish', 'dishwasher', 'tasty', 'bland', 'staff', 'slowly', 'really', 'fresh',
+         'great', 'value', 'worth', 'lunch', 'quite', 'not', 'bad', 'badly', 'love', 'lovely', 'quick']
+
+
+def synthetic_texts(n, rng):
+    lengths = rng.integers(3, 40, size=n)
+    return [' '.join(rng.choice(WORDS, size=length)) for length in lengths]
+
+
+def legacy_match(text, positive_keywords, negative_keywords, aspect_terms):
+    """The previous _extract_keywords and _analyze_aspects scans"""
+    keywords = [kw for kw in positive_keywords if kw in text]
+    keywords += [kw for kw in negative_keywords if kw in text]
+    aspects = [aspect for aspect, terms in aspect_terms.items() if any(term in text for term in terms)]
+    return keywords[:5], aspects
+
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--texts', type=int, default=10000)
+    parser.add_argument('--extra-terms', type=int, nargs='+', default=[0, 100, 500])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    texts = synthetic_texts(args.texts, rng)
+
+    print(f"{'terms':>6} {'loop us/text':>13} {'matcher us/text':>16} {'speedup':>8} {'texts differing':>16}")
+    for extra in args.extra_terms:
+        padding = [f"term{i}x" for i in range(extra)]
+        positive = DEFAULT_VOCABULARY['positive_keywords'] + padding[:extra // 2]
+        negative = DEFAULT_VOCABULARY['negative_keywords'] + padding[extra // 2:]
+        aspects = DEFAULT_VOCABULARY['aspect_terms']
+        matcher = KeywordMatcher(positive, negative, aspects)
+        n_terms = len(matcher.keyword_rank.keys() | matcher.term_aspects.keys())
+
+        loop = best_of(args.repeats, lambda: [legacy_match(t, positive, negative, aspects) for t in texts])
+        matcher_seconds = best_of(args.repeats, lambda: [matcher.match(t) for t in texts])
+        differing = 0
+        for t in texts:
+            keywords, found_aspects = matcher.match(t)
+            differing += (keywords[:5], found_aspects) != legacy_match(t, positive, negative, aspects)
+        print(f"{n_terms:>6} {loop / len(texts) * 1e6:>13.2f} {matcher_seconds / len(texts) * 1e6:>16.2f} "
+              f"{loop / matcher_seconds:>7.1f}x {differing:>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Per-worker model memory benchmark
+
+Trains a synthetic recommendation model and forecasting models once, then
+starts N worker processes (like gunicorn workers) that each load them and
+touch every array, and reports each worker's memory growth from
+/proc/self/smaps_rollup (Linux only), measured from after the service
+libraries are imported:
+
+    pickle  each worker unpickles its own copy (the pre-store loading)
+    mmap    each worker maps the model store's .npy files read-only
+
+RSS counts shared pages in full in every process; PSS splits them between
+the processes mapping them, and private is what no other process shares,
+so the mmap rows should show PSS and private memory falling as workers are
+added while the pickle rows stay flat per worker.
+
+Usage (from ml-service/):
+    python benchmarks/model_memory_benchmark.py
+    python benchmarks/model_memory_benchmark.py --users 50000 --items 500 --workers 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.forecasting import ForecastingService
+from services.recommendations import RecommendationService, SPARSE_MATRICES, DENSE_ARRAYS
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# What the pre-store _save_model pickled
+PICKLED_FIELDS = SPARSE_MATRICES + DENSE_ARRAYS + ('popular_items', 'association_rules', 'user_ids', 'item_ids',
+                                                   'basket_weight_total', 'watermark', 'training_config')
+
+
+def synthetic_interactions(n_users, n_items, orders_per_user, rng):
+    """Flattened order items with Zipf-like dish popularity"""
+    n_orders = n_users * orders_per_user
+    basket_sizes = rng.integers(1, 5, size=n_orders)
+    order_ids = np.repeat(np.arange(n_orders), basket_sizes)
+    users = np.repeat(rng.integers(0, n_users, size=n_orders), basket_sizes)
+    dishes = np.minimum(rng.zipf(1.3, size=len(users)) - 1, n_items - 1)
+    return pd.DataFrame({
+        'user_id': pd.Categorical([f"user_{u}" for u in users]),
+        'dish_id': pd.Categorical([f"dish_{d}" for d in dishes]),
+        'quantity': rng.integers(1, 3, size=len(users)).astype(np.float32),
+        'order_id': order_ids,
+        'created_at': pd.Timestamp('2025-01-01', tz='UTC') + pd.to_timedelta(order_ids, unit='min')
+    })
+
+
+def synthetic_history(n_dishes, n_days, rng):
+    """Daily history frame with a weekly pattern per dish"""
+    dates = pd.date_range('2025-01-01', periods=n_days)
+    day = np.arange(n_days)
+    frames = []
+    for dish in range(n_dishes):
+        quantity = 15 + dish % 10 + 6 * np.sin(day * 2 * np.pi / 7 + dish) + rng.normal(0, 3, n_days)
+        frames.append(pd.DataFrame({'date': dates, 'dish_id': f"dish_{dish}", 'quantity': np.maximum(quantity, 0)}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_models(model_dir, args):
+    """Train and save both models; also pickle them the way earlier releases did"""
+    rng = np.random.default_rng(11)
+    recommendations = RecommendationService(model_path=os.path.join(model_dir, 'recommendation_model.pkl'), load=False)
+    recommendations.train_from_interactions(synthetic_interactions(args.users, args.items, args.orders_per_user, rng))
+    with open(os.path.join(model_dir, 'recommendations.pickle'), 'wb') as f:
+        pickle.dump({name: getattr(recommendations, name) for name in PICKLED_FIELDS}, f)
+
+    forecasting = ForecastingService(models_path=os.path.join(model_dir, 'forecasting_models.pkl'))
+    for canteen in range(args.canteens):
+        forecasting.train_from_frame(f"canteen_{canteen}", synthetic_history(args.dishes, args.days, rng))
+    with open(os.path.join(model_dir, 'forecasting.pickle'), 'wb') as f:
+        pickle.dump(forecasting.models, f)
+
+
+def memory_kb():
+    """Rss, Pss and private kB of this process"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty']
+    }
+
+
+def touch(value):
+    """Read every array reachable from a loaded model so its pages are resident"""
+    if isinstance(value, dict):
+        return sum(touch(item) for item in value.values())
+    if hasattr(value, 'indptr'):
+        return touch({'data': value.data, 'indices': value.indices, 'indptr': value.indptr})
+    if isinstance(value, np.ndarray) and value.size and value.flags.c_contiguous:
+        # One byte per page, without allocating a copy of the array
+        return float(value.reshape(-1).view(np.uint8)[::PAGE_SIZE].sum())
+    return 0.0
+
+
+def import_service_libraries():
+    """
+    Build and warm both services over an empty model directory, so the
+    libraries they import lazily (scipy.stats, statsmodels) are loaded
+    before the baseline and not counted as model memory
+    """
+    empty_dir = tempfile.mkdtemp()
+    RecommendationService(model_path=os.path.join(empty_dir, 'recommendation_model.pkl')).get_recommendations('user_0')
+    ForecastingService(models_path=os.path.join(empty_dir, 'forecasting_models.pkl')).warm_up()
+
+
+def worker(mode, model_dir, canteens, barrier, results):
+    """Load both models in this process and report its memory growth once every worker has loaded"""
+    import_service_libraries()
+    before = memory_kb()
+    if mode == 'pickle':
+        with open(os.path.join(model_dir, 'recommendations.pickle'), 'rb') as f:
+            recommendation_arrays = pickle.load(f)
+        # load_model also built the id lookups
+        recommendation_arrays['user_index'] = {user_id: row for row, user_id in enumerate(recommendation_arrays['user_ids'])}
+        recommendation_arrays['item_index'] = {dish_id: idx for idx, dish_id in enumerate(recommendation_arrays['item_ids'])}
+        with open(os.path.join(model_dir, 'forecasting.pickle'), 'rb') as f:
+            forecasting_models = pickle.load(f)
+    else:
+        recommendations = RecommendationService(model_path=os.path.join(model_dir, 'recommendation_model.pkl'))
+        recommendations.get_recommendations('user_0')
+        recommendation_arrays = {name: getattr(recommendations, name) for name in SPARSE_MATRICES + DENSE_ARRAYS}
+        forecasting = ForecastingService(models_path=os.path.join(model_dir, 'forecasting_models.pkl'))
+        forecasting.predict_batch([f"canteen_{canteen}" for canteen in range(canteens)])
+        forecasting_models = forecasting.models
+    touch(recommendation_arrays)
+    touch(forecasting_models)
+
+    barrier.wait()  # Every worker holds its models now, so PSS reflects the sharing
+    after = memory_kb()
+    results.put({key: after[key] - before[key] for key in after})
+    barrier.wait()  # Keep the mappings alive until every worker has measured
+
+
+def run(mode, model_dir, n_workers, canteens):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, model_dir, canteens, barrier, results)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: np.mean([m[key] for m in measured]) / 1024 for key in measured[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=400)
+    parser.add_argument('--orders-per-user', type=int, default=10)
+    parser.add_argument('--canteens', type=int, default=5)
+    parser.add_argument('--dishes', type=int, default=40)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    model_dir = tempfile.mkdtemp()
+    build_models(model_dir, args)
+
+    print("Growth per worker, and PSS summed over all workers:")
+    print(f"{'mode':>7} {'workers':>8} {'RSS MB':>9} {'PSS MB':>9} {'private MB':>11} {'total PSS MB':>13}")
+    for mode in ('pickle', 'mmap'):
+        for n_workers in args.workers:
+            growth = run(mode, model_dir, n_workers, args.canteens)
+            print(f"{mode:>7} {n_workers:>8} {growth['rss']:>9.1f} {growth['pss']:>9.1f} {growth['private']:>11.1f} "
+                  f"{growth['pss'] * n_workers:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Recommendation serving latency benchmark
+
+Measures p50/p99 latency of RecommendationService.get_recommendations served
+from the precomputed top-N index as the user count grows, next to the old
+per-request cosine similarity path (smaller sizes only, it is O(users)).
+
+Usage (from ml-service/):
+    python benchmarks/recommendation_index_benchmark.py
+    python benchmarks/recommendation_index_benchmark.py --users 1000 10000 --legacy-max-users 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recommendations import RecommendationService, RECOMMENDATION_INDEX_SIZE
+
+
+def build_indexed_service(n_users, n_items, rng):
+    """Service with a synthetic, fully populated recommendation index"""
+    service = RecommendationService(model_path=os.path.join(tempfile.mkdtemp(), 'model.pkl'))
+    service.item_ids = [f"dish_{i}" for i in range(n_items)]
+    service.user_index = {f"user_{u}": u for u in range(n_users)}
+    service.rec_items = rng.integers(0, n_items, size=(n_users, RECOMMENDATION_INDEX_SIZE), dtype=np.int32)
+    service.rec_scores = -np.sort(-rng.random((n_users, RECOMMENDATION_INDEX_SIZE), dtype=np.float32), axis=1)
+    service.rec_reasons = rng.integers(0, 2, size=(n_users, RECOMMENDATION_INDEX_SIZE), dtype=np.int8)
+    service.popular_items = service.item_ids[:20]
+    return service
+
+
+def legacy_collaborative(user_item_matrix, user_id, limit):
+    """The pre-index request path: cosine similarity against every user"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    user_vector = user_item_matrix.loc[user_id]
+    already_ordered = set(user_vector[user_vector > 0].index)
+    user_similarities = cosine_similarity(
+        user_vector.values.reshape(1, -1),
+        user_item_matrix.values
+    )[0]
+    similar_user_indices = np.argsort(user_similarities)[-11:-1][::-1]
+    item_scores = defaultdict(float)
+    for idx in similar_user_indices:
+        similar_user = user_item_matrix.iloc[idx]
+        similarity_score = user_similarities[idx]
+        for dish_id, count in similar_user.items():
+            if count > 0 and dish_id not in already_ordered:
+                item_scores[dish_id] += count * similarity_score
+    return sorted(item_scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000, 500000])
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--legacy-max-users', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'users':>8} {'path':>8} {'p50 ms':>10} {'p99 ms':>10}")
+
+    for n_users in args.users:
+        service = build_indexed_service(n_users, args.items, rng)
+        user_ids = [f"user_{u}" for u in rng.integers(0, n_users, size=args.requests)]
+        timings = []
+        for user_id in user_ids:
+            started = time.perf_counter()
+            service.get_recommendations(user_id, limit=args.limit)
+            timings.append(time.perf_counter() - started)
+        p50, p99 = percentiles(timings)
+        print(f"{n_users:>8} {'index':>8} {p50:>10.3f} {p99:>10.3f}")
+
+        if n_users <= args.legacy_max_users:
+            dense = (rng.random((n_users, args.items)) < 0.05) * rng.integers(1, 4, size=(n_users, args.items))
+            matrix = pd.DataFrame(
+                dense,
+                index=[f"user_{u}" for u in range(n_users)],
+                columns=service.item_ids
+            )
+            timings = []
+            for user_id in user_ids[:min(200, args.requests)]:
+                started = time.perf_counter()
+                legacy_collaborative(matrix, user_id, args.limit * 2)
+                timings.append(time.perf_counter() - started)
+            p50, p99 = percentiles(timings)
+            print(f"{n_users:>8} {'legacy':>8} {p50:>10.3f} {p99:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
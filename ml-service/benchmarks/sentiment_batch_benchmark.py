@@ -0,0 +1,128 @@
+"""
+Batch sentiment benchmark
+
+Scores synthetic reviews through SentimentService.analyze_batch (one
+pattern-analyzer pass per text, process pool for large batches) and
+through the previous per-review loop (a TextBlob per review, whose
+sentiment was read again for every aspect), and reports reviews per
+second at each batch size. Both are checked to give the same scores
+(keywords and aspects now come from the word-boundary KeywordMatcher, so
+they differ wherever a term only occurred inside another word).
+
+The pool only pays off with more than one CPU (workers are capped at the
+CPU count); --workers 1 measures the single-process path alone. The pool's
+workers are started once per process, before timing, by an untimed batch;
+the time that took is reported as the pool start-up. The result cache is disabled unless --cache is
+given, which adds a second, warm-cache pass over the same reviews.
+
+Usage (from ml-service/):
+    python benchmarks/sentiment_batch_benchmark.py
+    python benchmarks/sentiment_batch_benchmark.py --sizes 1000 10000 --workers 4
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+from textblob import TextBlob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sentiment import PARALLEL_MIN_REVIEWS, SentimentService
+
+OPENINGS = ['the food was', 'honestly the dish is', 'my biryani was', 'today the meal was', 'lunch was', 'the staff were']
+OPINIONS = ['very tasty', 'delicious and fresh', 'cold and stale', 'bland', 'amazing', 'terrible', 'okay',
+            'overpriced for the quantity', 'great value', 'a bit soggy', 'perfect', 'not good']
+ENDINGS = ['', 'but the service was slow', 'and the staff were friendly', 'worth the price', 'will come back',
+           'see www.example.com', 'the waiter was rude', 'quick service though']
+
+
+def synthetic_reviews(n, rng):
+    """Review dicts as the backend sends them, built from random phrase combinations"""
+    return [
+        {
+            "_id": f"review_{i}",
+            "dish": f"dish_{rng.integers(0, 50)}",
+            "comment": f"{rng.choice(OPENINGS)} {rng.choice(OPINIONS)} {rng.choice(ENDINGS)}".strip().capitalize()
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_analyze(service, text):
+    """The previous SentimentService.analyze"""
+    if not text or len(text.strip()) < 3:
+        return {"sentiment": "neutral", "score": 0, "confidence": 0, "keywords": [], "aspects": {}}
+    text = ' '.join(re.sub(r'http\S+|www\S+', '', text.lower()).split())
+    blob = TextBlob(text)
+    polarity = blob.sentiment.polarity
+    subjectivity = blob.sentiment.subjectivity
+    sentiment = "positive" if polarity > 0.1 else "negative" if polarity < -0.1 else "neutral"
+    keywords = [kw for kw in service.positive_keywords if kw in text]
+    keywords += [kw for kw in service.negative_keywords if kw in text]
+    aspects = {}
+    if any(term in text for term in ['food', 'dish', 'taste', 'tasty', 'delicious', 'fresh', 'quality']):
+        aspects['food_quality'] = blob.sentiment.polarity
+    if any(term in text for term in ['service', 'staff', 'waiter', 'serve', 'quick', 'fast', 'slow']):
+        aspects['service'] = blob.sentiment.polarity
+    if any(term in text for term in ['price', 'value', 'worth', 'cheap', 'expensive', 'affordable']):
+        aspects['value'] = blob.sentiment.polarity
+    return {"sentiment": sentiment, "score": round(polarity, 2), "confidence": round(subjectivity, 2),
+            "keywords": keywords[:5], "aspects": aspects}
+
+
+def legacy_batch(service, reviews):
+    return [
+        {"review_id": str(review.get('review_id', review.get('_id'))), "dish_id": review.get('dish'),
+         "sentiment": legacy_analyze(service, review.get('comment', review.get('text', '')))}
+        for review in reviews
+    ]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--workers', type=int, default=None, help="Pool size (default: SENTIMENT_WORKERS or CPU count)")
+    parser.add_argument('--cache', action='store_true', help="Enable the result cache and time a warm pass too")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    service = SentimentService(max_workers=args.workers, cache_size=None if args.cache else 0)
+    service.warm_up()
+    legacy_batch(service, synthetic_reviews(10, rng))  # Load the lexicon for both paths before timing
+
+    # Start the pool now, as an earlier large batch would have in the service
+    _, startup_seconds = timed(lambda: service.analyze_batch(synthetic_reviews(PARALLEL_MIN_REVIEWS, rng)))
+    if service.result_cache is not None:
+        service.result_cache.clear()
+
+    print(f"workers: {min(service.max_workers, os.cpu_count() or 1)} "
+          f"(pool from {PARALLEL_MIN_REVIEWS} reviews, first batch {startup_seconds:.2f}s)")
+    print(f"{'reviews':>8} {'loop rev/s':>11} {'batch rev/s':>12} {'speedup':>8}" + (f" {'warm rev/s':>11}" if args.cache else ''))
+    for size in args.sizes:
+        reviews = synthetic_reviews(size, rng)
+        expected, loop_seconds = timed(lambda: legacy_batch(service, reviews))
+        if service.result_cache is not None:
+            service.result_cache.clear()
+        results, batch_seconds = timed(lambda: service.analyze_batch(reviews))
+        assert all(
+            result['sentiment'][key] == legacy['sentiment'][key]
+            for result, legacy in zip(results, expected) for key in ('sentiment', 'score', 'confidence')
+        ), "batch scores differ from the per-review loop"
+        line = f"{size:>8} {size / loop_seconds:>11.0f} {size / batch_seconds:>12.0f} {loop_seconds / batch_seconds:>7.1f}x"
+        if args.cache:
+            _, warm_seconds = timed(lambda: service.analyze_batch(reviews))
+            line += f" {size / warm_seconds:>11.0f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Service startup benchmark
+
+Starts the app in a fresh interpreter for each ML_WARMUP mode and reports
+how long `import app` takes, when the first /health request is answered
+and when /ready turns 200, plus the slowest imports from
+`python -X importtime -c "import app"`.
+
+    eager       services and models load while app.py is imported, as
+                every release before the warm-up thread did
+    background  app.py imports only Flask; a warm-up thread loads the rest
+    lazy        nothing loads until a request needs it (no /ready wait)
+
+Runs against a copy of ml-service/models in a temporary directory, so
+migrating legacy pickles doesn't touch the working tree.
+
+Usage (from ml-service/):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --modes eager background --top 5
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line of timings
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/health')
+healthy = time.perf_counter()
+ready = None
+if app.service_registry.mode != 'lazy':
+    while client.get('/ready').status_code != 200:
+        time.sleep(0.01)
+    ready = time.perf_counter() - started
+print(json.dumps({"import": imported - started, "health": healthy - started, "ready": ready}))
+"""
+
+
+def run_probe(mode, workdir):
+    env = dict(os.environ, ML_WARMUP=mode, PYTHONPATH=SERVICE_DIR)
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    # The app's own log lines (e.g. from the warm-up thread) can come before or after the timings
+    return next(json.loads(line) for line in output.splitlines() if line.startswith('{"import"'))
+
+
+def slowest_imports(mode, workdir, top):
+    """(cumulative seconds, module) of `import app` and its slowest direct imports"""
+    env = dict(os.environ, ML_WARMUP=mode, PYTHONPATH=SERVICE_DIR)
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Two spaces of indent per nesting level
+        if depth <= 1:
+            imports.append((int(fields[1]) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    shutil.copytree(os.path.join(SERVICE_DIR, 'models'), os.path.join(workdir, 'models'),
+                    ignore=shutil.ignore_patterns('jobs'))
+    run_probe('eager', workdir)  # Migrate legacy pickles and warm the page cache once
+
+    print(f"{'mode':>11} {'import s':>9} {'/health s':>10} {'/ready s':>9}   (best of {args.repeats})")
+    for mode in args.modes:
+        runs = [run_probe(mode, workdir) for _ in range(args.repeats)]
+        ready = [run['ready'] for run in runs if run['ready'] is not None]
+        print(f"{mode:>11} {min(run['import'] for run in runs):>9.3f} {min(run['health'] for run in runs):>10.3f} "
+              f"{(f'{min(ready):.3f}' if ready else '-'):>9}")
+
+    for mode in args.modes:
+        print(f"\nSlowest imports of `import app` ({mode}):")
+        for seconds, name in slowest_imports(mode, workdir, args.top):
+            print(f"  {seconds:>7.3f}s  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,430 @@
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
+import hashlib
 import pickle
 import os
+import threading
+import time
+
+from services.cache import LRUCache
+from services.model_store import ModelStore, shard_key
+from services.workers import pool_map
+
+# Below this many dishes a process pool costs more than it saves
+PARALLEL_MIN_DISHES = 4
+
+# Appended days are folded in with the previous smoothing parameters until the
+# series has grown by this fraction since its last full (optimized) fit
+REFIT_GROWTH = 0.25
+
+# Prediction cache bounds (FORECAST_CACHE_SIZE / FORECAST_CACHE_TTL override)
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_CACHE_TTL_SECONDS = 3600
+
+# Prediction intervals: coverage (FORECAST_INTERVAL_LEVEL overrides) and the
+# horizon whose forecast standard deviations are precomputed at fit time
+DEFAULT_INTERVAL_LEVEL = 0.8
+INTERVAL_HORIZON = 90
+HOLT_WINTERS_PARAMS_COUNT = 12  # 3 smoothing parameters, level, trend, 7 seasonal states
+
+SMOOTHING_PARAMS = ('smoothing_level', 'smoothing_trend', 'smoothing_seasonal')
+WARM_START_PARAMS = SMOOTHING_PARAMS + ('initial_level', 'initial_trend', 'initial_seasons')
+
+# Per-dish arrays of a component table, also stored as-is in the canteen's store shard
+TABLE_ARRAYS = ('level', 'trend', 'season', 'sigma', 'smoothing', 'forecast_std',
+                'recent_average', 'older_average', 'dow_means', 'historical_average')
+
+INSIGHT_COLUMNS = ('trend', 'peak_day', 'average_daily', 'total_forecast', 'historical_average')
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+
+def _fit_dish(dish_item):
+    """
+    Fit the Holt-Winters model of one dish
+    
+    Module-level so it can run in a worker process. dish_item is
+    (dish_id, series, warm_start) where warm_start holds the previous
+    model's smoothing parameters and initial states (only the smoothing
+    parameters when the series starts later, see _reuse_plan), or None
+    for a full fit. Returns (dish_id, model_data, fit_seconds, error or None); the
+    fitted statsmodels object itself is not kept, see _model_data.
+    """
+    # Imported here: statsmodels is only needed for training, not for serving forecasts
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    
+    dish_id, series, warm_start = dish_item
+    started = time.perf_counter()
+    model = None
+    error = None
+    if warm_start:
+        if 'initial_level' in warm_start:
+            initialization = dict(
+                initialization_method='known',
+                initial_level=warm_start['initial_level'],
+                initial_trend=warm_start['initial_trend'],
+                initial_seasonal=warm_start['initial_seasons']
+            )
+        else:
+            # The saved initial states belong to an earlier start date
+            initialization = dict(initialization_method='heuristic')
+        try:
+            # Re-run the smoothing filter over the longer series, no optimization
+            model = ExponentialSmoothing(
+                series,
+                seasonal_periods=7,
+                trend='add',
+                seasonal='add',
+                **initialization
+            ).fit(
+                smoothing_level=warm_start['smoothing_level'],
+                smoothing_trend=warm_start['smoothing_trend'],
+                smoothing_seasonal=warm_start['smoothing_seasonal'],
+                optimized=False
+            )
+        except Exception:
+            model = None
+    if model is None:
+        try:
+            # Train Holt-Winters model
+            model = ExponentialSmoothing(
+                series,
+                seasonal_periods=7,  # Weekly seasonality
+                trend='add',
+                seasonal='add'
+            ).fit()
+            warm_start = None
+        except Exception as e:
+            # Fallback to simple moving average
+            model = None
+            error = str(e)
+    
+    model_data = _model_data(model, series)
+    model_data['warm_started'] = bool(warm_start)
+    return dish_id, model_data, time.perf_counter() - started, error
+
+
+def _model_data(model, series):
+    """
+    Compact stored form of a fitted dish model
+    
+    Keeps what serving and warm starts need (forecast components, interval
+    standard deviations, smoothing parameters, history summary) instead of
+    the statsmodels results object and the full series.
+    """
+    if model is not None:
+        params = {
+            name: np.asarray(model.params[name], dtype=np.float64) if name == 'initial_seasons'
+            else float(model.params[name])
+            for name in WARM_START_PARAMS
+        }
+    else:
+        params = None
+    return {
+        'last_date': series.index[-1],
+        'params': params,
+        'components': _dish_components(model, series),
+        'summary': _series_summary(series)
+    }
+
+
+def _forecast_std(sigma, smoothing, days):
+    """
+    Standard deviation of the 1..days step forecast errors
+    
+    For additive Holt-Winters with one-step residual deviation sigma:
+    var(h) = sigma^2 * (1 + sum_{j<h} c_j^2), c_j = alpha * (1 + j * beta)
+    + gamma * [j % 7 == 0]. With smoothing (0, 0, 0) it is flat at sigma.
+    """
+    alpha, beta, gamma = smoothing
+    j = np.arange(1, max(days, 1))
+    c = alpha * (1 + j * beta) + gamma * (j % 7 == 0)
+    return (sigma * np.sqrt(1 + np.concatenate([[0.0], np.cumsum(c ** 2)])))[:days]
+
+
+def _dish_components(model, series):
+    """
+    Forecast function and error scale of a dish
+    
+    The additive Holt-Winters forecast h days ahead is
+    level + h * trend + season[(h - 1) % 7], with sigma the residual
+    standard deviation. The moving-average fallback (model None) is the
+    last week's mean with no trend or season, and the spread of the last
+    four weeks (inflated for the error of the mean) as its flat deviation.
+    """
+    if model is not None:
+        params = model.params
+        sigma = float(np.sqrt(model.sse / max(len(series) - HOLT_WINTERS_PARAMS_COUNT, 1)))
+        smoothing = (float(params['smoothing_level']), float(params['smoothing_trend']),
+                     float(params['smoothing_seasonal']))
+        level = float(np.asarray(model.level)[-1])
+        trend = float(np.asarray(model.trend)[-1])
+        season = np.asarray(model.season, dtype=np.float64)[-7:]
+    else:
+        spread = float(series[-28:].std(ddof=1)) if len(series) > 1 else 0.0
+        sigma = (spread if np.isfinite(spread) else 0.0) * np.sqrt(1 + 1 / 7)
+        smoothing = (0.0, 0.0, 0.0)
+        level, trend, season = float(series[-7:].mean()), 0.0, np.zeros(7)
+    return {
+        'level': level,
+        'trend': trend,
+        'season': season,
+        'sigma': sigma,
+        'smoothing': smoothing,
+        'forecast_std': _forecast_std(sigma, smoothing, INTERVAL_HORIZON)
+    }
+
+
+def _series_summary(series):
+    """History statistics behind the forecast insights"""
+    recent_average = float(series[-7:].mean())
+    dow_means = series.groupby(series.index.dayofweek).mean().reindex(range(7))
+    return {
+        'recent_average': recent_average,
+        'older_average': float(series[-14:-7].mean()) if len(series) >= 14 else recent_average,
+        'dow_means': dow_means.to_numpy(dtype=np.float64),
+        'historical_average': float(series.mean())
+    }
+
+
+def _compact_legacy_model(model_data):
+    """Convert a model saved with its statsmodels results and full series to _model_data form"""
+    if 'model' not in model_data:
+        return model_data
+    return _model_data(model_data['model'], model_data['historical_data'])
+
+
+def _fingerprint(series):
+    """Content hash of a daily series (start date and values)"""
+    digest = hashlib.sha1(str(series.index[0]).encode() if len(series) else b'')
+    digest.update(np.ascontiguousarray(series.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def _reuse_plan(previous, series):
+    """
+    How to bring a dish's previous model up to date with series
+    
+    Returns ('hit', None) when the history is unchanged, ('incremental',
+    warm_start) when days were only appended (the last known day may be
+    revised, e.g. a partial day), else ('miss', None).
+    
+    A rolling window (the last N days) also drops days from the start. The
+    previous smoothing parameters are then reused with initial states
+    re-estimated from the new series, as long as the series has grown by
+    no more than REFIT_GROWTH beyond its overlap with the last full fit
+    (full_fit_days less the days dropped since).
+    """
+    if not previous or previous.get('fingerprint') is None:
+        return 'miss', None
+    n_days = previous['n_days']
+    shift = (series.index[0] - previous['first_date']).days
+    if shift == 0:
+        if len(series) == n_days and _fingerprint(series) == previous['fingerprint']:
+            return 'hit', None
+        if (len(series) >= n_days and previous['params'] is not None
+                and len(series) <= previous['full_fit_days'] * (1 + REFIT_GROWTH)
+                and _fingerprint(series[:n_days - 1]) == previous['stable_fingerprint']):
+            return 'incremental', previous['params']
+    elif (0 < shift < n_days and previous['params'] is not None
+            and series.index[-1] >= previous['last_date']
+            and len(series) <= (previous['full_fit_days'] - shift) * (1 + REFIT_GROWTH)):
+        return 'incremental', {name: previous['params'][name] for name in SMOOTHING_PARAMS}
+    return 'miss', None
+
+
+def history_frame(historical_data):
+    """History DataFrame (date, dish_id, quantity) from the JSON rows of train_model"""
+    df = pd.DataFrame(historical_data)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _daily_series(df):
+    """(dish_id, daily series) of every dish in a history frame; missing days are 0"""
+    for dish_id, dish_df in df.groupby('dish_id', observed=True, sort=False):
+        series = dish_df.set_index('date')['quantity'].resample('D').sum().fillna(0)
+        yield str(dish_id), series
+
+
+def _component_table(canteen_id, canteen_models):
+    """Stack the stored components of a canteen's dishes into arrays (one row per dish)"""
+    dish_ids = list(canteen_models)
+    components = [canteen_models[dish_id]['components'] for dish_id in dish_ids]
+    summaries = [canteen_models[dish_id]['summary'] for dish_id in dish_ids]
+    return {
+        'canteen_ids': [canteen_id] * len(dish_ids),
+        'dish_ids': dish_ids,
+        'start_dates': np.array(
+            [np.datetime64(canteen_models[dish_id]['last_date'], 'D') for dish_id in dish_ids],
+            dtype='datetime64[D]'
+        ).reshape(-1) + 1,
+        'level': np.array([c['level'] for c in components], dtype=np.float64),
+        'trend': np.array([c['trend'] for c in components], dtype=np.float64),
+        'season': np.array([c['season'] for c in components], dtype=np.float64).reshape(-1, 7),
+        'sigma': np.array([c['sigma'] for c in components], dtype=np.float64),
+        'smoothing': np.array([c['smoothing'] for c in components], dtype=np.float64).reshape(-1, 3),
+        'forecast_std': np.array([c['forecast_std'] for c in components], dtype=np.float64).reshape(-1, INTERVAL_HORIZON),
+        'recent_average': np.array([s['recent_average'] for s in summaries], dtype=np.float64),
+        'older_average': np.array([s['older_average'] for s in summaries], dtype=np.float64),
+        'dow_means': np.array([s['dow_means'] for s in summaries], dtype=np.float64).reshape(-1, 7),
+        'historical_average': np.array([s['historical_average'] for s in summaries], dtype=np.float64)
+    }
+
+
+def _canteen_shard(canteen_id):
+    """Model store shard holding a canteen's dish models"""
+    return f"forecasting/{shard_key(canteen_id)}"
+
+
+def _canteen_to_arrays(canteen_id, canteen_models):
+    """
+    Store form of a canteen's dish models: (arrays, meta)
+    
+    One row per dish: the component table plus fit dates, day counts and
+    warm-start initial states as arrays; ids and fingerprints in meta.
+    Dishes without a Holt-Winters fit (or fitted before fingerprints
+    existed) hold NaN / NaT / -1 placeholders.
+    """
+    table = _component_table(canteen_id, canteen_models)
+    dish_models = [canteen_models[dish_id] for dish_id in table['dish_ids']]
+    params = [model_data['params'] for model_data in dish_models]
+    arrays = {name: table[name] for name in TABLE_ARRAYS}
+    arrays.update({
+        'last_date': table['start_dates'] - 1,
+        'first_date': np.array([np.datetime64(m.get('first_date', 'NaT'), 'D') for m in dish_models], dtype='datetime64[D]'),
+        'n_days': np.array([m.get('n_days', -1) for m in dish_models], dtype=np.int64),
+        'full_fit_days': np.array([m.get('full_fit_days', -1) for m in dish_models], dtype=np.int64),
+        'has_params': np.array([p is not None for p in params], dtype=bool),
+        'initial_level': np.array([p['initial_level'] if p else np.nan for p in params], dtype=np.float64),
+        'initial_trend': np.array([p['initial_trend'] if p else np.nan for p in params], dtype=np.float64),
+        'initial_seasons': np.array([p['initial_seasons'] if p else np.full(7, np.nan) for p in params],
+                                    dtype=np.float64).reshape(-1, 7)
+    })
+    meta = {
+        "canteen_id": canteen_id,
+        "dish_ids": table['dish_ids'],
+        "fingerprints": [m.get('fingerprint') for m in dish_models],
+        "stable_fingerprints": [m.get('stable_fingerprint') for m in dish_models]
+    }
+    return arrays, meta
+
+
+def _canteen_from_arrays(arrays, meta):
+    """Dish models ({dish_id: model_data}) from their store form, see _canteen_to_arrays"""
+    canteen_models = {}
+    for row, dish_id in enumerate(meta['dish_ids']):
+        smoothing = tuple(arrays['smoothing'][row].tolist())
+        model_data = {
+            'last_date': pd.Timestamp(arrays['last_date'][row]),
+            'params': {
+                'smoothing_level': smoothing[0],
+                'smoothing_trend': smoothing[1],
+                'smoothing_seasonal': smoothing[2],
+                'initial_level': float(arrays['initial_level'][row]),
+                'initial_trend': float(arrays['initial_trend'][row]),
+                'initial_seasons': arrays['initial_seasons'][row]
+            } if arrays['has_params'][row] else None,
+            'components': {
+                'level': float(arrays['level'][row]),
+                'trend': float(arrays['trend'][row]),
+                'season': arrays['season'][row],
+                'sigma': float(arrays['sigma'][row]),
+                'smoothing': smoothing,
+                'forecast_std': arrays['forecast_std'][row]
+            },
+            'summary': {
+                'recent_average': float(arrays['recent_average'][row]),
+                'older_average': float(arrays['older_average'][row]),
+                'dow_means': arrays['dow_means'][row],
+                'historical_average': float(arrays['historical_average'][row])
+            }
+        }
+        if meta['fingerprints'][row] is not None:
+            model_data.update({
+                'fingerprint': meta['fingerprints'][row],
+                'stable_fingerprint': meta['stable_fingerprints'][row],
+                'first_date': pd.Timestamp(arrays['first_date'][row]),
+                'n_days': int(arrays['n_days'][row]),
+                'full_fit_days': int(arrays['full_fit_days'][row])
+            })
+        canteen_models[dish_id] = model_data
+    return canteen_models
+
+
+def _table_from_arrays(canteen_id, arrays, meta):
+    """Component table over a canteen's stored arrays (no copy of the per-dish arrays)"""
+    table = {name: arrays[name] for name in TABLE_ARRAYS}
+    table.update({
+        'canteen_ids': [canteen_id] * len(meta['dish_ids']),
+        'dish_ids': meta['dish_ids'],
+        'start_dates': arrays['last_date'] + 1
+    })
+    return table
+
+
+def _concat_tables(tables):
+    """One component table from several (e.g. one per canteen)"""
+    if not tables:
+        return _component_table(None, {})
+    if len(tables) == 1:
+        return tables[0]
+    return {
+        name: (sum((table[name] for table in tables), []) if isinstance(tables[0][name], list)
+               else np.concatenate([table[name] for table in tables]))
+        for name in tables[0]
+    }
+
+
+def _interval_z():
+    """Two-sided normal quantile for the prediction interval coverage"""
+    from scipy.stats import norm
+    level = float(os.getenv('FORECAST_INTERVAL_LEVEL', DEFAULT_INTERVAL_LEVEL))
+    return float(norm.ppf(0.5 + level / 2))
+
+
+def _batch_forecast(table, days_ahead, z=None):
+    """
+    Forecasts, bounds and insights for every row of a component table
+    
+    Returns (rows x days_ahead) int arrays predicted_quantity, lower_bound and
+    upper_bound, plus one insight value per row. Bounds are the forecast
+    +- z forecast standard deviations (precomputed at fit time up to
+    INTERVAL_HORIZON days, extended from sigma and smoothing beyond it).
+    """
+    horizon = np.arange(1, days_ahead + 1)
+    values = table['level'][:, None] + horizon * table['trend'][:, None] + table['season'][:, (horizon - 1) % 7]
+    # Rows whose model produced no usable forecast fall back to the last week's mean
+    values = np.where(np.isfinite(values), values, table['recent_average'][:, None])
+    predicted = np.maximum(0, np.round(values))  # Can't be negative
+    
+    if days_ahead <= INTERVAL_HORIZON:
+        forecast_std = table['forecast_std'][:, :days_ahead]
+    else:
+        forecast_std = np.array([
+            _forecast_std(sigma, smoothing, days_ahead)
+            for sigma, smoothing in zip(table['sigma'], table['smoothing'])
+        ]).reshape(-1, days_ahead)
+    half_width = (_interval_z() if z is None else z) * np.nan_to_num(forecast_std)
+    lower_bound = np.maximum(0, np.round(values - half_width))
+    upper_bound = np.maximum(predicted, np.round(values + half_width))
+    
+    recent, older = table['recent_average'], table['older_average']
+    trend = np.select([recent > older * 1.1, recent < older * 0.9], ['increasing', 'decreasing'], 'stable')
+    dow_means = np.where(np.isnan(table['dow_means']), -np.inf, table['dow_means'])
+    peak_day = DAY_NAMES[np.argmax(dow_means, axis=1)] if len(dow_means) else np.array([], dtype=str)
+    
+    return {
+        'predicted_quantity': predicted.astype(np.int64),
+        'lower_bound': np.minimum(lower_bound, predicted).astype(np.int64),
+        'upper_bound': upper_bound.astype(np.int64),
+        'trend': trend,
+        'peak_day': peak_day,
+        'average_daily': np.round(predicted.mean(axis=1), 1) if days_ahead else np.zeros(len(predicted)),
+        'total_forecast': predicted.sum(axis=1).astype(np.int64),
+        'historical_average': np.round(table['historical_average'], 1)
+    }
+
 
 class ForecastingService:
     """
@@ -11,17 +432,40 @@ class ForecastingService:
     1. Exponential Smoothing (Holt-Winters)
     2. Moving Average (simple fallback)
     3. Day-of-week patterns
+    
+    Each canteen's models are one shard of the model store, loaded on first
+    access as read-only memory maps shared by every worker process;
+    models_path is the pickle of earlier releases, migrated into the store
+    the first time a canteen is looked up.
     """
     
-    def __init__(self):
-        self.models = {}  # {canteen_id: {dish_id: model}}
-        self.models_path = 'models/forecasting_models.pkl'
-        self.load_models()
+    def __init__(self, models_path='models/forecasting_models.pkl', max_workers=None, store=None):
+        self.models = {}  # {canteen_id: {dish_id: model}}, canteens loaded so far
+        self.component_tables = {}  # {canteen_id: component table}, see predict_batch
+        self.models_path = models_path
+        self.store = store or ModelStore(os.path.join(os.path.dirname(models_path) or '.', 'store'))
+        # Processes used to fit per-dish models (FORECAST_WORKERS, default: CPU count)
+        self.max_workers = max_workers or int(os.getenv('FORECAST_WORKERS', 0)) or os.cpu_count() or 1
+        self._train_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._legacy_checked = False
+        # Cumulative fingerprint outcomes across train_model calls
+        self.reuse_stats = {"hits": 0, "incremental_updates": 0, "misses": 0}
+        # Predictions + insights keyed by (canteen, dish, days_ahead, model version);
+        # a canteen's version is its store version, bumped whenever its models are saved
+        self.model_versions = {}
+        self.prediction_cache = LRUCache(
+            max_entries=int(os.getenv('FORECAST_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+            ttl_seconds=float(os.getenv('FORECAST_CACHE_TTL', DEFAULT_CACHE_TTL_SECONDS))
+        )
+        self.interval_z = _interval_z()
     
-    def train_model(self, canteen_id, historical_data):
+    def train_model(self, canteen_id, historical_data, progress=None):
         """
         Train forecasting model for a canteen
         
+        progress(fraction, stage), if given, is called as dishes finish.
+        
         historical_data format: [
             {
                 "date": "2025-01-01",
@@ -33,53 +477,137 @@ class ForecastingService:
         if not historical_data or len(historical_data) < 14:
             return {"message": "Need at least 14 days of data", "data_points": len(historical_data)}
         
-        df = pd.DataFrame(historical_data)
-        df['date'] = pd.to_datetime(df['date'])
+        return self.train_from_frame(canteen_id, history_frame(historical_data), progress=progress)
+    
+    def train_from_frame(self, canteen_id, df, progress=None):
+        """
+        Train forecasting models from a history DataFrame
+        
+        df columns: date (datetime64), dish_id, quantity
+        (see services.ingestion for the streamed form)
+        
+        The canteen's previous models keep serving until the new set is
+        fitted and saved, then replace them in one assignment.
+        
+        Each dish's daily series is fingerprinted: unchanged dishes keep
+        their model, dishes that only gained new days are refiltered with
+        the previous smoothing parameters instead of re-optimized, and only
+        the rest get a full fit. Nothing is saved when every dish is unchanged.
+        """
+        if len(df) < 14:
+            return {"message": "Need at least 14 days of data", "data_points": len(df)}
+        
+        started = time.perf_counter()
+        progress = progress or (lambda fraction, stage=None: None)
+        progress(0.0, "Preparing daily series")
         
-        # Group by dish and train individual models
-        dish_ids = df['dish_id'].unique()
+        # Split once by dish, resampling each series to daily frequency (missing days = 0)
+        self.has_models(canteen_id)
+        previous_models = self.models.get(canteen_id, {})
         canteen_models = {}
+        dish_series = []
+        skipped = 0
+        reuse = {"hits": 0, "incremental_updates": 0, "misses": 0}
+        for dish_id, series in _daily_series(df):
+            if len(series) < 14:
+                skipped += 1
+                continue
+            plan, warm_start = _reuse_plan(previous_models.get(dish_id), series)
+            if plan == 'hit':
+                canteen_models[dish_id] = previous_models[dish_id]
+                reuse["hits"] += 1
+            else:
+                dish_series.append((dish_id, series, warm_start))
+                reuse["incremental_updates" if plan == 'incremental' else "misses"] += 1
         
-        for dish_id in dish_ids:
-            dish_df = df[df['dish_id'] == dish_id].copy()
-            dish_df = dish_df.set_index('date')['quantity']
-            
-            # Resample to daily frequency, fill missing days with 0
-            dish_df = dish_df.resample('D').sum().fillna(0)
-            
-            if len(dish_df) >= 14:
-                try:
-                    # Train Holt-Winters model
-                    model = ExponentialSmoothing(
-                        dish_df,
-                        seasonal_periods=7,  # Weekly seasonality
-                        trend='add',
-                        seasonal='add'
-                    ).fit()
-                    
-                    canteen_models[dish_id] = {
-                        'model': model,
-                        'historical_data': dish_df,
-                        'last_date': dish_df.index[-1]
-                    }
-                except Exception as e:
-                    print(f"Error training model for dish {dish_id}: {e}")
-                    # Fallback to simple moving average
-                    canteen_models[dish_id] = {
-                        'model': None,
-                        'historical_data': dish_df,
-                        'last_date': dish_df.index[-1]
-                    }
-        
-        self.models[canteen_id] = canteen_models
-        self._save_models()
+        # Fit one Holt-Winters model per dish, in parallel when enough need a full fit
+        workers = min(self.max_workers, len(dish_series))
+        results = []
+        if workers > 1 and reuse["misses"] >= PARALLEL_MIN_DISHES:
+            for result in pool_map(_fit_dish, dish_series, workers, chunksize=max(1, len(dish_series) // (workers * 4))):
+                results.append(result)
+                progress(0.05 + 0.9 * len(results) / len(dish_series), "Fitting dish models")
+        else:
+            workers = 1
+            for item in dish_series:
+                results.append(_fit_dish(item))
+                progress(0.05 + 0.9 * len(results) / len(dish_series), "Fitting dish models")
+        
+        fit_seconds = {}
+        failures = {}
+        for (_, series, _), (dish_id, model_data, seconds, error) in zip(dish_series, results):
+            previous = previous_models.get(dish_id)
+            full_fit_days = len(series)
+            if model_data.pop('warm_started'):
+                # Days still covered by the last full fit
+                full_fit_days = previous['full_fit_days'] - (series.index[0] - previous['first_date']).days
+            model_data.update({
+                'fingerprint': _fingerprint(series),
+                'stable_fingerprint': _fingerprint(series[:-1]),
+                'first_date': series.index[0],
+                'n_days': len(series),
+                'full_fit_days': full_fit_days
+            })
+            canteen_models[dish_id] = model_data
+            fit_seconds[dish_id] = round(seconds, 4)
+            if error:
+                print(f"Error training model for dish {dish_id}: {error}")
+                failures[dish_id] = error
+        
+        for key, count in reuse.items():
+            self.reuse_stats[key] += count
+        
+        changed = bool(dish_series) or canteen_models.keys() != previous_models.keys()
+        if changed:
+            progress(0.95, "Saving models")
+            with self._train_lock:
+                version = self._save_models(canteen_id, canteen_models)
+                # Serve from maps of the saved files, shared with the other workers, not this copy
+                loaded = self.store.load(_canteen_shard(canteen_id))
+                if loaded is not None and loaded[2] == version:
+                    self._install_stored(canteen_id, *loaded)
+                else:
+                    self._install(canteen_id, canteen_models, _component_table(canteen_id, canteen_models), version)
         
         return {
             "canteen_id": canteen_id,
             "dishes_trained": len(canteen_models),
-            "data_points": len(df)
+            "data_points": len(df),
+            "dishes_skipped": skipped,
+            "model_reuse": reuse,
+            "saved": changed,
+            "workers": workers,
+            "fit_seconds": fit_seconds,
+            "fit_seconds_total": round(sum(fit_seconds.values()), 3),
+            "failures": failures,
+            "train_seconds": round(time.perf_counter() - started, 3)
         }
     
+    def history_changed(self, canteen_id, df):
+        """
+        Whether train_from_frame(canteen_id, df) would refit or save anything
+        
+        Compares each dish's daily series against the fingerprints of the
+        canteen's models (see _reuse_plan), stopping at the first changed
+        dish. When nothing changed the dishes count as fingerprint hits in
+        reuse_stats, as the skipped train call would have counted them.
+        """
+        if len(df) < 14:
+            return False
+        self.has_models(canteen_id)
+        previous_models = self.models.get(canteen_id, {})
+        dish_ids = set()
+        for dish_id, series in _daily_series(df):
+            if len(series) < 14:
+                continue
+            if _reuse_plan(previous_models.get(dish_id), series)[0] != 'hit':
+                return True
+            dish_ids.add(dish_id)
+        if dish_ids != previous_models.keys():
+            return True
+        self.reuse_stats["hits"] += len(dish_ids)
+        return False
+    
     def predict_demand(self, canteen_id, dish_id=None, days_ahead=7, historical_data=None):
         """
         Predict demand for upcoming days
@@ -88,7 +616,7 @@ class ForecastingService:
             "predictions": [
                 {"date": "2025-01-15", "predicted_quantity": 28, "confidence_interval": [22, 34]},
                 ...
-            ],
+            ],  # FORECAST_INTERVAL_LEVEL (default 80%) prediction intervals
             "insights": {
                 "trend": "increasing",
                 "peak_day": "Friday",
@@ -96,14 +624,17 @@ class ForecastingService:
             }
         }
         """
-        # If historical data provided, train on-the-fly
+        # If historical data provided, train on-the-fly (a no-op for unchanged history)
         if historical_data and len(historical_data) >= 14:
             self.train_model(canteen_id, historical_data)
         
         # Check if model exists
-        if canteen_id not in self.models:
+        if not self.has_models(canteen_id):
             return self._fallback_prediction(days_ahead)
         
+        # Read the version before the models (see train_from_frame)
+        version = self.model_versions.get(canteen_id, 0)
+        
         canteen_models = self.models[canteen_id]
         
         if dish_id:
@@ -111,103 +642,165 @@ class ForecastingService:
             if dish_id not in canteen_models:
                 return self._fallback_prediction(days_ahead)
             
-            predictions = self._predict_dish(canteen_models[dish_id], days_ahead)
+            predictions = self._cached_prediction(canteen_id, dish_id, canteen_models[dish_id], days_ahead, version)
             return predictions
         else:
             # Predict for all dishes
             all_predictions = {}
             for d_id, model_data in canteen_models.items():
-                all_predictions[d_id] = self._predict_dish(model_data, days_ahead)
+                all_predictions[d_id] = self._cached_prediction(canteen_id, d_id, model_data, days_ahead, version)
             return all_predictions
     
+    def _cached_prediction(self, canteen_id, dish_id, model_data, days_ahead, version):
+        """_predict_dish through the prediction cache"""
+        return self.prediction_cache.get_or_compute(
+            (canteen_id, dish_id, days_ahead, version),
+            lambda: self._predict_dish(model_data, days_ahead)
+        )
+    
+    def warm_up(self):
+        """Migrate a pre-store pickle and import the training libraries ahead of the first request"""
+        with self._load_lock:
+            self._migrate_legacy_models()
+        import statsmodels.tsa.holtwinters
+    
+    def reload_if_changed(self):
+        """
+        Swap in newer saved models of the canteens loaded here (e.g. trained
+        by another worker process); returns the canteens reloaded
+        """
+        reloaded = []
+        for canteen_id, version in list(self.model_versions.items()):
+            shard = _canteen_shard(canteen_id)
+            current = self.store.current_version(shard)
+            if current is None or current <= version:
+                continue
+            loaded = self.store.load(shard)
+            with self._train_lock:
+                # Unless this process saved an even newer version meanwhile
+                if loaded is not None and loaded[2] > self.model_versions.get(canteen_id, 0):
+                    self._install_stored(canteen_id, *loaded)
+                    reloaded.append(canteen_id)
+        if reloaded:
+            print(f"Forecasting models reloaded for canteens {reloaded}")
+        return reloaded
+    
+    def has_models(self, canteen_id):
+        """Whether a canteen has trained models, loading them from the store on first access"""
+        if canteen_id in self.models:
+            return True
+        with self._load_lock:
+            if canteen_id in self.models:
+                return True
+            self._migrate_legacy_models()
+            loaded = self.store.load(_canteen_shard(canteen_id))
+            if loaded is None:
+                return False
+            self._adopt_loaded(*loaded)
+            return True
+    
+    def _adopt_loaded(self, arrays, meta, version):
+        """Install a canteen's models read from the store"""
+        canteen_id = meta['canteen_id']
+        with self._train_lock:
+            # A train call may have swapped in newer models meanwhile
+            if canteen_id not in self.models:
+                self._install_stored(canteen_id, arrays, meta, version)
+        print(f"Forecasting models of canteen {canteen_id} loaded (version {version})")
+    
+    def _install_stored(self, canteen_id, arrays, meta, version):
+        """_install the models of a store version (_train_lock held)"""
+        self._install(canteen_id, _canteen_from_arrays(arrays, meta), _table_from_arrays(canteen_id, arrays, meta), version)
+    
+    def _install(self, canteen_id, canteen_models, table, version):
+        """Swap in a canteen's models and component table (_train_lock held)"""
+        self.component_tables = {**self.component_tables, canteen_id: table}
+        self.models = {**self.models, canteen_id: canteen_models}
+        # After the swap, so a reader seeing the new version also sees the new models
+        self.model_versions = {**self.model_versions, canteen_id: version}
+    
+    def get_stats(self):
+        """Model counts, cumulative fingerprint reuse counters and prediction cache metrics"""
+        models = self.models
+        lookups = sum(self.reuse_stats.values())
+        return {
+            "canteens": len(self.store.shards('forecasting')),
+            "canteens_loaded": len(models),
+            "dishes_loaded": sum(len(canteen_models) for canteen_models in models.values()),
+            "model_reuse": dict(self.reuse_stats),
+            "model_reuse_hit_rate": round(self.reuse_stats["hits"] / lookups, 4) if lookups else 0.0,
+            "prediction_cache": self.prediction_cache.stats()
+        }
+    
     def _predict_dish(self, model_data, days_ahead):
-        """Predict demand for a single dish"""
-        predictions = []
-        
+        """Predict demand for a single dish (a one-row batch_forecast)"""
         try:
-            if model_data['model'] is not None:
-                # Use Holt-Winters model
-                forecast = model_data['model'].forecast(steps=days_ahead)
-                forecast_values = forecast.values
-            else:
-                # Use simple moving average
-                historical = model_data['historical_data']
-                avg = historical[-7:].mean()  # Last week average
-                forecast_values = [avg] * days_ahead
-            
-            # Generate prediction dates
-            last_date = model_data['last_date']
+            table = _component_table(None, {None: model_data})
+            batch = _batch_forecast(table, days_ahead, z=self.interval_z)
+            dates = np.datetime_as_string(table['start_dates'][0] + np.arange(days_ahead), unit='D')
             
-            for i in range(days_ahead):
-                pred_date = last_date + timedelta(days=i+1)
-                pred_value = max(0, round(forecast_values[i]))  # Can't be negative
-                
-                # Simple confidence interval (±20%)
-                lower_bound = max(0, int(pred_value * 0.8))
-                upper_bound = int(pred_value * 1.2)
-                
-                predictions.append({
-                    "date": pred_date.strftime('%Y-%m-%d'),
-                    "predicted_quantity": pred_value,
+            predictions = [
+                {
+                    "date": date,
+                    "predicted_quantity": quantity,
                     "confidence_interval": [lower_bound, upper_bound]
-                })
-            
-            # Calculate insights
-            historical = model_data['historical_data']
-            insights = self._calculate_insights(historical, predictions)
+                }
+                for date, quantity, lower_bound, upper_bound in zip(
+                    dates.tolist(),
+                    batch['predicted_quantity'][0].tolist(),
+                    batch['lower_bound'][0].tolist(),
+                    batch['upper_bound'][0].tolist()
+                )
+            ]
             
             return {
                 "predictions": predictions,
-                "insights": insights
+                "insights": {name: batch[name][0].item() for name in INSIGHT_COLUMNS}
             }
         
         except Exception as e:
             print(f"Prediction error: {e}")
             return self._fallback_prediction(days_ahead)
     
-    def _calculate_insights(self, historical, predictions):
-        """Calculate insights from historical and predicted data"""
-        try:
-            # Trend
-            recent_avg = historical[-7:].mean()
-            older_avg = historical[-14:-7].mean() if len(historical) >= 14 else recent_avg
-            
-            if recent_avg > older_avg * 1.1:
-                trend = "increasing"
-            elif recent_avg < older_avg * 0.9:
-                trend = "decreasing"
-            else:
-                trend = "stable"
-            
-            # Peak day (day of week with highest historical demand)
-            day_of_week_avg = historical.groupby(historical.index.dayofweek).mean()
-            peak_day_idx = day_of_week_avg.idxmax()
-            days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            peak_day = days[peak_day_idx]
-            
-            # Average daily demand
-            pred_values = [p['predicted_quantity'] for p in predictions]
-            average_daily = round(np.mean(pred_values), 1)
-            
-            # Total forecast
-            total_forecast = sum(pred_values)
-            
-            return {
-                "trend": trend,
-                "peak_day": peak_day,
-                "average_daily": average_daily,
-                "total_forecast": total_forecast,
-                "historical_average": round(historical.mean(), 1)
-            }
+    def predict_batch(self, canteen_ids, days_ahead=7):
+        """
+        Forecast every dish of the given canteens in one vectorized pass
         
-        except Exception as e:
-            print(f"Insights calculation error: {e}")
-            return {
-                "trend": "unknown",
-                "peak_day": "unknown",
-                "average_daily": 0,
-                "total_forecast": 0
-            }
+        Forecasts, bounds and insights come from the components stored at fit
+        time (level, trend, weekly season, history summary), one table of
+        arrays per canteen (the memory-mapped store arrays once loaded), so
+        no per-day Python work is done.
+        
+        Returns a columnar result with one row per dish: {
+            "days_ahead": 7,
+            "canteen_id": [...], "dish_id": [...], "start_date": ["2025-01-15", ...],
+            "predicted_quantity": [[28, 30, ...], ...], "lower_bound": [[...]], "upper_bound": [[...]],
+            "trend": [...], "peak_day": [...], "average_daily": [...],
+            "total_forecast": [...], "historical_average": [...],
+            "missing_canteens": [...]
+        }
+        Prediction dates of a row are start_date plus 0..days_ahead-1 days.
+        """
+        tables = []
+        missing = []
+        for canteen_id in canteen_ids:
+            table = self.component_tables.get(canteen_id) if self.has_models(canteen_id) else None
+            if table is None or not table['dish_ids']:
+                missing.append(canteen_id)
+                continue
+            tables.append(table)
+        
+        table = _concat_tables(tables)
+        batch = _batch_forecast(table, days_ahead, z=self.interval_z)
+        result = {
+            "days_ahead": days_ahead,
+            "canteen_id": table['canteen_ids'],
+            "dish_id": table['dish_ids'],
+            "start_date": np.datetime_as_string(table['start_dates'], unit='D').tolist()
+        }
+        result.update({name: values.tolist() for name, values in batch.items()})
+        result["missing_canteens"] = missing
+        return result
     
     def _fallback_prediction(self, days_ahead):
         """Simple fallback when no model is available"""
@@ -231,20 +824,36 @@ class ForecastingService:
             }
         }
     
-    def _save_models(self):
-        """Save models to disk"""
-        os.makedirs('models', exist_ok=True)
-        with open(self.models_path, 'wb') as f:
-            pickle.dump(self.models, f)
-        print(f"Forecasting models saved to {self.models_path}")
+    def _save_models(self, canteen_id, canteen_models):
+        """Write a canteen's models as a new store version; returns the version number"""
+        version = self.store.save(_canteen_shard(canteen_id), *_canteen_to_arrays(canteen_id, canteen_models))
+        print(f"Forecasting models of canteen {canteen_id} saved (version {version})")
+        return version
     
     def load_models(self):
-        """Load models from disk"""
-        if os.path.exists(self.models_path):
+        """Load every canteen's models from the store (normally loaded per canteen on first access)"""
+        with self._load_lock:
+            self._migrate_legacy_models()
+        for shard in self.store.shards('forecasting'):
             try:
-                with open(self.models_path, 'rb') as f:
-                    self.models = pickle.load(f)
-                print(f"Forecasting models loaded from {self.models_path}")
+                self._adopt_loaded(*self.store.load(shard))
             except Exception as e:
-                print(f"Error loading forecasting models: {e}")
-                self.models = {}
+                print(f"Error loading forecasting models from {shard}: {e}")
+    
+    def _migrate_legacy_models(self):
+        """Copy the models of a pre-store pickle into the store, once, if the store has none"""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        if not os.path.exists(self.models_path) or self.store.shards('forecasting'):
+            return
+        try:
+            with open(self.models_path, 'rb') as f:
+                models = pickle.load(f)
+            for canteen_id, canteen_models in models.items():
+                # Models saved with their statsmodels results and full series
+                canteen_models = {dish_id: _compact_legacy_model(model_data) for dish_id, model_data in canteen_models.items()}
+                self._save_models(canteen_id, canteen_models)
+            print(f"Forecasting models migrated from {self.models_path}")
+        except Exception as e:
+            print(f"Error migrating forecasting models: {e}")
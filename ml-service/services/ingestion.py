@@ -0,0 +1,210 @@
+import gzip
+import io
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+DEFAULT_CHUNK_SIZE = 5000  # Records parsed per chunk
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def is_ndjson_request(request):
+    """True when a Flask request carries newline-delimited JSON"""
+    return request.mimetype in NDJSON_MIMETYPES
+
+
+def open_ndjson_stream(stream, content_encoding=None):
+    """
+    Wrap a binary request stream as a text line reader
+
+    Gzip is detected from the Content-Encoding header or the magic bytes,
+    and decompressed on the fly.
+    """
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream)
+    if (content_encoding or '').lower() == 'gzip' or stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+def iter_ndjson_chunks(lines, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of at most chunk_size parsed records, skipping blank lines"""
+    chunk = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _IdCodes:
+    """Interns string ids into integer codes"""
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, value):
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.names)
+            self.codes[value] = code
+            self.names.append(value)
+        return code
+
+    def codes_for(self, values):
+        """int32 codes for an array of ids, interning only its distinct values"""
+        codes, uniques = pd.factorize(values)
+        mapping = np.fromiter((self.code(value) for value in uniques), dtype=np.int32, count=len(uniques))
+        return mapping[codes]
+
+    def categorical(self, codes):
+        """pd.Categorical over the ids, with categories in sorted order"""
+        names = np.array(self.names, dtype=object)
+        order = np.argsort(names, kind='stable')
+        remap = np.empty(len(order), dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        return pd.Categorical.from_codes(remap[np.asarray(codes, dtype=np.int32)], categories=names[order])
+
+
+def _timestamps_ns(values):
+    """int64 UTC nanoseconds for a chunk of timestamp values, NaT where missing"""
+    values = pd.Series(values, dtype=object)
+    parsed = pd.to_datetime(values, utc=True, errors='coerce', format='ISO8601')
+    # Fall back to per-value format inference for anything that is not ISO 8601
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], utc=True, errors='coerce', format='mixed')
+    return parsed.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def flatten_orders(orders):
+    """
+    Columnar arrays for a list of orders, one entry per ordered item
+
+    Builds each column with a single comprehension or np.repeat instead of
+    walking orders row by row through pandas. canteen_id is '' for orders
+    without a canteen.
+    """
+    items_per_order = np.fromiter((len(order.get('items') or ()) for order in orders), dtype=np.int64, count=len(orders))
+    items = [item for order in orders for item in (order.get('items') or ())]
+    return {
+        'user_id': np.repeat(np.array([str(order['student']) for order in orders], dtype=object), items_per_order),
+        'canteen_id': np.repeat(np.array([str(order.get('canteen') or '') for order in orders], dtype=object), items_per_order),
+        'dish_id': np.array([str(item['dish']) for item in items], dtype=object),
+        'quantity': np.fromiter((item.get('quantity', 1) for item in items), dtype=np.float32, count=len(items)),
+        'order_id': np.repeat(np.arange(len(orders), dtype=np.int64), items_per_order),
+        'created_at': np.repeat(_timestamps_ns([order.get('createdAt') for order in orders]), items_per_order)
+    }
+
+
+def interactions_frame(columns):
+    """Interactions DataFrame (categorical ids, UTC timestamps) from flatten_orders output"""
+    return pd.DataFrame({
+        'user_id': pd.Categorical(columns['user_id']),
+        'dish_id': pd.Categorical(columns['dish_id']),
+        'canteen_id': pd.Categorical(columns['canteen_id']),
+        'quantity': columns['quantity'],
+        'order_id': columns['order_id'],
+        'created_at': pd.to_datetime(columns['created_at'], utc=True)
+    })
+
+
+class OrderInteractionBuffer:
+    """
+    Columnar buffer of order items filled chunk by chunk
+
+    Holds one compact typed entry per ordered item (user code, dish code,
+    canteen code, quantity, order number, createdAt) instead of the parsed
+    order dicts.
+    """
+
+    def __init__(self):
+        self.users = _IdCodes()
+        self.dishes = _IdCodes()
+        self.canteens = _IdCodes()
+        self.user_codes = array('i')
+        self.dish_codes = array('i')
+        self.canteen_codes = array('i')
+        self.quantities = array('f')
+        self.order_ids = array('q')
+        self.created_at = array('q')
+        self.orders_count = 0
+
+    def add_orders(self, orders):
+        """Append a chunk of orders in the train_model orders_data format"""
+        columns = flatten_orders(orders)
+        self.user_codes.frombytes(self.users.codes_for(columns['user_id']).tobytes())
+        self.dish_codes.frombytes(self.dishes.codes_for(columns['dish_id']).tobytes())
+        self.canteen_codes.frombytes(self.canteens.codes_for(columns['canteen_id']).tobytes())
+        self.quantities.frombytes(columns['quantity'].tobytes())
+        self.order_ids.frombytes((columns['order_id'] + self.orders_count).tobytes())
+        self.created_at.frombytes(columns['created_at'].tobytes())
+        self.orders_count += len(orders)
+
+    def to_frame(self):
+        """Interactions DataFrame as consumed by RecommendationService"""
+        return pd.DataFrame({
+            'user_id': self.users.categorical(self.user_codes),
+            'dish_id': self.dishes.categorical(self.dish_codes),
+            'canteen_id': self.canteens.categorical(self.canteen_codes),
+            'quantity': np.frombuffer(self.quantities, dtype=np.float32),
+            'order_id': np.frombuffer(self.order_ids, dtype=np.int64),
+            'created_at': pd.to_datetime(np.frombuffer(self.created_at, dtype=np.int64), utc=True)
+        })
+
+
+class HistoryBuffer:
+    """Columnar buffer of daily (date, dish_id, quantity) sales rows"""
+
+    def __init__(self):
+        self.dishes = _IdCodes()
+        self.dish_codes = array('i')
+        self.dates = array('q')
+        self.quantities = array('d')
+
+    def add_rows(self, rows):
+        """Append a chunk of rows in the ForecastingService historical_data format"""
+        self.dates.frombytes(_timestamps_ns([row.get('date') for row in rows]).tobytes())
+        dish_ids = np.array([str(row['dish_id']) for row in rows], dtype=object)
+        self.dish_codes.frombytes(self.dishes.codes_for(dish_ids).tobytes())
+        self.quantities.frombytes(np.fromiter((row.get('quantity', 0) for row in rows), dtype=np.float64, count=len(rows)).tobytes())
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def to_frame(self):
+        """History DataFrame as consumed by ForecastingService"""
+        return pd.DataFrame({
+            'date': pd.to_datetime(np.frombuffer(self.dates, dtype=np.int64)),
+            'dish_id': self.dishes.categorical(self.dish_codes),
+            'quantity': np.frombuffer(self.quantities, dtype=np.float64)
+        })
+
+
+def read_order_stream(stream, content_encoding=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Parse an NDJSON stream of orders (one order per line) into an interactions frame"""
+    buffer = OrderInteractionBuffer()
+    for chunk in iter_ndjson_chunks(open_ndjson_stream(stream, content_encoding), chunk_size):
+        buffer.add_orders(chunk)
+    return buffer.to_frame(), buffer.orders_count
+
+
+def read_history_stream(stream, content_encoding=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Parse an NDJSON stream of daily history rows into a history frame"""
+    buffer = HistoryBuffer()
+    for chunk in iter_ndjson_chunks(open_ndjson_stream(stream, content_encoding), chunk_size):
+        buffer.add_rows(chunk)
+    return buffer.to_frame()
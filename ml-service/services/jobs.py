@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ACTIVE_STATUSES = ('queued', 'running')
+MAX_JOBS_KEPT = 200  # Finished jobs kept in memory
+JOB_RETENTION_SECONDS = 7 * 86400  # Finished job records kept on disk
+PROGRESS_PERSIST_SECONDS = 0.5  # Minimum gap between progress writes
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+# Windows process liveness check, see _pid_alive
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+
+class JobManager:
+    """
+    Background training jobs
+
+    Jobs run on a small thread pool (ML_JOB_WORKERS, default 1) so train
+    requests return a job id right away. Every state change is also written
+    to state_dir as JSON, so any gunicorn worker can answer a status request
+    for a job started by another one.
+
+    Job record: {
+        "job_id": "...", "kind": "recommendations.train", "status": "running",
+        "progress": 0.4, "stage": "Mining association rules",
+        "submitted_at": "...", "started_at": "...", "finished_at": null,
+        "queue_seconds": 0.01, "run_seconds": null, "result": null, "error": null
+    }
+    """
+
+    def __init__(self, state_dir='models/jobs', max_workers=None):
+        self.state_dir = state_dir
+        self.max_workers = max_workers or int(os.getenv('ML_JOB_WORKERS', 1))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ml-job')
+        self.jobs = OrderedDict()  # {job_id: record}, oldest first
+        self.active = {}  # {dedupe_key: job_id} of queued/running jobs
+        self.lock = threading.Lock()
+        if self.state_dir:
+            os.makedirs(self.state_dir, exist_ok=True)
+
+    def submit(self, kind, fn, *args, dedupe_key=None, params=None, **kwargs):
+        """
+        Queue fn(*args, progress=callback, **kwargs) and return the job record
+
+        fn reports progress by calling progress(fraction, stage). With
+        dedupe_key set, a queued or running job under the same key is
+        returned instead of starting a second one.
+        """
+        with self.lock:
+            if dedupe_key is not None and dedupe_key in self.active:
+                return dict(self.jobs[self.active[dedupe_key]])
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "kind": kind,
+                "params": params or {},
+                "status": 'queued',
+                "progress": 0.0,
+                "stage": None,
+                "submitted_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "queue_seconds": None,
+                "run_seconds": None,
+                "result": None,
+                "error": None,
+                "pid": os.getpid()
+            }
+            self.jobs[job['job_id']] = job
+            if dedupe_key is not None:
+                self.active[dedupe_key] = job['job_id']
+            self._trim()
+            snapshot = dict(job)
+
+        self._persist(snapshot)
+        self._prune_records()
+        self.executor.submit(self._run, job, dedupe_key, time.perf_counter(), fn, args, kwargs)
+        return snapshot
+
+    def get(self, job_id):
+        """Job record by id (from memory, else from state_dir), None if unknown"""
+        with self.lock:
+            if job_id in self.jobs:
+                return dict(self.jobs[job_id])
+        if not self.state_dir or not JOB_ID_PATTERN.fullmatch(job_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.state_dir, f"{job_id}.json")) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return _mark_orphaned(job)
+
+    def list_jobs(self, kind=None, limit=20):
+        """Most recent job records first, optionally filtered by kind (results omitted)"""
+        jobs = {}
+        if self.state_dir:
+            for name in os.listdir(self.state_dir):
+                job = self.get(name[:-5]) if name.endswith('.json') else None
+                if job:
+                    jobs[job['job_id']] = job
+        with self.lock:
+            jobs.update((job_id, dict(job)) for job_id, job in self.jobs.items())
+
+        jobs = [job for job in jobs.values() if kind is None or job['kind'] == kind]
+        jobs.sort(key=lambda job: job['submitted_at'], reverse=True)
+        return [{key: value for key, value in job.items() if key != 'result'} for job in jobs[:limit]]
+
+    def _run(self, job, dedupe_key, submitted, fn, args, kwargs):
+        """Execute one job on a pool thread, recording status and timing"""
+        started = time.perf_counter()
+        self._update(job, status='running', started_at=_now(), queue_seconds=round(started - submitted, 3))
+        last_persist = [0.0]
+
+        def progress(fraction, stage=None):
+            now = time.perf_counter()
+            persist = now - last_persist[0] >= PROGRESS_PERSIST_SECONDS
+            if persist:
+                last_persist[0] = now
+            self._update(job, persist=persist, progress=round(min(max(float(fraction), 0.0), 1.0), 3), stage=stage)
+
+        try:
+            result = fn(*args, progress=progress, **kwargs)
+            fields = dict(status='succeeded', progress=1.0, stage=None, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            fields = dict(status='failed', error=str(e))
+
+        with self.lock:
+            if dedupe_key is not None and self.active.get(dedupe_key) == job['job_id']:
+                del self.active[dedupe_key]
+        self._update(job, finished_at=_now(), run_seconds=round(time.perf_counter() - started, 3), **fields)
+        print(f"Job {job['job_id']} ({job['kind']}) {job['status']} in {job['run_seconds']}s")
+
+    def _update(self, job, persist=True, **fields):
+        """Apply fields to a job record and write it to state_dir"""
+        with self.lock:
+            job.update(fields)
+            snapshot = dict(job)
+        if persist:
+            self._persist(snapshot)
+
+    def _persist(self, job):
+        """Atomically write a job record to state_dir"""
+        if not self.state_dir:
+            return
+        path = os.path.join(self.state_dir, f"{job['job_id']}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(job, f, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error saving job {job['job_id']}: {e}")
+
+    def _trim(self):
+        """Drop the oldest finished jobs beyond MAX_JOBS_KEPT from memory (lock held)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_JOBS_KEPT)]:
+            del self.jobs[job_id]
+
+    def _prune_records(self):
+        """Delete job records older than JOB_RETENTION_SECONDS from state_dir"""
+        if not self.state_dir:
+            return
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _mark_orphaned(job):
+    """Report jobs left queued/running by a worker process that has since exited as failed"""
+    if job.get('status') not in ACTIVE_STATUSES:
+        return job
+    pid = job.get('pid')
+    # This process keeps its active jobs in memory
+    alive = pid != os.getpid() and _pid_alive(pid)
+    if not alive:
+        job.update(status='failed', error="Worker process exited before the job finished")
+    return job
+
+
+def _pid_alive(pid):
+    """Whether a process with this id is running"""
+    if not isinstance(pid, int):
+        return False
+    if os.name == 'posix':
+        try:
+            os.kill(pid, 0)  # Signal 0 only checks the process exists
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+        return True
+    # On Windows os.kill sends CTRL_C_EVENT or terminates the process, so ask the kernel instead
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return False
+    try:
+        exit_code = ctypes.c_ulong()
+        return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy import sparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_NAME = 'MANIFEST.json'
+LOCK_NAME = '.lock'  # Serializes manifest updates of a shard across processes
+STORE_FORMAT = 2  # 1: arrays.npz, 2: one .npy file per array (memory-mappable)
+KEEP_VERSIONS = 2  # Versions kept per shard (the current one and its predecessor)
+
+
+class ModelStore:
+    """
+    Versioned on-disk store of model shards
+
+    Each shard (e.g. 'recommendations' or 'forecasting/<canteen>') is a
+    directory of immutable version directories plus a manifest naming the
+    current one:
+
+        <root>/<shard>/MANIFEST.json   {"version": 3, "path": "v000003", ...}
+        <root>/<shard>/v000003/meta.json
+        <root>/<shard>/v000003/<array name>.npy
+
+    A version is written to a temporary directory and renamed into place
+    before the manifest is replaced (also by rename), so readers only ever
+    see complete versions. Only the shard being saved is rewritten. Manifest
+    updates take a per-shard file lock and never move it to an older
+    version, so concurrent saves finishing out of order keep the newest.
+
+    Arrays are loaded as read-only memory maps, so every process that
+    loads a version shares one page-cache copy of it instead of holding a
+    private one. Files are never modified once written; versions pruned
+    while still mapped stay readable until unmapped.
+    """
+
+    def __init__(self, root='models/store'):
+        self.root = root
+
+    def save(self, shard, arrays, meta):
+        """Write a new version of a shard and make it current; returns its version number"""
+        shard_dir = self._shard_dir(shard)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        # 1. Write the version into a private temp directory
+        tmp_dir = os.path.join(shard_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            for name, array in arrays.items():
+                with open(os.path.join(tmp_dir, f"{name}.npy"), 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 2. Rename it to the next free version number (rename fails if another writer took it)
+            version = (self.current_version(shard) or 0) + 1
+            while True:
+                version_dir = os.path.join(shard_dir, _version_name(version))
+                try:
+                    os.rename(tmp_dir, version_dir)
+                    break
+                except OSError:
+                    if not os.path.exists(version_dir):
+                        raise
+                    version += 1
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        # 3. Point the manifest at it, unless a save of a newer version already did
+        with _file_lock(os.path.join(shard_dir, LOCK_NAME)):
+            current = self.current_version(shard) or 0
+            if version > current:
+                self._write_manifest(shard_dir, {
+                    "version": version,
+                    "path": _version_name(version),
+                    "format": STORE_FORMAT,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+                current = version
+            self._prune(shard_dir, current)
+        return version
+
+    def load(self, shard):
+        """
+        (arrays, meta, version) of a shard's current version, or None if it has none
+
+        Arrays are read-only memory maps (format 1 versions are read into memory).
+        """
+        for attempt in range(3):
+            manifest = self.manifest(shard)
+            if manifest is None:
+                return None
+            try:
+                return self._read_version(os.path.join(self._shard_dir(shard), manifest['path']), manifest)
+            except FileNotFoundError:
+                # Pruned by another writer after two newer saves; read the manifest again
+                if attempt == 2:
+                    raise
+
+    def manifest(self, shard):
+        """Current manifest of a shard, None if it was never saved"""
+        try:
+            with open(os.path.join(self._shard_dir(shard), MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def current_version(self, shard):
+        manifest = self.manifest(shard)
+        return manifest['version'] if manifest else None
+
+    def shards(self, prefix):
+        """Names of the saved shards under a prefix, e.g. shards('forecasting')"""
+        prefix_dir = self._shard_dir(prefix)
+        if not os.path.isdir(prefix_dir):
+            return []
+        return [
+            f"{prefix}/{name}" for name in sorted(os.listdir(prefix_dir))
+            if os.path.exists(os.path.join(prefix_dir, name, MANIFEST_NAME))
+        ]
+
+    def size_bytes(self, shard):
+        """Bytes on disk of a shard's current version"""
+        manifest = self.manifest(shard)
+        if manifest is None:
+            return 0
+        version_dir = os.path.join(self._shard_dir(shard), manifest['path'])
+        return sum(entry.stat().st_size for entry in os.scandir(version_dir) if entry.is_file())
+
+    def _shard_dir(self, shard):
+        return os.path.join(self.root, *shard.split('/'))
+
+    def _read_version(self, version_dir, manifest):
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if manifest.get('format', 1) == 1:
+            with np.load(os.path.join(version_dir, 'arrays.npz'), allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        else:
+            arrays = {
+                name[:-4]: np.load(os.path.join(version_dir, name), mmap_mode='r', allow_pickle=False)
+                for name in os.listdir(version_dir) if name.endswith('.npy')
+            }
+        return arrays, meta, manifest['version']
+
+    def _write_manifest(self, shard_dir, manifest):
+        tmp_path = os.path.join(shard_dir, f".{MANIFEST_NAME}.{uuid.uuid4().hex}")
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(shard_dir, MANIFEST_NAME))
+
+    def _prune(self, shard_dir, current):
+        """Remove versions older than the last KEEP_VERSIONS"""
+        for name in os.listdir(shard_dir):
+            match = re.fullmatch(r'v(\d+)', name)
+            if match and int(match.group(1)) <= current - KEEP_VERSIONS:
+                shutil.rmtree(os.path.join(shard_dir, name), ignore_errors=True)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on a file across processes (flock, or msvcrt.locking on Windows)"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            # Locks byte 0; LK_LOCK gives up after about 10 seconds, so keep trying
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            # flock is released when the file is closed
+
+
+def shard_key(value):
+    """Filesystem-safe shard name for an id (e.g. a canteen id)"""
+    value = str(value)
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', value)
+    if safe != value:
+        # Keep distinct ids distinct after sanitizing
+        safe = f"{safe}-{uuid.uuid5(uuid.NAMESPACE_OID, value).hex[:8]}"
+    return safe
+
+
+def sparse_to_arrays(name, matrix):
+    """Flat arrays of a CSR matrix, keyed name.data / .indices / .indptr / .shape"""
+    if matrix is None:
+        return {}
+    matrix = matrix.tocsr()
+    if not matrix.has_canonical_format:
+        # Sorted, duplicate-free indices, so scipy never has to fix them up in the read-only arrays
+        matrix = matrix.copy()
+        matrix.sum_duplicates()
+    return {
+        f"{name}.data": matrix.data,
+        f"{name}.indices": matrix.indices,
+        f"{name}.indptr": matrix.indptr,
+        f"{name}.shape": np.array(matrix.shape, dtype=np.int64)
+    }
+
+
+def sparse_from_arrays(name, arrays):
+    """CSR matrix over arrays saved with sparse_to_arrays (not copied), None if absent"""
+    if f"{name}.data" not in arrays:
+        return None
+    return sparse.csr_matrix(
+        (arrays[f"{name}.data"], arrays[f"{name}.indices"], arrays[f"{name}.indptr"]),
+        shape=tuple(int(n) for n in arrays[f"{name}.shape"])
+    )
+
+
+def _version_name(version):
+    return f"v{version:06d}"
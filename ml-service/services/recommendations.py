@@ -1,9 +1,59 @@
 import numpy as np
 import pandas as pd
-from collections import defaultdict, Counter
+from scipy import sparse
 from datetime import datetime
 import pickle
 import os
+import threading
+import time
+
+from services.ingestion import flatten_orders, interactions_frame
+from services.model_store import ModelStore, shard_key, sparse_from_arrays, sparse_to_arrays
+
+# Size of the per-user recommendation index built at training time
+RECOMMENDATION_INDEX_SIZE = 50
+SIMILAR_USERS = 10
+INDEX_BATCH_SIZE = 1024
+SIMILARITY_BLOCK_ELEMENTS = 1 << 24
+
+# Association rule thresholds (overridable per train_model call)
+DEFAULT_MIN_SUPPORT = 3  # Minimum times items must appear together
+DEFAULT_MIN_CONFIDENCE = 0.0
+DEFAULT_MIN_LIFT = 0.0
+DEFAULT_MAX_RULES_PER_ITEM = 20
+
+BASKET_MODES = ('user', 'order')
+
+DEFAULT_TRAINING_CONFIG = {
+    "basket_mode": 'user',
+    "half_life_days": None,
+    "min_support": DEFAULT_MIN_SUPPORT,
+    "min_confidence": DEFAULT_MIN_CONFIDENCE,
+    "min_lift": DEFAULT_MIN_LIFT,
+    "max_rules_per_item": DEFAULT_MAX_RULES_PER_ITEM
+}
+
+RECOMMENDATION_REASONS = ["Based on your previous orders", "Frequently ordered together"]
+# Attributes of the service itself rather than its model, kept when a staged model is swapped in
+SERVICE_STATE = ('_train_lock', '_swap_lock', '_load_lock', 'sentiment_scores', 'sentiment_weight',
+                 'canteen_models', 'missing_canteens', 'global_fallback', '_canteens_lock')
+
+# Sentiment re-ranking: score + weight * dish sentiment score (-1..1), over
+# SENTIMENT_RERANK_POOL times as many candidates as requested
+# (RECOMMENDATION_SENTIMENT_WEIGHT overrides, 0 disables); the per-dish scores
+# are read again every SENTIMENT_REFRESH_SECONDS (RECOMMENDATION_SENTIMENT_REFRESH)
+DEFAULT_SENTIMENT_WEIGHT = 0.2
+SENTIMENT_RERANK_POOL = 3
+SENTIMENT_REFRESH_SECONDS = 300
+
+# Model store shard of the global model; each canteen's model is the shard
+# MODEL_SHARD/<canteen> (the global one stays where earlier releases saved it)
+MODEL_SHARD = 'recommendations'
+# Whether canteens without a model of their own are served from the global
+# one, restricted to their dishes (RECOMMENDATION_GLOBAL_FALLBACK overrides)
+DEFAULT_GLOBAL_FALLBACK = True
+SPARSE_MATRICES = ('user_item_matrix', 'item_similarity', 'item_gram', 'cooccurrence')
+DENSE_ARRAYS = ('rec_items', 'rec_scores', 'rec_reasons', 'item_counts')
 
 class RecommendationService:
     """
@@ -11,23 +61,94 @@ class RecommendationService:
     1. Collaborative Filtering (User-based)
     2. Association Rules (Frequently bought together)
     3. Popularity-based recommendations (fallback)
+    
+    The model is saved to the model store and loaded on first access, its
+    arrays as read-only memory maps shared by every worker process;
+    model_path is the pickle of earlier releases, migrated into the store
+    if the store has no model yet.
+    
+    Given a sentiment source (SentimentService), recommendations are
+    re-ranked with its per-dish sentiment scores, held in a SentimentScoreTable
+    refreshed in the background.
+    
+    Every canteen has a model of its own, trained on its orders only and
+    saved to its own store shard: an instance with canteen_id set. The
+    global instance (canteen_id None) holds the model over all orders,
+    trains the canteen models from the canteens of the orders it is given
+    and loads them on first request, so a canteen's recommendations only
+    ever touch its own dishes.
     """
     
-    def __init__(self):
-        self.user_item_matrix = None
-        self.item_similarity = None
+    def __init__(self, model_path='models/recommendation_model.pkl', load=True, store=None, sentiment=None,
+                 sentiment_weight=None, canteen_id=None, global_fallback=None):
+        self.user_item_matrix = None  # CSR users x dishes, rows/cols follow user_ids/item_ids
+        self.item_similarity = None  # CSR dishes x dishes
         self.popular_items = []
         self.association_rules = {}
-        self.model_path = 'models/recommendation_model.pkl'
-        self.load_model()
+        # Precomputed top-N index: {user_id: row} into the rec_* arrays
+        self.user_ids = []
+        self.user_index = {}
+        self.item_ids = []
+        self.item_index = {}
+        self.item_canteens = {}  # {dish_id: canteen_id}, global model only
+        self.rec_items = None
+        self.rec_scores = None
+        self.rec_reasons = None
+        # Running aggregates kept so update_model can fold in new orders
+        self.item_gram = None  # CSR dishes x dishes, X^T X of user_item_matrix
+        self.item_counts = None  # Weighted quantity per dish (popularity)
+        self.cooccurrence = None  # CSR dishes x dishes basket counts, diagonal = per-dish basket counts
+        self.basket_weight_total = 0.0
+        self.watermark = None  # Newest createdAt folded into the model
+        self.training_config = dict(DEFAULT_TRAINING_CONFIG)
+        self.model_path = model_path
+        self.store = store or ModelStore(os.path.join(os.path.dirname(model_path) or '.', 'store'))
+        self.canteen_id = canteen_id
+        self.shard = MODEL_SHARD if canteen_id is None else _canteen_shard(canteen_id)
+        self.model_version = None  # Store version of the current model
+        # Training runs on a staged copy; _swap_lock guards the swap against readers
+        self._train_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = not load  # With load, the saved model is read on first access
+        # Optional re-ranking stage
+        if sentiment_weight is None:
+            sentiment_weight = float(os.getenv('RECOMMENDATION_SENTIMENT_WEIGHT', DEFAULT_SENTIMENT_WEIGHT))
+        self.sentiment_weight = sentiment_weight
+        # A lambda, so a lazily built sentiment service is only built by the first refresh
+        self.sentiment_scores = SentimentScoreTable(lambda: sentiment.get_dish_scores()) if sentiment is not None else None
+        # Canteen models loaded (or trained) so far, {canteen_id: RecommendationService}
+        self.canteen_models = {}
+        # Canteens found without a saved model, {canteen_id: store version then (None if never saved)},
+        # so requests for them skip the store until reload_if_changed sees a new version
+        self.missing_canteens = {}
+        if global_fallback is None:
+            global_fallback = os.getenv('RECOMMENDATION_GLOBAL_FALLBACK', str(DEFAULT_GLOBAL_FALLBACK)).lower() in ('true', '1')
+        self.global_fallback = global_fallback
+        self._canteens_lock = threading.Lock()
     
-    def train_model(self, orders_data):
+    def train_model(self, orders_data, min_support=DEFAULT_MIN_SUPPORT, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                    min_lift=DEFAULT_MIN_LIFT, max_rules_per_item=DEFAULT_MAX_RULES_PER_ITEM,
+                    basket_mode='user', half_life_days=None, progress=None, canteen_id=None, train_global=True):
         """
         Train recommendation model from orders data
         
+        min_support, min_confidence, min_lift and max_rules_per_item control
+        association rule mining. basket_mode is 'user' (a user's whole history
+        is one basket) or 'order' (one basket per order). With half_life_days
+        set, interactions are weighted by 0.5 ** (age_days / half_life_days)
+        relative to the newest createdAt. progress(fraction, stage), if
+        given, is called as training advances.
+        
+        Every canteen found in the orders gets its model trained on its own
+        orders, and the global model on all of them unless train_global is
+        False. With canteen_id, only that canteen's model is trained, from
+        all the given orders.
+        
         orders_data format: [
             {
                 "student": "user_id",
+                "canteen": "canteen_id",
                 "items": [{"dish": "dish_id", "quantity": 1}],
                 "createdAt": "timestamp"
             }
@@ -36,218 +157,1075 @@ class RecommendationService:
         if not orders_data or len(orders_data) < 10:
             return {"message": "Insufficient data for training", "orders_count": len(orders_data)}
         
-        # Convert to DataFrame
-        df = pd.DataFrame(orders_data)
-        
-        # Flatten items
-        rows = []
-        for _, order in df.iterrows():
-            user_id = str(order['student'])
-            for item in order['items']:
-                rows.append({
-                    'user_id': user_id,
-                    'dish_id': str(item['dish']),
-                    'quantity': item.get('quantity', 1)
-                })
-        
-        interactions_df = pd.DataFrame(rows)
-        
-        # 1. Build User-Item Matrix (for collaborative filtering)
-        self.user_item_matrix = interactions_df.pivot_table(
-            index='user_id',
-            columns='dish_id',
-            values='quantity',
-            aggfunc='sum',
-            fill_value=0
+        return self.train_from_interactions(
+            self._orders_to_interactions(orders_data),
+            min_support=min_support,
+            min_confidence=min_confidence,
+            min_lift=min_lift,
+            max_rules_per_item=max_rules_per_item,
+            basket_mode=basket_mode,
+            half_life_days=half_life_days,
+            progress=progress,
+            canteen_id=canteen_id,
+            train_global=train_global
         )
+    
+    def train_from_interactions(self, interactions_df, min_support=DEFAULT_MIN_SUPPORT,
+                                min_confidence=DEFAULT_MIN_CONFIDENCE, min_lift=DEFAULT_MIN_LIFT,
+                                max_rules_per_item=DEFAULT_MAX_RULES_PER_ITEM, basket_mode='user',
+                                half_life_days=None, progress=None, canteen_id=None, train_global=True):
+        """
+        Train from already flattened order items
+        
+        interactions_df columns: user_id, dish_id, canteen_id (optional),
+        quantity, order_id, created_at (see _orders_to_interactions and
+        services.ingestion). Parameters as in train_model.
+        
+        Returns the global model's metrics (when trained) plus "canteens":
+        {canteen_id: that canteen's metrics}.
+        """
+        if basket_mode not in BASKET_MODES:
+            raise ValueError(f"basket_mode must be one of {BASKET_MODES}")
+        params = dict(
+            min_support=min_support,
+            min_confidence=min_confidence,
+            min_lift=min_lift,
+            max_rules_per_item=max_rules_per_item,
+            basket_mode=basket_mode,
+            half_life_days=half_life_days
+        )
+        progress = progress or _no_progress
+        if self.canteen_id is not None:
+            return self._train(interactions_df, progress=progress, **params)
+        if canteen_id is not None:
+            model = self._canteen_model(canteen_id, create=True)
+            return {"canteens": {model.canteen_id: model._train(interactions_df, progress=progress, **params)}}
         
-        # 2. Calculate Item Similarity (Cosine similarity)
-        from sklearn.metrics.pairwise import cosine_similarity
-        item_matrix = self.user_item_matrix.T
-        self.item_similarity = cosine_similarity(item_matrix)
+        # One model per canteen, then the global one
+        partitions = _split_by_canteen(interactions_df)
+        steps = len(partitions) + bool(train_global)
+        canteens = {}
+        for step, (partition_id, partition_df) in enumerate(partitions):
+            canteens[partition_id] = self._canteen_model(partition_id, create=True)._train(
+                partition_df, progress=_step_progress(progress, step, steps, f"Canteen {partition_id}"), **params
+            )
+        result = {}
+        if train_global:
+            result = self._train(interactions_df, progress=_step_progress(progress, len(partitions), steps), **params)
+        result["canteens"] = canteens
+        return result
+    
+    def _train(self, interactions_df, min_support, min_confidence, min_lift, max_rules_per_item,
+               basket_mode, half_life_days, progress):
+        """
+        Train this instance's model (global or one canteen's)
+        
+        The new model is built and saved on a staged instance and swapped
+        in only once that succeeds, so requests keep being served from the
+        previous model meanwhile and a failed run leaves it untouched.
+        """
+        orders_count = int(interactions_df['order_id'].nunique()) if len(interactions_df) else 0
+        if orders_count < 10:
+            return {"message": "Insufficient data for training", "orders_count": orders_count}
+        
+        with self._train_lock:
+            staged = self._new_instance()
+            result = staged._fit(
+                interactions_df,
+                min_support=min_support,
+                min_confidence=min_confidence,
+                min_lift=min_lift,
+                max_rules_per_item=max_rules_per_item,
+                basket_mode=basket_mode,
+                half_life_days=half_life_days,
+                progress=progress
+            )
+            self._swap_in(staged)
+        return result
+    
+    def _fit(self, interactions_df, min_support, min_confidence, min_lift, max_rules_per_item,
+             basket_mode, half_life_days, progress):
+        """Full training into this (staged) instance, see train_from_interactions"""
+        # The weight and item_code columns added below stay off the caller's frame
+        interactions_df = interactions_df.copy(deep=False)
+        timestamps = _parse_timestamps(interactions_df['created_at'])
+        self.watermark = timestamps.max() if timestamps.notna().any() else None
+        interactions_df['weight'] = _recency_weights(timestamps, self.watermark, half_life_days)
+        self.training_config = {
+            "basket_mode": basket_mode,
+            "half_life_days": half_life_days,
+            "min_support": min_support,
+            "min_confidence": min_confidence,
+            "min_lift": min_lift,
+            "max_rules_per_item": max_rules_per_item
+        }
+        
+        # 1. Build sparse User-Item Matrix (for collaborative filtering)
+        progress(0.05, "Building user-item matrix")
+        user_codes, user_ids = pd.factorize(interactions_df['user_id'], sort=True)
+        item_codes, item_ids = pd.factorize(interactions_df['dish_id'], sort=True)
+        quantities = (interactions_df['quantity'] * interactions_df['weight']).to_numpy(dtype=np.float32)
+        self.user_ids = [str(user_id) for user_id in user_ids]
+        self.item_ids = [str(dish_id) for dish_id in item_ids]
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.item_index = {dish_id: idx for idx, dish_id in enumerate(self.item_ids)}
+        self.user_item_matrix = sparse.csr_matrix(
+            (quantities, (user_codes, item_codes)),
+            shape=(len(self.user_ids), len(self.item_ids)),
+            dtype=np.float32
+        )
+        self.user_item_matrix.sum_duplicates()
+        interactions_df['item_code'] = item_codes
+        if self.canteen_id is None:
+            self.item_canteens = _item_canteens(interactions_df)
+        
+        # 2. Calculate Item Similarity (Cosine similarity from the item Gram matrix, kept sparse)
+        progress(0.2, "Computing item similarity")
+        self.item_gram = (self.user_item_matrix.T @ self.user_item_matrix).tocsr()
+        self.item_similarity = _cosine_from_gram(self.item_gram)
         
         # 3. Find Popular Items
-        item_counts = interactions_df.groupby('dish_id')['quantity'].sum()
-        self.popular_items = item_counts.nlargest(20).index.tolist()
+        self.item_counts = np.bincount(item_codes, weights=quantities, minlength=len(self.item_ids))
+        self.popular_items = self._top_popular_items()
         
         # 4. Mine Association Rules (items frequently bought together)
-        self._mine_association_rules(interactions_df)
+        progress(0.3, "Mining association rules")
+        rules_stats = self._mine_association_rules(
+            interactions_df,
+            min_support=min_support,
+            min_confidence=min_confidence,
+            min_lift=min_lift,
+            max_rules_per_item=max_rules_per_item,
+            basket_mode=basket_mode
+        )
+        
+        # 5. Precompute per-user recommendations
+        self._build_recommendation_index(
+            progress=lambda fraction: progress(0.4 + 0.5 * fraction, "Building recommendation index")
+        )
         
         # Save model
+        progress(0.95, "Saving model")
         self._save_model()
         
+        n_users, n_items = self.user_item_matrix.shape
         return {
-            "users_count": len(self.user_item_matrix),
-            "items_count": len(self.user_item_matrix.columns),
+            "canteen_id": self.canteen_id,
+            "users_count": n_users,
+            "items_count": n_items,
             "popular_items_count": len(self.popular_items),
-            "association_rules_count": len(self.association_rules)
+            "association_rules_count": len(self.association_rules),
+            "association_rules": rules_stats,
+            "index_size": RECOMMENDATION_INDEX_SIZE,
+            "watermark": self.watermark.isoformat() if self.watermark is not None else None,
+            "footprint": self._footprint_report()
         }
     
-    def get_recommendations(self, user_id, limit=10, canteen_id=None):
+    def update_model(self, orders_data, canteen_id=None, train_global=True):
         """
-        Get personalized recommendations for a user
+        Fold orders newer than the watermark into the trained model
+        
+        Updates user-item counts, popularity, co-occurrence counts, the item
+        similarity rows of touched dishes and the index rows of touched users
+        in place, so the cost follows the size of the delta instead of the
+        full order history. Orders at or before the watermark, or without a
+        createdAt, are skipped. Index rows of users outside the delta keep
+        their previous recommendations until the next full train_model.
+        Like training, the update is applied to a staged copy that is
+        swapped in once saved.
+        
+        Orders reach their canteen's model (trained from them if it has none
+        yet) and, unless train_global is False, the global model; canteen_id
+        sends all of them to that canteen's model only.
+        
+        orders_data format: same as train_model
+        """
+        return self.update_from_interactions(
+            self._orders_to_interactions(orders_data), len(orders_data), canteen_id=canteen_id, train_global=train_global
+        )
+    
+    def update_from_interactions(self, interactions_df, orders_count, canteen_id=None, train_global=True):
+        """Incremental update from already flattened order items (see update_model)"""
+        if self.canteen_id is not None:
+            return self._update(interactions_df, orders_count)
+        if canteen_id is not None:
+            model = self._canteen_model(canteen_id, create=True)
+            return {"canteens": {model.canteen_id: model._update(interactions_df, orders_count)}}
+        
+        canteens = {
+            partition_id: self._canteen_model(partition_id, create=True)._update(
+                partition_df, int(partition_df['order_id'].nunique())
+            )
+            for partition_id, partition_df in _split_by_canteen(interactions_df)
+        }
+        result = self._update(interactions_df, orders_count) if train_global else {}
+        result["canteens"] = canteens
+        return result
+    
+    def _update(self, interactions_df, orders_count):
+        """Incremental update of this instance's model (see update_model)"""
+        self._ensure_loaded()
+        if self.user_item_matrix is None:
+            return self._train(interactions_df, progress=_no_progress, **self.training_config)
+        
+        with self._train_lock:
+            # Build on the newest saved model, which another worker may have written
+            self._reload_if_stale()
+            staged = self._staged_copy()
+            result = staged._apply_update(interactions_df, orders_count)
+            if result.get('affected_users'):
+                self._swap_in(staged)
+        return result
+    
+    def _apply_update(self, interactions_df, orders_count):
+        """Fold new interactions into this (staged) instance, see update_model"""
+        started = time.perf_counter()
+        self._ensure_incremental_state()
+        config = self.training_config
+        
+        timestamps = _parse_timestamps(interactions_df['created_at'])
+        fresh = timestamps.notna()
+        if self.watermark is not None:
+            fresh &= timestamps > self.watermark
+        interactions_df = interactions_df[fresh.to_numpy()].reset_index(drop=True)
+        timestamps = timestamps[fresh].reset_index(drop=True)
+        new_orders = int(interactions_df['order_id'].nunique())
+        
+        metrics = {
+            "new_orders": new_orders,
+            "skipped_orders": orders_count - new_orders
+        }
+        if interactions_df.empty:
+            metrics["watermark"] = self.watermark.isoformat() if self.watermark is not None else None
+            return metrics
+        
+        # Age existing aggregates to the new watermark before adding the delta
+        new_watermark = timestamps.max()
+        half_life_days = config['half_life_days']
+        if self.watermark is not None and new_watermark < self.watermark:
+            new_watermark = self.watermark
+        if half_life_days and self.watermark is not None:
+            age_days = (new_watermark - self.watermark).total_seconds() / 86400
+            decay = 0.5 ** (age_days / half_life_days)
+            self.user_item_matrix = self.user_item_matrix * decay
+            self.item_gram = self.item_gram * decay ** 2
+            self.item_counts = self.item_counts * decay
+            if config['basket_mode'] == 'order':
+                self.cooccurrence = self.cooccurrence * decay
+                self.basket_weight_total *= decay
+        self.watermark = new_watermark
+        weights = _recency_weights(timestamps, new_watermark, half_life_days)
+        
+        # Register new users and dishes
+        n_users_before, n_items_before = self.user_item_matrix.shape
+        user_codes = _extend_ids(interactions_df['user_id'], self.user_ids, self.user_index)
+        item_codes = _extend_ids(interactions_df['dish_id'], self.item_ids, self.item_index)
+        if self.canteen_id is None:
+            self.item_canteens.update(_item_canteens(interactions_df))
+        n_users, n_items = len(self.user_ids), len(self.item_ids)
+        self._resize_model(n_users, n_items)
         
+        # 1. User-item counts and the item Gram matrix, touched rows only
+        quantities = (interactions_df['quantity'].to_numpy() * weights).astype(np.float32)
+        delta = sparse.csr_matrix((quantities, (user_codes, item_codes)), shape=(n_users, n_items))
+        users = np.unique(user_codes)
+        items = np.unique(item_codes)
+        old_rows = self.user_item_matrix[users]
+        self.user_item_matrix = (self.user_item_matrix + delta).tocsr()
+        new_rows = self.user_item_matrix[users]
+        self.item_gram = (self.item_gram + new_rows.T @ new_rows - old_rows.T @ old_rows).tocsr()
+        
+        # 2. Popularity
+        self.item_counts = self.item_counts + np.bincount(item_codes, weights=quantities, minlength=n_items)
+        self.popular_items = self._top_popular_items()
+        
+        # 3. Co-occurrence counts
+        if config['basket_mode'] == 'order':
+            basket_codes, basket_ids = pd.factorize(interactions_df['order_id'])
+            baskets = _binary(sparse.csr_matrix(
+                (np.ones(len(basket_codes)), (basket_codes, item_codes)),
+                shape=(len(basket_ids), n_items)
+            ))
+            basket_weights = np.zeros(len(basket_ids))
+            basket_weights[basket_codes] = weights
+            self.cooccurrence = (self.cooccurrence + sparse.diags(basket_weights).dot(baskets).T @ baskets).tocsr()
+            self.basket_weight_total += basket_weights.sum()
+        else:
+            old_baskets, new_baskets = _binary(old_rows), _binary(new_rows)
+            self.cooccurrence = (self.cooccurrence + new_baskets.T @ new_baskets - old_baskets.T @ old_baskets).tocsr()
+            self.basket_weight_total = float(n_users)
+        self.cooccurrence.eliminate_zeros()
+        
+        # 4. Similarity rows of touched dishes, association rules and index rows of touched users
+        self._refresh_similarity_rows(items)
+        self._derive_association_rules()
+        self._build_recommendation_index(rows=users)
+        
+        self._save_model()
+        
+        metrics.update({
+            "canteen_id": self.canteen_id,
+            "new_users": n_users - n_users_before,
+            "new_items": n_items - n_items_before,
+            "affected_users": len(users),
+            "affected_items": len(items),
+            "users_count": n_users,
+            "items_count": n_items,
+            "association_rules_count": len(self.association_rules),
+            "watermark": self.watermark.isoformat(),
+            "update_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+        return metrics
+    
+    def _staged_copy(self):
+        """
+        Copy of this service that update_from_interactions can modify freely
+        
+        Containers that the update changes in place (id lists and maps, index
+        arrays, sparse matrices resized in place) are copied; everything
+        else is shared until replaced.
+        """
+        staged = self._new_instance()
+        staged.__dict__.update(self.__dict__)
+        for name in ('user_ids', 'item_ids', 'user_index', 'item_index', 'item_canteens', 'training_config'):
+            setattr(staged, name, getattr(self, name).copy())
+        for name in ('user_item_matrix', 'item_gram', 'item_similarity', 'cooccurrence',
+                     'rec_items', 'rec_scores', 'rec_reasons'):
+            if getattr(self, name) is not None:
+                setattr(staged, name, getattr(self, name).copy())
+        return staged
+    
+    def _new_instance(self):
+        """Empty, unloaded instance for the same model (shard), to stage a new version in"""
+        return RecommendationService(model_path=self.model_path, load=False, store=self.store, canteen_id=self.canteen_id)
+    
+    def _swap_in(self, staged, if_unloaded=False):
+        """Adopt a staged instance's model state in one step (with if_unloaded, only before any model is in)"""
+        state = {name: value for name, value in staged.__dict__.items() if name not in SERVICE_STATE}
+        with self._swap_lock:
+            if not (if_unloaded and self._loaded):
+                self.__dict__.update(state)
+    
+    def warm_up(self):
+        """Load the saved model now rather than on the first request, and start reading the sentiment scores"""
+        self._ensure_loaded()
+        if self.sentiment_scores is not None and self.sentiment_weight:
+            self.sentiment_scores.get()
+    
+    def reload_if_changed(self):
+        """
+        Swap in newer saved models (e.g. trained by another worker process):
+        the global one and those of the canteens loaded so far
+        
+        A model is skipped while this process is training or updating it,
+        which saves a version of its own. Returns True if any was swapped in.
+        """
+        reloaded = [model.canteen_id for model in self.canteen_models.values() if model._reload_model()]
+        self.missing_canteens = {
+            canteen_id: version for canteen_id, version in self.missing_canteens.items()
+            if self.store.current_version(_canteen_shard(canteen_id)) == version
+        }
+        if reloaded:
+            print(f"Recommendation models reloaded for canteens {reloaded}")
+        return self._reload_model() or bool(reloaded)
+    
+    def _reload_model(self):
+        """Swap in a newer saved version of this instance's model; True if one was swapped in"""
+        if not self._loaded or not self._train_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._reload_if_stale()
+        finally:
+            self._train_lock.release()
+    
+    def _reload_if_stale(self):
+        """_reload_model body (_train_lock held)"""
+        version = self.store.current_version(self.shard)
+        if version is None or (self.model_version is not None and version <= self.model_version):
+            return False
+        staged = self._new_instance()
+        if not staged.load_model():
+            return False
+        self._swap_in(staged)
+        return True
+    
+    def _ensure_loaded(self):
+        """Load the saved model on first access"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            staged = self._new_instance()
+            # A model trained meanwhile is newer than the saved one
+            if staged.load_model():
+                self._swap_in(staged, if_unloaded=True)
+            self._loaded = True
+    
+    def _canteen_model(self, canteen_id, create=False):
+        """
+        A canteen's model, loaded from its store shard on first access
+        
+        None if the canteen has no saved model, unless create is set: then an
+        empty instance to train is registered. A miss is remembered in
+        missing_canteens until a new version of the canteen's shard is saved.
+        """
+        canteen_id = str(canteen_id)
+        model = self.canteen_models.get(canteen_id)
+        if model is not None:
+            return model
+        if not create and canteen_id in self.missing_canteens:
+            return None
+        with self._canteens_lock:
+            model = self.canteen_models.get(canteen_id)
+            if model is None:
+                model = RecommendationService(model_path=self.model_path, load=False, store=self.store, canteen_id=canteen_id)
+                if not model.load_model() and not create:
+                    version = self.store.current_version(model.shard)
+                    self.missing_canteens = {**self.missing_canteens, canteen_id: version}
+                    return None
+                # Replaced, not mutated, so readers never see the dict change size
+                self.canteen_models = {**self.canteen_models, canteen_id: model}
+                self.missing_canteens = {key: value for key, value in self.missing_canteens.items() if key != canteen_id}
+        return model
+    
+    def _orders_to_interactions(self, orders_data):
+        """Flatten orders into one (user, dish, canteen, quantity, order, createdAt) row per item"""
+        return interactions_frame(flatten_orders(orders_data))
+    
+    def _top_popular_items(self):
+        """Top 20 dishes by (weighted) quantity"""
+        popular_idx = np.argsort(-self.item_counts, kind='stable')[:20]
+        return [self.item_ids[idx] for idx in popular_idx]
+    
+    def _resize_model(self, n_users, n_items):
+        """Grow matrices and index arrays after new users or dishes appear"""
+        self.user_item_matrix.resize((n_users, n_items))
+        for name in ('item_gram', 'item_similarity', 'cooccurrence'):
+            getattr(self, name).resize((n_items, n_items))
+        self.item_counts = np.pad(self.item_counts, (0, n_items - len(self.item_counts)))
+        extra_rows = n_users - len(self.rec_items)
+        if extra_rows > 0:
+            self.rec_items = np.vstack([self.rec_items, np.full((extra_rows, RECOMMENDATION_INDEX_SIZE), -1, dtype=np.int32)])
+            self.rec_scores = np.vstack([self.rec_scores, np.zeros((extra_rows, RECOMMENDATION_INDEX_SIZE), dtype=np.float32)])
+            self.rec_reasons = np.vstack([self.rec_reasons, np.zeros((extra_rows, RECOMMENDATION_INDEX_SIZE), dtype=np.int8)])
+    
+    def _refresh_similarity_rows(self, items):
+        """Recompute the cosine similarity rows (and mirrored columns) of the given dishes"""
+        n_items = self.item_gram.shape[0]
+        inverse_norms = _inverse_norms(self.item_gram)
+        touched = np.zeros(n_items, dtype=np.float32)
+        touched[items] = 1
+        untouched = sparse.diags(1 - touched)
+        
+        rows = (sparse.diags(inverse_norms[items]) @ self.item_gram[items] @ sparse.diags(inverse_norms)).tocoo()
+        placed = sparse.csr_matrix((rows.data, (items[rows.row], rows.col)), shape=(n_items, n_items))
+        overlap = placed @ sparse.diags(touched)
+        kept = untouched @ self.item_similarity @ untouched
+        self.item_similarity = (kept + placed + placed.T - overlap).astype(np.float32).tocsr()
+    
+    def _ensure_incremental_state(self):
+        """Derive running aggregates for models saved before update_model existed"""
+        matrix = self.user_item_matrix
+        if not self.item_index:
+            self.item_index = {dish_id: idx for idx, dish_id in enumerate(self.item_ids)}
+        if self.item_gram is None:
+            self.item_gram = (matrix.T @ matrix).tocsr()
+        if self.item_counts is None:
+            self.item_counts = np.asarray(matrix.sum(axis=0), dtype=np.float64).ravel()
+        if self.item_similarity is None:
+            self.item_similarity = _cosine_from_gram(self.item_gram)
+        if self.cooccurrence is None:
+            # Older models always used one basket per user
+            baskets = _binary(matrix)
+            self.cooccurrence = (baskets.T @ baskets).tocsr()
+            self.basket_weight_total = float(matrix.shape[0])
+            self.training_config['basket_mode'] = 'user'
+    
+    def get_recommendations(self, user_id, limit=10, canteen_id=None, sentiment_weight=None):
+        """
+        Get personalized recommendations for a user
+
+        Served from the precomputed per-user index built at training time,
+        so the cost depends on `limit`, not on the number of users.
+
+        With canteen_id, from that canteen's model, so only its dishes are
+        recommended; a canteen without one is served from the global model
+        filtered to its dishes (if global_fallback), else gets none.
+
+        With a sentiment source and a non-zero sentiment_weight (default:
+        the service's), a larger candidate pool is re-ranked by
+        score + sentiment_weight * the dish's sentiment score, read from the
+        cached score table; dishes without reviews keep their score.
+
         Returns: [
             {
                 "dish_id": "...",
                 "score": 0.95,
-                "reason": "Based on your previous orders"
+                "reason": "Based on your previous orders",
+                "sentiment_score": 0.4  # only when re-ranked
             }
         ]
         """
+        self._ensure_loaded()
+        weight = self.sentiment_weight if sentiment_weight is None else sentiment_weight
+        scores = self.sentiment_scores.get() if weight and self.sentiment_scores is not None else None
+        pool = limit * SENTIMENT_RERANK_POOL if scores else limit
+
+        model = self if canteen_id is None else self._canteen_model(canteen_id)
+        if model is not None and model.rec_items is not None:
+            with model._swap_lock:
+                candidates = model._recommend(user_id, pool)
+        elif canteen_id is not None and self.global_fallback:
+            candidates = self._recommend_for_canteen(user_id, pool, str(canteen_id))
+        else:
+            return []
+        if not scores:
+            return candidates
+
+        for recommendation in candidates:
+            sentiment_score = scores.get(recommendation['dish_id'], 0.0)
+            recommendation['sentiment_score'] = round(sentiment_score, 4)
+            recommendation['score'] = round(recommendation['score'] + weight * sentiment_score, 4)
+        # Stable, so equal scores keep their index order
+        candidates.sort(key=lambda recommendation: recommendation['score'], reverse=True)
+        return candidates[:limit]
+
+    def _recommend_for_canteen(self, user_id, limit, canteen_id):
+        """Global model recommendations restricted to a canteen's dishes (models without dish canteens: unrestricted)"""
+        with self._swap_lock:
+            item_canteens = self.item_canteens
+            if not item_canteens:
+                return self._recommend(user_id, limit)
+            # Every indexed and popular dish, so filtering leaves as many as possible
+            candidates = self._recommend(user_id, RECOMMENDATION_INDEX_SIZE + len(self.popular_items))
+        return [
+            recommendation for recommendation in candidates
+            if item_canteens.get(recommendation['dish_id']) == canteen_id
+        ][:limit]
+
+    def _recommend(self, user_id, limit):
+        """get_recommendations body, called with _swap_lock held"""
         recommendations = []
-        
-        # Strategy 1: Collaborative Filtering (if user has order history)
-        if self.user_item_matrix is not None and user_id in self.user_item_matrix.index:
-            collab_recs = self._get_collaborative_recommendations(user_id, limit * 2)
-            recommendations.extend(collab_recs)
-        
-        # Strategy 2: Association Rules (based on user's recent items)
-        if user_id in self.user_item_matrix.index:
-            user_items = self.user_item_matrix.loc[user_id]
-            recent_items = user_items[user_items > 0].index.tolist()
-            if recent_items:
-                assoc_recs = self._get_association_recommendations(recent_items[:3], limit)
-                recommendations.extend(assoc_recs)
-        
+        seen = set()
+
+        # Strategy 1 + 2: Collaborative Filtering and Association Rules (precomputed)
+        row = self.user_index.get(user_id)
+        if row is not None and self.rec_items is not None:
+            indexed_items = self.rec_items[row]
+            indexed_scores = self.rec_scores[row]
+            indexed_reasons = self.rec_reasons[row]
+            for position in range(len(indexed_items)):
+                item_idx = indexed_items[position]
+                if item_idx < 0:
+                    break
+                dish_id = self.item_ids[item_idx]
+                seen.add(dish_id)
+                if len(recommendations) < limit:
+                    recommendations.append({
+                        "dish_id": dish_id,
+                        "score": float(indexed_scores[position]),
+                        "reason": RECOMMENDATION_REASONS[indexed_reasons[position]]
+                    })
+
         # Strategy 3: Popular Items (fallback)
         if len(recommendations) < limit:
             popular_recs = [
                 {"dish_id": dish_id, "score": 0.5, "reason": "Popular choice"}
                 for dish_id in self.popular_items[:limit]
+                if dish_id not in seen
+            ]
+            # Index rows are already sorted, so popular items slot in after
+            # every entry scoring at least 0.5
+            split = 0
+            while split < len(recommendations) and recommendations[split]['score'] >= 0.5:
+                split += 1
+            recommendations = recommendations[:split] + popular_recs + recommendations[split:]
+
+        return recommendations[:limit]
+
+    def _build_recommendation_index(self, rows=None, progress=None):
+        """
+        Precompute the top-N recommendations of every user
+
+        Stores three (users x RECOMMENDATION_INDEX_SIZE) arrays: item
+        positions into `item_ids` (-1 padded), scores and reason codes,
+        sorted by score. With `rows`, only those users are recomputed in
+        the existing arrays. progress(fraction) is called after each batch.
+        """
+        matrix = self.user_item_matrix
+        n_users, n_items = matrix.shape
+
+        if rows is None:
+            rows = np.arange(n_users)
+            rec_items = np.full((n_users, RECOMMENDATION_INDEX_SIZE), -1, dtype=np.int32)
+            rec_scores = np.zeros((n_users, RECOMMENDATION_INDEX_SIZE), dtype=np.float32)
+            rec_reasons = np.zeros((n_users, RECOMMENDATION_INDEX_SIZE), dtype=np.int8)
+        else:
+            rec_items, rec_scores, rec_reasons = self.rec_items, self.rec_scores, self.rec_reasons
+            rec_items[rows] = -1
+            rec_scores[rows] = 0
+            rec_reasons[rows] = 0
+
+        rules_by_position = self._association_rules_by_position()
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        normalized = sparse.diags(1 / norms).dot(matrix).tocsr()
+        normalized_t = normalized.T.tocsc()
+        neighbours = min(SIMILAR_USERS, n_users - 1)
+        top_n = min(RECOMMENDATION_INDEX_SIZE, n_items)
+
+        # Keep each dense similarity block at roughly SIMILARITY_BLOCK_ELEMENTS floats
+        batch_size = max(1, min(INDEX_BATCH_SIZE, SIMILARITY_BLOCK_ELEMENTS // max(n_users, 1)))
+
+        for start in range(0, len(rows), batch_size):
+            batch_rows = rows[start:start + batch_size]
+            batch_len = len(batch_rows)
+            block = matrix[batch_rows].toarray()
+
+            # Top similar users per row, never the user itself
+            similarities = (normalized[batch_rows] @ normalized_t).toarray()
+            similarities[np.arange(batch_len), batch_rows] = 0
+            if neighbours > 0:
+                top_users = np.argpartition(-similarities, neighbours - 1, axis=1)[:, :neighbours]
+                top_sims = np.take_along_axis(similarities, top_users, axis=1)
+                weights = sparse.csr_matrix(
+                    (top_sims.ravel(), (np.repeat(np.arange(batch_len), neighbours), top_users.ravel())),
+                    shape=(batch_len, n_users)
+                )
+                # Aggregate their preferences, skipping dishes already ordered
+                scores = (weights @ matrix).toarray()
+            else:
+                scores = np.zeros_like(block)
+            candidates = (scores > 0) & (block == 0)
+            scores = np.where(candidates, np.minimum(scores / 10, 1.0), -np.inf)
+
+            top_items = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+            top_scores = np.take_along_axis(scores, top_items, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top_items = np.take_along_axis(top_items, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for offset, row in enumerate(batch_rows.tolist()):
+                valid = np.isfinite(top_scores[offset])
+                merged = [
+                    (score, 0, item_idx)
+                    for item_idx, score in zip(top_items[offset][valid].tolist(), top_scores[offset][valid].tolist())
+                ]
+
+                # Association rules on the user's first ordered items
+                recent_items = np.flatnonzero(block[offset] > 0)[:3]
+                for item_idx in recent_items.tolist():
+                    merged.extend((confidence, 1, assoc_idx) for assoc_idx, confidence in rules_by_position.get(item_idx, []))
+
+                # Deduplicate (highest score wins) and sort by score
+                best = {}
+                for entry in merged:
+                    if entry[2] not in best or entry[0] > best[entry[2]][0]:
+                        best[entry[2]] = entry
+                unique = sorted(best.values(), key=lambda x: x[0], reverse=True)[:RECOMMENDATION_INDEX_SIZE]
+
+                for position, (score, reason, item_idx) in enumerate(unique):
+                    rec_items[row, position] = item_idx
+                    rec_scores[row, position] = score
+                    rec_reasons[row, position] = reason
+
+            if progress:
+                progress(min(start + batch_size, len(rows)) / len(rows))
+
+        self.rec_items = rec_items
+        self.rec_scores = rec_scores
+        self.rec_reasons = rec_reasons
+
+    def _association_rules_by_position(self):
+        """Association rules keyed by item position instead of dish id"""
+        positions = self.item_index
+        rules_by_position = {}
+        for dish_id, rules in self.association_rules.items():
+            if dish_id not in positions:
+                continue
+            rules_by_position[positions[dish_id]] = [
+                (positions[assoc_id], confidence)
+                for assoc_id, confidence in rules[:RECOMMENDATION_INDEX_SIZE]
+                if assoc_id in positions
             ]
-            recommendations.extend(popular_recs)
+        return rules_by_position
+    
+    def _mine_association_rules(self, interactions_df, min_support=DEFAULT_MIN_SUPPORT,
+                                min_confidence=DEFAULT_MIN_CONFIDENCE, min_lift=DEFAULT_MIN_LIFT,
+                                max_rules_per_item=DEFAULT_MAX_RULES_PER_ITEM, basket_mode='user'):
+        """
+        Mine association rules (items frequently bought together)
+
+        Pair counts come from one sparse product of the binary basket x item
+        matrix, so the cost follows the number of co-occurring pairs rather
+        than a Python loop over every basket. Expects the `item_code` column
+        (position in self.item_ids) added by train_model.
+
+        In 'order' mode each order is a basket and, when a `weight` column is
+        present, baskets count with their recency weight, so min_support is
+        compared against decayed counts. 'user' baskets span several orders
+        and stay unweighted.
+
+        Returns mining stats for the training metrics.
+        """
+        started = time.perf_counter()
+        self.training_config.update({
+            "basket_mode": basket_mode,
+            "min_support": min_support,
+            "min_confidence": min_confidence,
+            "min_lift": min_lift,
+            "max_rules_per_item": max_rules_per_item
+        })
+        n_items = len(self.item_ids)
+        item_codes = interactions_df['item_code'].to_numpy()
         
-        # Deduplicate and sort by score
-        seen = set()
-        unique_recs = []
-        for rec in recommendations:
-            if rec['dish_id'] not in seen:
-                seen.add(rec['dish_id'])
-                unique_recs.append(rec)
+        # Group by user (or order) to get baskets
+        basket_column = 'order_id' if basket_mode == 'order' else 'user_id'
+        basket_codes, basket_ids = pd.factorize(interactions_df[basket_column])
+        baskets = _binary(sparse.csr_matrix(
+            (np.ones(len(basket_codes)), (basket_codes, item_codes)),
+            shape=(len(basket_ids), n_items)
+        ))
+        basket_sizes = np.diff(baskets.indptr)
         
-        unique_recs.sort(key=lambda x: x['score'], reverse=True)
+        if basket_mode == 'order' and 'weight' in interactions_df:
+            basket_weights = np.zeros(len(basket_ids))
+            basket_weights[basket_codes] = interactions_df['weight'].to_numpy()
+        else:
+            basket_weights = np.ones(len(basket_ids))
         
-        return unique_recs[:limit]
+        # Co-occurrence counts; the diagonal holds per-item basket counts
+        self.cooccurrence = (sparse.diags(basket_weights).dot(baskets).T @ baskets).tocsr()
+        self.basket_weight_total = float(basket_weights.sum())
+        rules_count = self._derive_association_rules()
+        cooccurrence = self.cooccurrence.tocoo()
+        
+        return {
+            "basket_mode": basket_mode,
+            "baskets_count": len(basket_ids),
+            "avg_basket_size": round(float(basket_sizes.mean()), 2) if len(basket_sizes) else 0,
+            "max_basket_size": int(basket_sizes.max()) if len(basket_sizes) else 0,
+            # Pairs a per-basket counter has to touch, for both basket modes
+            "pair_candidates": {
+                mode: _pair_candidates(pd.factorize(interactions_df[column])[0], item_codes, n_items)
+                for mode, column in (('user', 'user_id'), ('order', 'order_id'))
+            },
+            "cooccurring_pairs": int((cooccurrence.row < cooccurrence.col).sum()),
+            "rules_count": rules_count,
+            "mining_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
     
-    def _get_collaborative_recommendations(self, user_id, limit):
-        """User-based collaborative filtering"""
-        recommendations = []
+    def _derive_association_rules(self):
+        """
+        Rebuild association_rules from the co-occurrence counts
         
-        try:
-            user_vector = self.user_item_matrix.loc[user_id]
-            already_ordered = set(user_vector[user_vector > 0].index)
-            
-            # Find similar users
-            from sklearn.metrics.pairwise import cosine_similarity
-            user_similarities = cosine_similarity(
-                user_vector.values.reshape(1, -1),
-                self.user_item_matrix.values
-            )[0]
-            
-            # Get top 10 similar users
-            similar_user_indices = np.argsort(user_similarities)[-11:-1][::-1]
-            
-            # Aggregate their preferences
-            item_scores = defaultdict(float)
-            for idx in similar_user_indices:
-                similar_user = self.user_item_matrix.iloc[idx]
-                similarity_score = user_similarities[idx]
-                
-                for dish_id, count in similar_user.items():
-                    if count > 0 and dish_id not in already_ordered:
-                        item_scores[dish_id] += count * similarity_score
-            
-            # Convert to recommendations
-            for dish_id, score in sorted(item_scores.items(), key=lambda x: x[1], reverse=True)[:limit]:
-                recommendations.append({
-                    "dish_id": dish_id,
-                    "score": min(score / 10, 1.0),  # Normalize
-                    "reason": "Based on your previous orders"
-                })
+        Cost follows the number of stored pairs, not the order history.
+        Returns the number of rules kept.
+        """
+        config = self.training_config
+        self.association_rules = {}
+        cooccurrence = self.cooccurrence.tocoo()
+        item_counts = self.cooccurrence.diagonal().astype(np.float64)
         
-        except Exception as e:
-            print(f"Collaborative filtering error: {e}")
+        # Confidence = support(A,B) / support(A), lift = confidence / P(B)
+        keep = (cooccurrence.row != cooccurrence.col) & (cooccurrence.data >= config['min_support'])
+        antecedents = cooccurrence.row[keep]
+        consequents = cooccurrence.col[keep]
+        counts = cooccurrence.data[keep]
+        confidence = counts / item_counts[antecedents]
+        lift = confidence / (item_counts[consequents] / max(self.basket_weight_total, 1e-12))
+        keep = (confidence >= config['min_confidence']) & (lift >= config['min_lift'])
+        antecedents, consequents, confidence = antecedents[keep], consequents[keep], confidence[keep]
         
-        return recommendations
-    
-    def _get_association_recommendations(self, recent_items, limit):
-        """Recommendations based on association rules"""
-        recommendations = []
+        # Sort by confidence within each antecedent and keep the strongest rules
+        order = np.lexsort((-confidence, antecedents))
+        antecedents, consequents, confidence = antecedents[order], consequents[order], confidence[order]
+        starts, stops = _group_bounds(antecedents)
+        rank = np.arange(len(antecedents)) - np.repeat(starts, stops - starts)
+        keep = rank < config['max_rules_per_item']
+        antecedents, consequents, confidence = antecedents[keep], consequents[keep], confidence[keep]
         
-        for item in recent_items:
-            if item in self.association_rules:
-                for associated_item, confidence in self.association_rules[item][:limit]:
-                    recommendations.append({
-                        "dish_id": associated_item,
-                        "score": confidence,
-                        "reason": "Frequently ordered together"
-                    })
+        starts, stops = _group_bounds(antecedents)
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            self.association_rules[self.item_ids[antecedents[start]]] = [
+                (self.item_ids[consequent], float(conf))
+                for consequent, conf in zip(consequents[start:stop].tolist(), confidence[start:stop].tolist())
+            ]
         
-        return recommendations
-    
-    def _mine_association_rules(self, interactions_df):
-        """Mine association rules (items frequently bought together)"""
-        # Group by user to get baskets
-        baskets = interactions_df.groupby('user_id')['dish_id'].apply(list).tolist()
-        
-        # Count item pairs
-        pair_counts = defaultdict(int)
-        item_counts = Counter()
-        
-        for basket in baskets:
-            unique_items = list(set(basket))
-            item_counts.update(unique_items)
-            
-            # Count pairs
-            for i, item1 in enumerate(unique_items):
-                for item2 in unique_items[i+1:]:
-                    pair = tuple(sorted([item1, item2]))
-                    pair_counts[pair] += 1
-        
-        # Calculate confidence (support(A,B) / support(A))
-        min_support = 3  # Minimum times items must appear together
-        
-        for (item1, item2), count in pair_counts.items():
-            if count >= min_support:
-                conf1 = count / item_counts[item1] if item_counts[item1] > 0 else 0
-                conf2 = count / item_counts[item2] if item_counts[item2] > 0 else 0
-                
-                if item1 not in self.association_rules:
-                    self.association_rules[item1] = []
-                if item2 not in self.association_rules:
-                    self.association_rules[item2] = []
-                
-                self.association_rules[item1].append((item2, conf1))
-                self.association_rules[item2].append((item1, conf2))
-        
-        # Sort by confidence
-        for item in self.association_rules:
-            self.association_rules[item].sort(key=lambda x: x[1], reverse=True)
+        return int(len(antecedents))
     
     def _save_model(self):
-        """Save trained model to disk"""
-        os.makedirs('models', exist_ok=True)
-        model_data = {
-            'user_item_matrix': self.user_item_matrix,
-            'item_similarity': self.item_similarity,
-            'popular_items': self.popular_items,
-            'association_rules': self.association_rules
+        """Save trained model to disk as a new model store version"""
+        arrays = {}
+        for name in SPARSE_MATRICES:
+            arrays.update(sparse_to_arrays(name, getattr(self, name)))
+        arrays.update({name: getattr(self, name) for name in DENSE_ARRAYS if getattr(self, name) is not None})
+        meta = {
+            "popular_items": self.popular_items,
+            "association_rules": self.association_rules,
+            "user_ids": self.user_ids,
+            "item_ids": self.item_ids,
+            "canteen_id": self.canteen_id,
+            "item_canteens": self.item_canteens,
+            "basket_weight_total": self.basket_weight_total,
+            "watermark": self.watermark.isoformat() if self.watermark is not None else None,
+            "training_config": self.training_config
         }
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(model_data, f)
-        print(f"Model saved to {self.model_path}")
+        self.model_version = self.store.save(self.shard, arrays, meta)
+        print(f"Model saved to {self.store.root}/{self.shard} (version {self.model_version})")
+        
+        # Serve from maps of the saved files, shared with the other workers, not this copy
+        loaded = self.store.load(self.shard)
+        if loaded is not None and loaded[2] == self.model_version:
+            self._map_arrays(loaded[0])
+    
+    def _map_arrays(self, arrays):
+        """Point the model's matrices and index arrays at loaded store arrays"""
+        for name in SPARSE_MATRICES:
+            setattr(self, name, sparse_from_arrays(name, arrays))
+        for name in DENSE_ARRAYS:
+            setattr(self, name, arrays.get(name))
     
     def load_model(self):
-        """Load trained model from disk"""
-        if os.path.exists(self.model_path):
-            try:
-                with open(self.model_path, 'rb') as f:
-                    model_data = pickle.load(f)
-                self.user_item_matrix = model_data.get('user_item_matrix')
-                self.item_similarity = model_data.get('item_similarity')
-                self.popular_items = model_data.get('popular_items', [])
-                self.association_rules = model_data.get('association_rules', {})
-                print(f"Model loaded from {self.model_path}")
-            except Exception as e:
-                print(f"Error loading model: {e}")
+        """Load trained model from disk (the model store, else a pre-store pickle); True if one was loaded"""
+        try:
+            loaded = self.store.load(self.shard)
+            if loaded is None:
+                # Pickles predate canteen models
+                return self.canteen_id is None and self._load_legacy_model()
+            arrays, meta, version = loaded
+            self._map_arrays(arrays)
+            self.popular_items = meta['popular_items']
+            self.association_rules = {
+                dish_id: [tuple(rule) for rule in rules] for dish_id, rules in meta['association_rules'].items()
+            }
+            self.user_ids = meta['user_ids']
+            self.item_ids = meta['item_ids']
+            self.item_canteens = meta.get('item_canteens', {})
+            self.basket_weight_total = meta['basket_weight_total']
+            self.watermark = pd.Timestamp(meta['watermark']) if meta['watermark'] else None
+            self.training_config = {**DEFAULT_TRAINING_CONFIG, **meta['training_config']}
+            self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+            self.item_index = {dish_id: idx for idx, dish_id in enumerate(self.item_ids)}
+            self.model_version = version
+            self._loaded = True
+            print(f"Model loaded from {self.store.root}/{self.shard} (version {version})")
+            return True
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            return False
+    
+    def _load_legacy_model(self):
+        """Load a model pickled by earlier releases and copy it into the model store"""
+        if not os.path.exists(self.model_path):
+            return False
+        with open(self.model_path, 'rb') as f:
+            model_data = pickle.load(f)
+        self.user_item_matrix = model_data.get('user_item_matrix')
+        self.item_similarity = model_data.get('item_similarity')
+        self.popular_items = model_data.get('popular_items', [])
+        self.association_rules = model_data.get('association_rules', {})
+        self.user_ids = model_data.get('user_ids', [])
+        self.item_ids = model_data.get('item_ids', [])
+        self.rec_items = model_data.get('rec_items')
+        self.rec_scores = model_data.get('rec_scores')
+        self.rec_reasons = model_data.get('rec_reasons')
+        self.item_gram = model_data.get('item_gram')
+        self.item_counts = model_data.get('item_counts')
+        self.cooccurrence = model_data.get('cooccurrence')
+        self.basket_weight_total = model_data.get('basket_weight_total', 0.0)
+        self.watermark = model_data.get('watermark')
+        self.training_config = {**DEFAULT_TRAINING_CONFIG, **model_data.get('training_config', {})}
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.item_index = {dish_id: idx for idx, dish_id in enumerate(self.item_ids)}
+        
+        # Models saved before the sparse format: convert the dense pivot table
+        if isinstance(self.user_item_matrix, pd.DataFrame):
+            self._convert_dense_model()
+        
+        # Models saved before the index existed: build it once here
+        if self.rec_items is None and self.user_item_matrix is not None:
+            self._build_recommendation_index()
+        print(f"Model loaded from {self.model_path}")
+        
+        self._save_model()
+        self._loaded = True
+        return True
+    
+    def _convert_dense_model(self):
+        """Convert a legacy pandas pivot table model to the sparse layout"""
+        dense = self.user_item_matrix
+        self.user_ids = [str(user_id) for user_id in dense.index]
+        self.item_ids = [str(dish_id) for dish_id in dense.columns]
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.item_index = {dish_id: idx for idx, dish_id in enumerate(self.item_ids)}
+        self.user_item_matrix = sparse.csr_matrix(dense.values.astype(np.float32))
+        if self.item_similarity is not None:
+            self.item_similarity = sparse.csr_matrix(np.asarray(self.item_similarity, dtype=np.float32))
+        self.rec_items = None
+    
+    def _footprint_report(self):
+        """Memory footprint of the sparse model next to its dense equivalent"""
+        n_users, n_items = self.user_item_matrix.shape
+        matrix_bytes = _sparse_nbytes(self.user_item_matrix)
+        similarity_bytes = _sparse_nbytes(self.item_similarity)
+        dense_matrix_bytes = n_users * n_items * 8
+        dense_similarity_bytes = n_items * n_items * 8
+        index_bytes = self.rec_items.nbytes + self.rec_scores.nbytes + self.rec_reasons.nbytes
+        return {
+            "user_item_nnz": int(self.user_item_matrix.nnz),
+            "user_item_density": round(self.user_item_matrix.nnz / max(n_users * n_items, 1), 6),
+            "user_item_matrix_bytes": matrix_bytes,
+            "user_item_matrix_dense_bytes": dense_matrix_bytes,
+            "item_similarity_bytes": similarity_bytes,
+            "item_similarity_dense_bytes": dense_similarity_bytes,
+            "recommendation_index_bytes": int(index_bytes),
+            "bytes_saved": dense_matrix_bytes + dense_similarity_bytes - matrix_bytes - similarity_bytes,
+            "model_file_bytes": self.store.size_bytes(self.shard)
+        }
+
+
+class SentimentScoreTable:
+    """
+    Per-dish sentiment scores for re-ranking, refreshed in the background
+
+    get() returns the table as last read from source() ({dish_id: score});
+    once it is older than refresh_seconds, get() also starts a refresh in a
+    daemon thread, so requests never wait on the sentiment database. A
+    failed refresh keeps the previous table.
+    """
+
+    def __init__(self, source, refresh_seconds=None):
+        self.source = source
+        self.refresh_seconds = float(os.getenv('RECOMMENDATION_SENTIMENT_REFRESH', SENTIMENT_REFRESH_SECONDS)) \
+            if refresh_seconds is None else refresh_seconds
+        self.scores = {}
+        self.checked_at = None  # time.monotonic() of the last refresh, successful or not
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+
+    def get(self):
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.refresh_seconds:
+            if not self._refresh_lock.locked():
+                threading.Thread(target=self.refresh, name='sentiment-scores', daemon=True).start()
+        return self.scores
+
+    def refresh(self):
+        """Read the scores now (skipped if a refresh is already running); True if the table was replaced"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self.scores = self.source()
+            self.last_error = None
+            return True
+        except Exception as e:
+            print(f"Error refreshing sentiment scores: {e}")
+            self.last_error = str(e)
+            return False
+        finally:
+            self.checked_at = time.monotonic()
+            self._refresh_lock.release()
+
+
+def _no_progress(fraction, stage=None):
+    pass
+
+
+def _step_progress(progress, step, steps, label=None):
+    """progress callback of one of several equal training steps"""
+    def report(fraction, stage=None):
+        progress((step + fraction) / steps, f"{label}: {stage}" if label and stage else stage)
+    return report
+
+
+def _canteen_shard(canteen_id):
+    """Model store shard holding a canteen's model"""
+    return f"{MODEL_SHARD}/{shard_key(canteen_id)}"
+
+
+def _split_by_canteen(interactions_df):
+    """[(canteen_id, its interactions)] for each canteen present; rows without a canteen are left out"""
+    if 'canteen_id' not in interactions_df or interactions_df.empty:
+        return []
+    return [
+        (str(canteen_id), partition_df.reset_index(drop=True))
+        for canteen_id, partition_df in interactions_df.groupby('canteen_id', observed=True, sort=True)
+        if canteen_id
+    ]
+
+
+def _item_canteens(interactions_df):
+    """{dish_id: canteen_id} of the dishes in interactions that have a canteen"""
+    if 'canteen_id' not in interactions_df:
+        return {}
+    pairs = interactions_df[['dish_id', 'canteen_id']].drop_duplicates('dish_id')
+    return {str(dish_id): str(canteen_id) for dish_id, canteen_id in zip(pairs['dish_id'], pairs['canteen_id']) if canteen_id}
+
+
+def _sparse_nbytes(matrix):
+    """Bytes held by a scipy CSR/CSC matrix's arrays"""
+    if matrix is None:
+        return 0
+    return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+
+
+def _parse_timestamps(values):
+    """UTC timestamps from createdAt values, NaT where missing or unparseable"""
+    return pd.to_datetime(values, utc=True, errors='coerce', format='mixed')
+
+
+def _recency_weights(timestamps, reference, half_life_days):
+    """Exponential time-decay weights relative to the reference (newest) timestamp"""
+    if not half_life_days or reference is None:
+        return np.ones(len(timestamps))
+    age_days = (reference - timestamps).dt.total_seconds().to_numpy() / 86400
+    # Orders without a usable timestamp keep full weight
+    return np.where(np.isnan(age_days), 1.0, 0.5 ** (age_days / half_life_days))
+
+
+def _binary(matrix):
+    """Copy of a sparse matrix with every stored entry set to 1"""
+    binary = matrix.tocsr(copy=True)
+    binary.sum_duplicates()
+    binary.eliminate_zeros()
+    binary.data = np.ones_like(binary.data, dtype=np.float64)
+    return binary
+
+
+def _inverse_norms(gram):
+    """1 / sqrt(diagonal) of a Gram matrix, 0 where the diagonal is 0"""
+    norms = np.sqrt(np.maximum(gram.diagonal(), 0))
+    inverse = np.zeros_like(norms, dtype=np.float64)
+    inverse[norms > 0] = 1 / norms[norms > 0]
+    return inverse
+
+
+def _cosine_from_gram(gram):
+    """Cosine similarity matrix from X^T X"""
+    scale = sparse.diags(_inverse_norms(gram))
+    return (scale @ gram @ scale).astype(np.float32).tocsr()
+
+
+def _extend_ids(values, ids, index):
+    """Integer codes for ids, appending unseen ones to ids/index in place"""
+    for value in pd.unique(values):
+        if value not in index:
+            index[value] = len(ids)
+            ids.append(value)
+    return np.fromiter((index[value] for value in values), dtype=np.int64, count=len(values))
+
+
+def _pair_candidates(basket_codes, item_codes, n_items):
+    """Number of distinct item pairs summed over baskets"""
+    pairs = np.unique(basket_codes.astype(np.int64) * n_items + item_codes)
+    sizes = np.bincount(pairs // n_items).astype(np.int64)
+    return int((sizes * (sizes - 1) // 2).sum())
+
+
+def _group_bounds(sorted_keys):
+    """Start/stop offsets of each run of equal values in a sorted array"""
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(sorted_keys) else np.array([], dtype=int)
+    stops = np.r_[starts[1:], len(sorted_keys)].astype(int)
+    return starts, stops
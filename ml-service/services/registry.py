@@ -0,0 +1,173 @@
+import importlib
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+WARMUP_MODES = ('background', 'eager', 'lazy')
+DEFAULT_WARMUP_MODE = 'background'
+DEFAULT_RELOAD_INTERVAL_SECONDS = 5
+
+
+class ServiceRegistry:
+    """
+    Services built on first use or by a background warm-up thread
+
+    A service is registered by module and class name, so importing the app
+    imports neither the libraries behind it (pandas, scipy, statsmodels,
+    textblob) nor its models. Building one imports its module, constructs
+    it and calls its warm_up() (e.g. loading models). ML_WARMUP selects when
+    that happens:
+        background  a daemon thread builds every service right after startup (default)
+        eager       every service is built before the app finishes importing
+        lazy        each service is built by the first request that uses it
+    A request reaching a service that is still loading waits for it.
+
+    Services are built one at a time: their libraries share imports (pandas,
+    narwhals, ...) whose circular imports can deadlock when two threads
+    import them at once.
+    """
+
+    def __init__(self):
+        self.entries = {}  # {name: entry}, in registration (warm-up) order
+        self.started_at = time.perf_counter()
+        self.mode = None
+        # Reentrant, so building one service may get() another
+        self._build_lock = threading.RLock()
+
+    def register(self, name, module, class_name, **kwargs):
+        """Register a service; returns a LazyService standing in for it"""
+        self.entries[name] = {
+            "module": module,
+            "class_name": class_name,
+            "kwargs": kwargs,
+            "service": None,
+            "state": 'pending',
+            "load_seconds": None,
+            "ready_after_seconds": None,
+            "error": None
+        }
+        return LazyService(self, name)
+
+    def get(self, name):
+        """The service, built (and warmed up) on first call"""
+        entry = self.entries[name]
+        if entry['state'] != 'ready':
+            with self._build_lock:
+                if entry['state'] != 'ready':
+                    self._build(name, entry)
+        return entry['service']
+
+    def start_warmup(self, mode=None):
+        """Build the services according to mode (ML_WARMUP, default background)"""
+        self.mode = mode or os.getenv('ML_WARMUP', DEFAULT_WARMUP_MODE)
+        if self.mode not in WARMUP_MODES:
+            raise ValueError(f"ML_WARMUP must be one of {WARMUP_MODES}")
+        if self.mode == 'eager':
+            self._warm_all()
+        elif self.mode == 'background':
+            threading.Thread(target=self._warm_all, name='ml-warmup', daemon=True).start()
+
+    def status(self):
+        """Per-service state ('pending', 'loading', 'ready' or 'failed') and load timings"""
+        return {
+            name: {key: entry[key] for key in ('state', 'load_seconds', 'ready_after_seconds', 'error')}
+            for name, entry in self.entries.items()
+        }
+
+    def is_ready(self):
+        return all(entry['state'] == 'ready' for entry in self.entries.values())
+
+    def loaded_services(self):
+        """(name, service) of the services built so far"""
+        return [(name, entry['service']) for name, entry in self.entries.items() if entry['state'] == 'ready']
+
+    def _warm_all(self):
+        for name in self.entries:
+            try:
+                self.get(name)
+            except Exception:
+                pass  # Recorded in the entry; the next request retries
+        print(f"Warm-up ({self.mode}) finished: {self.status()}")
+
+    def _build(self, name, entry):
+        """Import, construct and warm up one service (build lock held)"""
+        started = time.perf_counter()
+        entry.update(state='loading', error=None)
+        try:
+            module = importlib.import_module(entry['module'])
+            service = getattr(module, entry['class_name'])(**entry['kwargs'])
+            if hasattr(service, 'warm_up'):
+                service.warm_up()
+        except Exception as e:
+            traceback.print_exc()
+            entry.update(state='failed', error=str(e), load_seconds=round(time.perf_counter() - started, 3))
+            raise
+        entry.update(
+            service=service,
+            state='ready',
+            load_seconds=round(time.perf_counter() - started, 3),
+            ready_after_seconds=round(time.perf_counter() - self.started_at, 3)
+        )
+        print(f"Service {name} ready in {entry['load_seconds']}s")
+
+
+class LazyService:
+    """Stand-in for a registered service that builds it on first attribute access"""
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+
+class ModelWatcher:
+    """
+    Picks up models saved by other worker processes
+
+    Every interval seconds (ML_RELOAD_INTERVAL, 0 disables) a daemon thread
+    calls reload_if_changed() on each service built so far. Services
+    compare the model store manifests with the versions they serve and load
+    newer ones in this thread, then swap them in atomically, so requests
+    never wait on a reload and only ever see complete versions.
+    """
+
+    def __init__(self, registry, interval=None):
+        self.registry = registry
+        self.interval = float(os.getenv('ML_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL_SECONDS)) if interval is None else interval
+        self.reloads = {}  # {service name: number of reloads}
+        self.last_check = None
+        self.last_error = None
+
+    def start(self):
+        if self.interval > 0:
+            threading.Thread(target=self._watch, name='ml-model-watcher', daemon=True).start()
+
+    def check(self):
+        """Reload newer models of every built service once"""
+        for name, service in self.registry.loaded_services():
+            if not hasattr(service, 'reload_if_changed'):
+                continue
+            try:
+                if service.reload_if_changed():
+                    self.reloads[name] = self.reloads.get(name, 0) + 1
+            except Exception as e:
+                traceback.print_exc()
+                self.last_error = f"{name}: {e}"
+        self.last_check = datetime.now(timezone.utc).isoformat()
+
+    def status(self):
+        return {
+            "interval_seconds": self.interval,
+            "reloads": dict(self.reloads),
+            "last_check": self.last_check,
+            "last_error": self.last_error
+        }
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
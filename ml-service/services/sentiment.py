@@ -1,7 +1,68 @@
-from textblob import TextBlob
+from textblob.en import sentiment as pattern_sentiment
+import atexit
+import hashlib
+import json
 import re
+import os
+import threading
+import time
+import uuid
 from collections import defaultdict
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+
+from services.cache import LRUCache
+from services.sentiment_store import PERIODS, SentimentAggregateStore
+from services.workers import pool_map
+
+# Below this many reviews a process pool costs more than it saves, even with
+# its workers already started (see benchmarks/sentiment_batch_benchmark.py)
+PARALLEL_MIN_REVIEWS = 5000
+# Reviews sent to a pool worker at a time
+BATCH_CHUNK_SIZE = 500
+
+# Result cache bound (SENTIMENT_CACHE_SIZE overrides, 0 disables) and, when it is
+# persisted (SENTIMENT_CACHE_PATH), the minimum seconds between saves
+DEFAULT_CACHE_SIZE = 10000
+CACHE_SAVE_INTERVAL_SECONDS = 60
+CACHE_FILE_FORMAT = 1
+
+# Canteen aggregates database (SENTIMENT_DB_PATH overrides)
+DEFAULT_DB_PATH = 'models/sentiment.db'
+# Trend: mean score of the TREND_WINDOW_DAYS days up to the latest review (or
+# the end of a queried range) against the window before, once each holds
+# TREND_MIN_REVIEWS reviews; trend queries default to the last DEFAULT_TREND_DAYS days
+TREND_WINDOW_DAYS = 7
+TREND_MIN_REVIEWS = 5
+DEFAULT_TREND_DAYS = 30
+# Dish rankings order dishes by their mean score shrunk towards the mean of
+# the canteen's dishes, as if each had DISH_RANK_PRIOR_REVIEWS more reviews
+# scoring that mean, so a dish with two glowing reviews does not top one
+# with fifty good ones; dishes with fewer than min_reviews are left out
+DISH_RANK_PRIOR_REVIEWS = 5
+DISH_RANK_MIN_REVIEWS = 3
+DISH_RANK_LIMIT = 5
+
+# Default vocabularies; a JSON file named by SENTIMENT_VOCABULARY can replace
+# any of them (same keys, e.g. {"aspect_terms": {"hygiene": ["clean", "dirty"]}})
+DEFAULT_VOCABULARY = {
+    # Common food-related positive/negative keywords
+    'positive_keywords': [
+        'delicious', 'tasty', 'fresh', 'good', 'excellent', 'amazing',
+        'love', 'great', 'perfect', 'wonderful', 'fantastic', 'yummy',
+        'best', 'awesome', 'nice', 'quality', 'recommended'
+    ],
+    'negative_keywords': [
+        'bad', 'terrible', 'awful', 'poor', 'horrible', 'disgusting',
+        'cold', 'stale', 'tasteless', 'overpriced', 'slow', 'rude',
+        'worst', 'disappointed', 'bland', 'soggy', 'burnt'
+    ],
+    # Terms marking a review as talking about an aspect
+    'aspect_terms': {
+        'food_quality': ['food', 'dish', 'dishes', 'taste', 'tasted', 'tastes', 'tasty', 'delicious', 'fresh', 'quality'],
+        'service': ['service', 'staff', 'waiter', 'serve', 'served', 'serving', 'quick', 'fast', 'slow'],
+        'value': ['price', 'prices', 'priced', 'value', 'worth', 'cheap', 'expensive', 'affordable']
+    }
+}
 
 class SentimentService:
     """
@@ -9,23 +70,44 @@ class SentimentService:
     1. TextBlob for sentiment scoring
     2. Keyword extraction for insights
     3. Aggregated sentiment metrics
+    
+    Reviews analyzed with a canteen (and review id) are added to that
+    canteen's and their dish's running aggregates in a SQLite database
+    shared by every worker, which insights and dish rankings are served from.
     """
     
-    def __init__(self):
-        self.sentiment_cache = {}  # Cache for canteen insights
-        
-        # Common food-related positive/negative keywords
-        self.positive_keywords = [
-            'delicious', 'tasty', 'fresh', 'good', 'excellent', 'amazing',
-            'love', 'great', 'perfect', 'wonderful', 'fantastic', 'yummy',
-            'best', 'awesome', 'nice', 'quality', 'recommended'
-        ]
-        
-        self.negative_keywords = [
-            'bad', 'terrible', 'awful', 'poor', 'horrible', 'disgusting',
-            'cold', 'stale', 'tasteless', 'overpriced', 'slow', 'rude',
-            'worst', 'disappointed', 'bland', 'soggy', 'burnt'
-        ]
+    def __init__(self, max_workers=None, vocabulary=None, cache_size=None, cache_path=None, db_path=None):
+        # Running per-canteen and per-dish aggregates behind get_insights
+        self.aggregates = SentimentAggregateStore(db_path or os.getenv('SENTIMENT_DB_PATH', DEFAULT_DB_PATH))
+        # Processes used for large batches (SENTIMENT_WORKERS, default: CPU count)
+        self.max_workers = max_workers or int(os.getenv('SENTIMENT_WORKERS', 0)) or os.cpu_count() or 1
+        
+        # Keyword and aspect vocabularies (defaults, overridden by SENTIMENT_VOCABULARY or vocabulary)
+        vocabulary = load_vocabulary(os.getenv('SENTIMENT_VOCABULARY'), overrides=vocabulary)
+        self.positive_keywords = vocabulary['positive_keywords']
+        self.negative_keywords = vocabulary['negative_keywords']
+        self.aspect_terms = vocabulary['aspect_terms']
+        self.matcher = KeywordMatcher(self.positive_keywords, self.negative_keywords, self.aspect_terms)
+        
+        # Results keyed by a hash of the cleaned text and the vocabulary, so
+        # entries saved under another vocabulary are never served
+        self.vocabulary_digest = hashlib.blake2b(json.dumps(vocabulary, sort_keys=True).encode(), digest_size=16).digest()
+        if cache_size is None:
+            cache_size = int(os.getenv('SENTIMENT_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        self.result_cache = LRUCache(max_entries=cache_size) if cache_size > 0 else None
+        self.cache_path = (cache_path or os.getenv('SENTIMENT_CACHE_PATH')) if self.result_cache is not None else None
+        self.cache_persistence = {"path": self.cache_path, "entries_loaded": 0, "last_saved_at": None}
+        self._cache_save_lock = threading.Lock()
+        self._cache_saved_at = time.monotonic()
+        self._cache_unsaved = 0
+        if self.cache_path:
+            self._load_cache()
+            atexit.register(self.save_cache)
+    
+    def warm_up(self):
+        """Load TextBlob's sentiment lexicon and open the aggregates database ahead of the first request"""
+        pattern_sentiment("warm up")
+        self.aggregates.stats()
     
     def analyze(self, text):
         """
@@ -43,78 +125,146 @@ class SentimentService:
             }
         }
         """
-        if not text or len(text.strip()) < 3:
-            return {
-                "sentiment": "neutral",
-                "score": 0,
-                "confidence": 0,
-                "keywords": [],
-                "aspects": {}
-            }
-        
-        # Clean text
-        text = self._clean_text(text)
-        
-        # Get sentiment using TextBlob
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
-        subjectivity = blob.sentiment.subjectivity
-        
-        # Determine sentiment category
-        if polarity > 0.1:
-            sentiment = "positive"
-        elif polarity < -0.1:
-            sentiment = "negative"
-        else:
-            sentiment = "neutral"
-        
-        # Extract keywords
-        keywords = self._extract_keywords(text)
-        
-        # Analyze aspects (food quality, service, value)
-        aspects = self._analyze_aspects(text, blob)
-        
-        return {
-            "sentiment": sentiment,
-            "score": round(polarity, 2),
-            "confidence": round(subjectivity, 2),
-            "keywords": keywords,
-            "aspects": aspects
-        }
+        return self.analyze_texts([text])[0]
     
     def analyze_batch(self, reviews):
         """
         Analyze multiple reviews
         
         reviews format: [
-            {"review_id": "...", "text": "...", "dish_id": "..."},
+            {"review_id": "...", "text": "...", "dish_id": "...", "canteen_id": "...", "created_at": "..."},
             ...
         ]
+        (or as stored by the backend: _id, comment, dish, canteen, createdAt).
+        Reviews with a canteen are added to its aggregates.
         
         Returns: [
             {"review_id": "...", "sentiment": {...}},
             ...
         ]
         """
-        results = []
+        sentiments = self.analyze_texts([review.get('comment', review.get('text', '')) for review in reviews])
+        self.record_reviews(reviews, sentiments)
         
-        for review in reviews:
-            review_id = review.get('review_id', review.get('_id'))
-            text = review.get('comment', review.get('text', ''))
-            
-            sentiment = self.analyze(text)
-            
-            results.append({
-                "review_id": str(review_id),
+        return [
+            {
+                "review_id": str(review.get('review_id', review.get('_id'))),
                 "dish_id": review.get('dish'),
                 "sentiment": sentiment
-            })
+            }
+            for review, sentiment in zip(reviews, sentiments)
+        ]
+    
+    def analyze_texts(self, texts):
+        """
+        analyze() of every text, in order
         
+        Texts whose cleaned form was scored before come from the result
+        cache, and repeats within the batch are scored once. Large batches
+        are split into chunks scored by a process pool.
+        """
+        results = [None] * len(texts)
+        pending = {}  # {cache key: (cleaned text, [positions in texts])}
+        for position, text in enumerate(texts):
+            if not text or len(text.strip()) < 3:
+                results[position] = _neutral_result()
+                continue
+            cleaned = _clean_text(text)
+            if self.result_cache is None:
+                pending[position] = (cleaned, [position])
+                continue
+            key = self._cache_key(cleaned)
+            if key in pending:
+                pending[key][1].append(position)
+                continue
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending[key] = (cleaned, [position])
+        
+        if pending:
+            scored = self._score_texts([cleaned for cleaned, _ in pending.values()])
+            for (key, (_, positions)), result in zip(pending.items(), scored):
+                for position in positions:
+                    results[position] = result
+                if self.result_cache is not None:
+                    self.result_cache.set(key, result)
+            if self.cache_path:
+                self._cache_unsaved += len(pending)
+                if time.monotonic() - self._cache_saved_at >= CACHE_SAVE_INTERVAL_SECONDS:
+                    self.save_cache()
         return results
     
-    def get_insights(self, canteen_id, reviews=None):
+    def save_cache(self):
+        """Write the result cache to cache_path (if persisted); False if skipped"""
+        if not self.cache_path or not self._cache_unsaved:
+            return False
+        if not self._cache_save_lock.acquire(blocking=False):
+            return False  # Another thread is saving
+        try:
+            self._cache_unsaved = 0
+            self._cache_saved_at = time.monotonic()
+            entries = self.result_cache.items()
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            # Written aside and renamed, so other workers never read a partial file
+            tmp_path = f"{self.cache_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"format": CACHE_FILE_FORMAT, "entries": entries}, f)
+            os.replace(tmp_path, self.cache_path)
+            self.cache_persistence["last_saved_at"] = datetime.now(timezone.utc).isoformat()
+            return True
+        finally:
+            self._cache_save_lock.release()
+    
+    def get_stats(self):
+        """Result cache size, hit rate and persistence, and the aggregates recorded"""
+        return {
+            "result_cache": self.result_cache.stats() if self.result_cache is not None else None,
+            "result_cache_persistence": dict(self.cache_persistence),
+            "aggregates": self.aggregates.stats()
+        }
+    
+    def record_reviews(self, reviews, sentiments, canteen_id=None):
+        """
+        Add analyzed reviews to their canteens' aggregates
+        
+        Each review counts once per review id (recording it again replaces
+        its earlier contribution); reviews without a canteen (or canteen_id)
+        or text are skipped. Returns the store's added/updated/unchanged counts.
+        """
+        entries = []
+        for review, sentiment in zip(reviews, sentiments):
+            text = review.get('comment', review.get('text', ''))
+            review_canteen = _ref_id(review.get('canteen_id', review.get('canteen'))) or canteen_id
+            if not text or review_canteen is None:
+                continue
+            dish_id = _ref_id(review.get('dish_id', review.get('dish')))
+            created_at = review.get('created_at', review.get('createdAt'))
+            review_id = _ref_id(review.get('review_id', review.get('_id')))
+            if review_id is None:
+                # Same review, same id: keeps re-submitted id-less reviews from counting twice
+                review_id = 'text:' + hashlib.blake2b(
+                    json.dumps([review_canteen, dish_id, text, str(created_at)]).encode('utf-8'), digest_size=16
+                ).hexdigest()
+            entries.append({
+                "review_id": review_id,
+                "canteen_id": review_canteen,
+                "dish_id": dish_id,
+                "day": _review_day(created_at),
+                "sentiment": sentiment['sentiment'],
+                "score": sentiment['score'],
+                "keywords": [
+                    [kw, 'positive' if kw in self.positive_keywords else 'negative']
+                    for kw in sentiment['keywords']
+                ],
+                "aspects": sentiment['aspects']
+            })
+        return self.aggregates.record(entries)
+    
+    def get_insights(self, canteen_id, reviews=None, time_window=None, dish_id=None):
         """
-        Get aggregated sentiment insights for a canteen
+        Get aggregated sentiment insights for a canteen (or one of its dishes)
         
         Returns: {
             "overall_sentiment": "positive",
@@ -134,34 +284,15 @@ class SentimentService:
             }
         }
         """
-        if not reviews:
-            return self._get_cached_insights(canteen_id)
-        
-        # Analyze all reviews
-        sentiments = []
-        all_keywords = {"positive": [], "negative": []}
-        aspects_scores = defaultdict(list)
-        
-        for review in reviews:
-            text = review.get('comment', review.get('text', ''))
-            if not text:
-                continue
-            
-            result = self.analyze(text)
-            sentiments.append(result)
-            
-            # Collect keywords
-            for kw in result['keywords']:
-                if kw in self.positive_keywords:
-                    all_keywords['positive'].append(kw)
-                elif kw in self.negative_keywords:
-                    all_keywords['negative'].append(kw)
-            
-            # Collect aspect scores
-            for aspect, score in result['aspects'].items():
-                aspects_scores[aspect].append(score)
-        
-        if not sentiments:
+        if reviews:
+            # Analyze and record them; insights cover every review recorded for the canteen
+            texts = [review.get('comment', review.get('text', '')) for review in reviews]
+            self.record_reviews(reviews, self.analyze_texts(texts), canteen_id=str(canteen_id))
+        
+        canteen_id = str(canteen_id)
+        dish_id = None if dish_id is None else str(dish_id)
+        summary = self.aggregates.summary(canteen_id, dish_id=dish_id)
+        if summary is None:
             return {
                 "overall_sentiment": "neutral",
                 "average_score": 0,
@@ -169,123 +300,377 @@ class SentimentService:
                 "top_positive_keywords": [],
                 "top_negative_keywords": [],
                 "trending": "stable",
-                "aspects_scores": {}
+                "aspects_scores": {},
+                "total_reviews": 0,
+                "note": f"No reviews recorded for this {'dish' if dish_id else 'canteen'} yet"
             }
         
-        # Calculate distribution
-        distribution = {
-            "positive": sum(1 for s in sentiments if s['sentiment'] == 'positive'),
-            "neutral": sum(1 for s in sentiments if s['sentiment'] == 'neutral'),
-            "negative": sum(1 for s in sentiments if s['sentiment'] == 'negative')
-        }
-        
-        # Overall sentiment
-        avg_score = sum(s['score'] for s in sentiments) / len(sentiments)
-        if avg_score > 0.1:
-            overall = "positive"
-        elif avg_score < -0.1:
-            overall = "negative"
-        else:
-            overall = "neutral"
-        
-        # Top keywords
-        from collections import Counter
-        top_positive = [kw for kw, _ in Counter(all_keywords['positive']).most_common(5)]
-        top_negative = [kw for kw, _ in Counter(all_keywords['negative']).most_common(5)]
-        
-        # Average aspect scores
-        avg_aspects = {}
-        for aspect, scores in aspects_scores.items():
-            avg_aspects[aspect] = round(sum(scores) / len(scores), 2)
-        
-        # Trending (compare recent vs older reviews)
-        trending = "stable"
-        if len(sentiments) >= 10:
-            recent_avg = sum(s['score'] for s in sentiments[-5:]) / 5
-            older_avg = sum(s['score'] for s in sentiments[:5]) / 5
-            
-            if recent_avg > older_avg + 0.2:
-                trending = "improving"
-            elif recent_avg < older_avg - 0.2:
-                trending = "declining"
-        
         insights = {
-            "overall_sentiment": overall,
-            "average_score": round(avg_score, 2),
-            "sentiment_distribution": distribution,
-            "top_positive_keywords": top_positive,
-            "top_negative_keywords": top_negative,
-            "trending": trending,
-            "aspects_scores": avg_aspects,
-            "total_reviews": len(sentiments)
+            "overall_sentiment": _overall(summary),
+            "average_score": _average(summary),
+            "sentiment_distribution": _distribution(summary),
+            "top_positive_keywords": [kw for kw, _ in summary['keywords']['positive'][:5]],
+            "top_negative_keywords": [kw for kw, _ in summary['keywords']['negative'][:5]],
+            "trending": self._trending(canteen_id, dish_id=dish_id),
+            "aspects_scores": _aspect_scores(summary['aspects']),
+            "total_reviews": summary['reviews']
         }
-        
-        # Cache insights
-        self.sentiment_cache[canteen_id] = insights
-        
+        if time_window:
+            # The same totals over the last days only, e.g. '30d' or '4w'
+            end = datetime.now(timezone.utc).date()
+            start = end - timedelta(days=_window_days(time_window) - 1)
+            window = self.aggregates.range_totals(canteen_id, start, end, dish_id=dish_id)
+            insights["window"] = {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "total_reviews": window['reviews'],
+                "average_score": _average(window),
+                "sentiment_distribution": _distribution(window)
+            }
         return insights
     
-    def _clean_text(self, text):
-        """Clean and normalize text"""
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove URLs
-        text = re.sub(r'http\S+|www\S+', '', text)
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
+    def get_dish_rankings(self, canteen_id, limit=DISH_RANK_LIMIT, min_reviews=DISH_RANK_MIN_REVIEWS):
+        """
+        Best and worst reviewed dishes of a canteen, from the per-dish aggregates
         
-        return text
+        Returns: {
+            "dishes_ranked": 12,
+            "best": [{"dish_id": "...", "rank_score": 0.62, "average_score": 0.7, "total_reviews": 18,
+                      "overall_sentiment": "positive", "sentiment_distribution": {...},
+                      "aspects_scores": {"food_quality": 0.8}}, ...],  # highest rank_score first
+            "worst": [...]  # lowest rank_score first
+        }
+        """
+        if limit < 1 or min_reviews < 1:
+            raise ValueError("limit and min_reviews must be positive")
+        canteen_id = str(canteen_id)
+        dishes = self.aggregates.dish_totals(canteen_id)
+        
+        # 1. Mean score of the canteen's dish reviews, the prior every dish is shrunk towards
+        reviews = sum(totals['reviews'] for totals in dishes.values())
+        prior = sum(totals['score_sum'] for totals in dishes.values()) / reviews if reviews else 0
+        
+        # 2. Rank the dishes with enough reviews
+        ranked = sorted(
+            (
+                {
+                    "dish_id": dish_id,
+                    "rank_score": round(
+                        (totals['score_sum'] + prior * DISH_RANK_PRIOR_REVIEWS) / (totals['reviews'] + DISH_RANK_PRIOR_REVIEWS), 4
+                    ),
+                    "average_score": _average(totals),
+                    "total_reviews": totals['reviews'],
+                    "overall_sentiment": _overall(totals),
+                    "sentiment_distribution": _distribution(totals),
+                    "aspects_scores": _aspect_scores(totals['aspects'])
+                }
+                for dish_id, totals in dishes.items() if totals['reviews'] >= min_reviews
+            ),
+            key=lambda dish: (-dish['rank_score'], -dish['total_reviews'], dish['dish_id'])
+        )
+        return {
+            "canteen_id": canteen_id,
+            "dishes_reviewed": len(dishes),
+            "dishes_ranked": len(ranked),
+            "min_reviews": min_reviews,
+            "best": ranked[:limit],
+            "worst": ranked[::-1][:limit]
+        }
     
-    def _extract_keywords(self, text):
-        """Extract relevant keywords from text"""
-        keywords = []
-        text_lower = text.lower()
-        
-        # Check for positive keywords
-        for kw in self.positive_keywords:
-            if kw in text_lower:
-                keywords.append(kw)
-        
-        # Check for negative keywords
-        for kw in self.negative_keywords:
-            if kw in text_lower:
-                keywords.append(kw)
+    def get_dish_scores(self):
+        """
+        Sentiment score of every reviewed dish, e.g. for re-ranking recommendations
         
-        return keywords[:5]  # Return top 5
+        A dish's mean score pulled towards neutral as if it had
+        DISH_RANK_PRIOR_REVIEWS more reviews scoring 0, so dishes with only
+        a few reviews move little. One query over the dish aggregates.
+        Returns: {dish_id: score}
+        """
+        return {
+            dish_id: score_sum / (reviews + DISH_RANK_PRIOR_REVIEWS)
+            for dish_id, (reviews, score_sum) in self.aggregates.all_dish_totals().items()
+        }
     
-    def _analyze_aspects(self, text, blob):
-        """Analyze specific aspects of the review"""
-        aspects = {}
-        text_lower = text.lower()
-        
-        # Food quality indicators
-        food_terms = ['food', 'dish', 'taste', 'tasty', 'delicious', 'fresh', 'quality']
-        if any(term in text_lower for term in food_terms):
-            aspects['food_quality'] = blob.sentiment.polarity
-        
-        # Service indicators
-        service_terms = ['service', 'staff', 'waiter', 'serve', 'quick', 'fast', 'slow']
-        if any(term in text_lower for term in service_terms):
-            aspects['service'] = blob.sentiment.polarity
+    def get_trend(self, canteen_id, start=None, end=None, granularity='day', dish_id=None):
+        """
+        Sentiment over a date range of a canteen (or one of its dishes), from the trend buckets
         
-        # Value/price indicators
-        value_terms = ['price', 'value', 'worth', 'cheap', 'expensive', 'affordable']
-        if any(term in text_lower for term in value_terms):
-            aspects['value'] = blob.sentiment.polarity
+        start, end: 'YYYY-MM-DD' (inclusive; default: the last 30 days up to today)
+        granularity: 'day' or 'week' (Monday to Sunday; the first and last weekly
+                     buckets are whole weeks, the summary covers exactly start..end)
         
-        return aspects
+        Returns: {
+            "buckets": [{"start": "2025-03-03", "total_reviews": 12, "average_score": 0.4,
+                         "sentiment_distribution": {...}}, ...],  # days/weeks with reviews
+            "summary": {"total_reviews": 40, "average_score": 0.35, "sentiment_distribution": {...}},
+            "trending": "improving"  # last 7 days of the range against the 7 before
+        }
+        """
+        if granularity not in PERIODS:
+            raise ValueError(f"granularity must be one of {PERIODS}")
+        end = date.fromisoformat(end) if end else datetime.now(timezone.utc).date()
+        start = date.fromisoformat(start) if start else end - timedelta(days=DEFAULT_TREND_DAYS - 1)
+        if start > end:
+            raise ValueError("start must not be after end")
+        
+        canteen_id = str(canteen_id)
+        dish_id = None if dish_id is None else str(dish_id)
+        summary = self.aggregates.range_totals(canteen_id, start, end, dish_id=dish_id)
+        return {
+            "canteen_id": canteen_id,
+            "dish_id": dish_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "granularity": granularity,
+            "buckets": [
+                {
+                    "start": bucket['start'],
+                    "total_reviews": bucket['reviews'],
+                    "average_score": _average(bucket),
+                    "sentiment_distribution": _distribution(bucket)
+                }
+                for bucket in self.aggregates.trend_buckets(canteen_id, granularity, start, end, dish_id=dish_id)
+            ],
+            "summary": {
+                "total_reviews": summary['reviews'],
+                "average_score": _average(summary),
+                "sentiment_distribution": _distribution(summary)
+            },
+            "trending": self._trending(canteen_id, dish_id=dish_id, end=end)
+        }
+    
+    def _trending(self, canteen_id, dish_id=None, end=None):
+        """
+        "improving", "declining" or "stable": mean score of the TREND_WINDOW_DAYS
+        days up to end (default: the latest review) against the TREND_WINDOW_DAYS before
+        """
+        end = end or self.aggregates.latest_day(canteen_id, dish_id=dish_id)
+        if end is None:
+            return "stable"
+        window = timedelta(days=TREND_WINDOW_DAYS)
+        recent = self.aggregates.range_totals(canteen_id, end - window + timedelta(days=1), end, dish_id=dish_id)
+        previous = self.aggregates.range_totals(canteen_id, end - 2 * window + timedelta(days=1), end - window, dish_id=dish_id)
+        if recent['reviews'] < TREND_MIN_REVIEWS or previous['reviews'] < TREND_MIN_REVIEWS:
+            return "stable"
+        change = recent['score_sum'] / recent['reviews'] - previous['score_sum'] / previous['reviews']
+        if change > 0.2:
+            return "improving"
+        if change < -0.2:
+            return "declining"
+        return "stable"
+    
+    def _score_texts(self, cleaned_texts):
+        """_score_text of every cleaned text, through a process pool for large batches"""
+        # Workers beyond the CPU count only add pickling and scheduling overhead
+        workers = min(self.max_workers, os.cpu_count() or 1, -(-len(cleaned_texts) // BATCH_CHUNK_SIZE))
+        if workers <= 1 or len(cleaned_texts) < PARALLEL_MIN_REVIEWS:
+            return [_score_text(text, self.matcher) for text in cleaned_texts]
+        
+        chunks = [
+            (cleaned_texts[i:i + BATCH_CHUNK_SIZE], self.matcher)
+            for i in range(0, len(cleaned_texts), BATCH_CHUNK_SIZE)
+        ]
+        results = []
+        for chunk_results in pool_map(_score_chunk, chunks, workers):
+            results.extend(chunk_results)
+        return results
+    
+    def _cache_key(self, cleaned_text):
+        return hashlib.blake2b(cleaned_text.encode('utf-8'), digest_size=16, key=self.vocabulary_digest).hexdigest()
+    
+    def _load_cache(self):
+        """Fill the result cache from cache_path, if a readable file is there"""
+        try:
+            with open(self.cache_path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable sentiment cache {self.cache_path}: {e}")
+            return
+        if saved.get('format') != CACHE_FILE_FORMAT:
+            return
+        self.result_cache.update(saved['entries'])
+        self.cache_persistence["entries_loaded"] = len(saved['entries'])
+
+
+WORD_PATTERN = re.compile(r'\w+')
+# Maps every ASCII character that can't be part of a word to a space (a full
+# 128-entry table keeps str.translate on its fast ASCII path)
+WORD_SEPARATORS = str.maketrans({c: c if c.isalnum() or c == '_' else ' ' for c in map(chr, range(128))})
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword and aspect term of a text in one scan, on word boundaries
+    
+    The text is split into words once and intersected with the set of
+    single-word terms, so "good" doesn't fire inside "goodness", nor "fast"
+    inside "breakfast", and the cost doesn't grow with the vocabulary.
+    Terms spanning several words ("not fresh", "well-cooked") are compiled
+    into one regex alternation anchored on word boundaries, matched first
+    and blanked out so their words don't also count on their own.
+    """
     
-    def _get_cached_insights(self, canteen_id):
-        """Get cached insights if available"""
-        return self.sentiment_cache.get(canteen_id, {
-            "overall_sentiment": "neutral",
-            "average_score": 0,
-            "sentiment_distribution": {"positive": 0, "neutral": 0, "negative": 0},
-            "top_positive_keywords": [],
-            "top_negative_keywords": [],
-            "trending": "stable",
-            "aspects_scores": {},
-            "note": "No cached data available"
-        })
+    def __init__(self, positive_keywords, negative_keywords, aspect_terms):
+        # Keywords are reported positive first, each group in vocabulary order
+        self.keyword_rank = {}
+        for kw in list(positive_keywords) + list(negative_keywords):
+            self.keyword_rank.setdefault(kw, len(self.keyword_rank))
+        self.aspect_names = list(aspect_terms)
+        self.term_aspects = defaultdict(set)
+        for aspect, terms in aspect_terms.items():
+            for term in terms:
+                self.term_aspects[term].add(aspect)
+        
+        terms = set(self.keyword_rank) | set(self.term_aspects)
+        self.words = frozenset(term for term in terms if WORD_PATTERN.fullmatch(term))
+        phrases = sorted(terms - self.words, key=len, reverse=True)  # Longest first, so phrases win over their parts
+        self.phrase_pattern = re.compile(
+            r'(?<!\w)(?:' + '|'.join(re.escape(phrase) for phrase in phrases) + r')(?!\w)'
+        ) if phrases else None
+    
+    def match(self, text):
+        """(keywords, aspects) found in lowercase text, keywords in vocabulary order"""
+        phrases = ()
+        if self.phrase_pattern is not None:
+            phrases = self.phrase_pattern.findall(text)
+            if phrases:
+                text = self.phrase_pattern.sub(' ', text)
+        found = self.words.intersection(text.translate(WORD_SEPARATORS).split())
+        if phrases:
+            found = found.union(phrases)
+        if not found:
+            return [], []
+        keywords = sorted(self.keyword_rank.keys() & found, key=self.keyword_rank.get)
+        mentioned = set()
+        for term in self.term_aspects.keys() & found:
+            mentioned |= self.term_aspects[term]
+        return keywords, [aspect for aspect in self.aspect_names if aspect in mentioned]
+
+
+def load_vocabulary(path=None, overrides=None):
+    """DEFAULT_VOCABULARY with the keys of the JSON file at path, then those of overrides, replaced"""
+    vocabulary = dict(DEFAULT_VOCABULARY)
+    if path:
+        with open(path) as f:
+            vocabulary.update(json.load(f))
+    vocabulary.update(overrides or {})
+    
+    unknown = set(vocabulary) - set(DEFAULT_VOCABULARY)
+    if unknown:
+        raise ValueError(f"Unknown vocabulary keys: {sorted(unknown)}")
+    # Terms are matched against lowercased text
+    return {
+        'positive_keywords': [kw.lower() for kw in vocabulary['positive_keywords']],
+        'negative_keywords': [kw.lower() for kw in vocabulary['negative_keywords']],
+        'aspect_terms': {aspect: [term.lower() for term in terms] for aspect, terms in vocabulary['aspect_terms'].items()}
+    }
+
+
+def _neutral_result():
+    """analyze() of an empty or too short text"""
+    return {
+        "sentiment": "neutral",
+        "score": 0,
+        "confidence": 0,
+        "keywords": [],
+        "aspects": {}
+    }
+
+
+def _score_text(text, matcher):
+    """analyze() of a cleaned text (module-level so pool workers can run it)"""
+    # Score once with TextBlob's pattern analyzer (what TextBlob(text).sentiment
+    # calls), shared by the overall result and every aspect
+    polarity, subjectivity = pattern_sentiment(text)
+    
+    # Determine sentiment category
+    if polarity > 0.1:
+        sentiment = "positive"
+    elif polarity < -0.1:
+        sentiment = "negative"
+    else:
+        sentiment = "neutral"
+    
+    # Keywords and mentioned aspects (food quality, service, value) in one scan
+    keywords, aspects = matcher.match(text)
+    
+    return {
+        "sentiment": sentiment,
+        "score": round(polarity, 2),
+        "confidence": round(subjectivity, 2),
+        "keywords": keywords[:5],  # Return top 5
+        "aspects": {aspect: polarity for aspect in aspects}
+    }
+
+
+def _score_chunk(chunk):
+    """_score_text of a chunk of cleaned texts in a pool worker"""
+    texts, matcher = chunk
+    return [_score_text(text, matcher) for text in texts]
+
+
+def _clean_text(text):
+    """Clean and normalize text"""
+    # Convert to lowercase
+    text = text.lower()
+    
+    # Remove URLs
+    text = re.sub(r'http\S+|www\S+', '', text)
+    
+    # Remove extra whitespace
+    text = ' '.join(text.split())
+    
+    return text
+
+
+def _ref_id(value):
+    """Id of a reference that may arrive populated ({"_id": ...}), None if absent"""
+    if isinstance(value, dict):
+        value = value.get('_id')
+    return None if value in (None, '') else str(value)
+
+
+def _review_day(created_at):
+    """UTC day ('YYYY-MM-DD') of a review's creation time (ISO string, default: today)"""
+    if created_at:
+        try:
+            created = datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+            if created.tzinfo is not None:
+                created = created.astimezone(timezone.utc)
+            return created.date().isoformat()
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _average(totals):
+    """Mean score of aggregated totals (0 without reviews)"""
+    return round(totals['score_sum'] / totals['reviews'], 2) if totals['reviews'] else 0
+
+
+def _overall(totals):
+    average = totals['score_sum'] / totals['reviews'] if totals['reviews'] else 0
+    if average > 0.1:
+        return "positive"
+    if average < -0.1:
+        return "negative"
+    return "neutral"
+
+
+def _aspect_scores(aspects):
+    """Mean score per aspect of {aspect: (count, score_sum)}"""
+    return {aspect: round(score_sum / count, 2) for aspect, (count, score_sum) in aspects.items()}
+
+
+def _distribution(totals):
+    return {sentiment: totals[sentiment] for sentiment in ('positive', 'neutral', 'negative')}
+
+
+def _window_days(time_window):
+    """Days in a time window such as '30d', '4w' or '30'"""
+    match = re.fullmatch(r'\s*(\d+)\s*([dw]?)\s*', str(time_window).lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError("time_window must look like '30d' or '4w'")
+    return int(match.group(1)) * (7 if match.group(2) == 'w' else 1)
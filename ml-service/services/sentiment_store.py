@@ -0,0 +1,405 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+# Per-review rows, the source every aggregate is summed from
+REVIEWS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id TEXT PRIMARY KEY,
+    canteen_id TEXT NOT NULL,
+    dish_id TEXT,
+    day TEXT NOT NULL,
+    sentiment TEXT NOT NULL,
+    score REAL NOT NULL,
+    keywords TEXT NOT NULL,
+    aspects TEXT NOT NULL
+)
+"""
+
+# Aggregate tables; bumping SCHEMA_VERSION drops and rebuilds them from `reviews`
+SCHEMA_VERSION = 3
+AGGREGATE_SCHEMA = ["""
+CREATE TABLE sentiment_totals (
+    canteen_id TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    reviews INTEGER NOT NULL,
+    positive INTEGER NOT NULL,
+    neutral INTEGER NOT NULL,
+    negative INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    PRIMARY KEY (canteen_id, dish_id)
+)
+""", """
+CREATE TABLE keyword_counts (
+    canteen_id TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    polarity TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (canteen_id, dish_id, keyword)
+)
+""", """
+CREATE TABLE aspect_scores (
+    canteen_id TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    aspect TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    PRIMARY KEY (canteen_id, dish_id, aspect)
+)
+""", """
+CREATE TABLE trend_buckets (
+    canteen_id TEXT NOT NULL,
+    dish_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    reviews INTEGER NOT NULL,
+    positive INTEGER NOT NULL,
+    neutral INTEGER NOT NULL,
+    negative INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    PRIMARY KEY (canteen_id, dish_id, period, start)
+)
+"""]
+AGGREGATE_TABLES = ('sentiment_totals', 'keyword_counts', 'aspect_scores', 'trend_buckets')
+# Tables of older schema versions, dropped on upgrade
+RETIRED_TABLES = ('canteen_totals', 'canteen_keywords', 'canteen_aspects', 'canteen_days')
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+PERIODS = ('day', 'week')  # Trend bucket sizes; a week starts on Monday
+CANTEEN_WIDE = ''  # dish_id of a canteen's own aggregate rows
+TOTAL_FIELDS = ('reviews', 'positive', 'neutral', 'negative', 'score_sum')
+BUCKET_FIELDS = ('start',) + TOTAL_FIELDS
+LOOKUP_CHUNK = 500  # Review ids per IN (...) query, below SQLite's variable limit
+
+
+class SentimentAggregateStore:
+    """
+    Running per-canteen and per-dish sentiment aggregates in a local SQLite database
+
+    Every analyzed review is recorded once, by review_id: its sentiment,
+    score, keywords and aspects are kept in `reviews`, and added to the
+    totals, keyword counters, aspect sums and daily and weekly trend
+    buckets of its canteen and of its dish.
+    Recording a review again (e.g. after an edit) first takes its old
+    contribution back out, so aggregates never count a review twice.
+
+    Reading a canteen's or a dish's aggregates touches a handful of rows no
+    matter how many reviews it has. The database is shared by every worker process
+    (WAL mode, writes in IMMEDIATE transactions), so they all serve the
+    same numbers and they survive restarts.
+    """
+
+    def __init__(self, path='models/sentiment.db'):
+        self.path = path
+        self._local = threading.local()  # One connection per thread
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def record(self, entries):
+        """
+        Add reviews to their canteens' aggregates
+
+        entries: [{"review_id", "canteen_id", "dish_id", "day" ('YYYY-MM-DD'),
+                   "sentiment", "score", "keywords": [[keyword, polarity], ...],
+                   "aspects": {aspect: score}}, ...]
+        Returns: {"added": n, "updated": n, "unchanged": n}
+        """
+        rows = {row[0]: row for row in map(_review_row, entries)}  # Last one per review_id wins
+        counts = {"added": 0, "updated": 0, "unchanged": 0}
+        if not rows:
+            return counts
+
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 1. Contributions already recorded for these reviews
+            previous = self._recorded(conn, list(rows))
+
+            # 2. Net change of every aggregate row touched by the batch
+            deltas = _Deltas()
+            changed = []
+            for review_id, row in rows.items():
+                old = previous.get(review_id)
+                if old == row:
+                    counts["unchanged"] += 1
+                    continue
+                if old is not None:
+                    deltas.add(old, -1)
+                    counts["updated"] += 1
+                else:
+                    counts["added"] += 1
+                deltas.add(row, 1)
+                changed.append(row)
+
+            # 3. Apply them
+            conn.executemany("INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?)", changed)
+            deltas.apply(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return counts
+
+    def summary(self, canteen_id, dish_id=None):
+        """
+        Aggregates of a canteen (or one of its dishes), None if it has no reviews
+
+        Returns: {"reviews", "positive", "neutral", "negative", "score_sum",
+                  "keywords": {"positive": [(keyword, count), ...], "negative": [...]},
+                  "aspects": {aspect: (count, score_sum)}}
+        """
+        conn = self._connection()
+        scope = (canteen_id, dish_id or CANTEEN_WIDE)
+        totals = conn.execute(
+            "SELECT reviews, positive, neutral, negative, score_sum FROM sentiment_totals "
+            "WHERE canteen_id = ? AND dish_id = ?", scope
+        ).fetchone()
+        if totals is None or totals[0] == 0:
+            return None
+
+        keywords = {"positive": [], "negative": []}
+        for keyword, polarity, count in conn.execute(
+            "SELECT keyword, polarity, count FROM keyword_counts WHERE canteen_id = ? AND dish_id = ? AND count > 0 "
+            "ORDER BY count DESC, keyword", scope
+        ):
+            keywords[polarity].append((keyword, count))
+        aspects = {
+            aspect: (count, score_sum)
+            for aspect, count, score_sum in conn.execute(
+                "SELECT aspect, count, score_sum FROM aspect_scores WHERE canteen_id = ? AND dish_id = ? AND count > 0 "
+                "ORDER BY aspect", scope
+            )
+        }
+        return {
+            **dict(zip(TOTAL_FIELDS, totals)),
+            "keywords": keywords,
+            "aspects": aspects
+        }
+
+    def dish_totals(self, canteen_id):
+        """
+        Totals and aspect sums of every reviewed dish of a canteen
+
+        Reads one totals row and at most one row per aspect for each dish.
+        Returns: {dish_id: {"reviews", "positive", "neutral", "negative", "score_sum",
+                            "aspects": {aspect: (count, score_sum)}}}
+        """
+        conn = self._connection()
+        dishes = {
+            row[0]: {**dict(zip(TOTAL_FIELDS, row[1:])), "aspects": {}}
+            for row in conn.execute(
+                "SELECT dish_id, reviews, positive, neutral, negative, score_sum FROM sentiment_totals "
+                "WHERE canteen_id = ? AND dish_id != ? AND reviews > 0", (canteen_id, CANTEEN_WIDE)
+            )
+        }
+        for dish_id, aspect, count, score_sum in conn.execute(
+            "SELECT dish_id, aspect, count, score_sum FROM aspect_scores "
+            "WHERE canteen_id = ? AND dish_id != ? AND count > 0 ORDER BY aspect", (canteen_id, CANTEEN_WIDE)
+        ):
+            if dish_id in dishes:
+                dishes[dish_id]["aspects"][aspect] = (count, score_sum)
+        return dishes
+
+    def all_dish_totals(self):
+        """Review count and score sum of every reviewed dish, across canteens: {dish_id: (reviews, score_sum)}"""
+        return {
+            dish_id: (reviews, score_sum)
+            for dish_id, reviews, score_sum in self._connection().execute(
+                "SELECT dish_id, SUM(reviews), SUM(score_sum) FROM sentiment_totals "
+                "WHERE dish_id != ? AND reviews > 0 GROUP BY dish_id", (CANTEEN_WIDE,)
+            )
+        }
+
+    def trend_buckets(self, canteen_id, period, start, end, dish_id=None):
+        """
+        Non-empty trend buckets of a canteen (or one of its dishes) overlapping start..end
+
+        period: 'day' or 'week'; start, end: datetime.date (inclusive)
+        Returns: [{"start": 'YYYY-MM-DD', "reviews", "positive", "neutral", "negative", "score_sum"}, ...]
+        """
+        first = _week_start(start) if period == 'week' else start
+        rows = self._connection().execute(
+            "SELECT start, reviews, positive, neutral, negative, score_sum FROM trend_buckets "
+            "WHERE canteen_id = ? AND dish_id = ? AND period = ? AND start BETWEEN ? AND ? AND reviews > 0 "
+            "ORDER BY start",
+            (canteen_id, dish_id or CANTEEN_WIDE, period, first.isoformat(), end.isoformat())
+        )
+        return [dict(zip(BUCKET_FIELDS, row)) for row in rows]
+
+    def range_totals(self, canteen_id, start, end, dish_id=None):
+        """
+        Totals of a canteen (or one of its dishes) over start..end (datetime.date, inclusive)
+
+        Whole Monday-to-Sunday weeks inside the range are read from weekly
+        buckets and only the days at its edges from daily ones, so a range
+        costs at most 12 daily rows plus one row per week.
+        Returns: {"reviews", "positive", "neutral", "negative", "score_sum"}
+        """
+        first_week = start + timedelta(days=-start.weekday() % 7)  # First Monday on or after start
+        last_week = _week_start(end + timedelta(days=1)) - timedelta(days=7)  # Last week ending by end
+        if first_week > last_week:
+            ranges = [('day', start, end)]
+        else:
+            ranges = [
+                ('day', start, first_week - timedelta(days=1)),
+                ('week', first_week, last_week),
+                ('day', last_week + timedelta(days=7), end)
+            ]
+        conditions = ' OR '.join('(period = ? AND start BETWEEN ? AND ?)' for _ in ranges)
+        params = [value for period, first, last in ranges for value in (period, first.isoformat(), last.isoformat())]
+        totals = self._connection().execute(
+            "SELECT COALESCE(SUM(reviews), 0), COALESCE(SUM(positive), 0), COALESCE(SUM(neutral), 0), "
+            "COALESCE(SUM(negative), 0), COALESCE(SUM(score_sum), 0.0) FROM trend_buckets "
+            f"WHERE canteen_id = ? AND dish_id = ? AND ({conditions})",
+            [canteen_id, dish_id or CANTEEN_WIDE, *params]
+        ).fetchone()
+        return dict(zip(TOTAL_FIELDS, totals))
+
+    def latest_day(self, canteen_id, dish_id=None):
+        """datetime.date of the most recent review of a canteen (or dish), None if it has none"""
+        row = self._connection().execute(
+            "SELECT MAX(start) FROM trend_buckets WHERE canteen_id = ? AND dish_id = ? AND period = 'day' AND reviews > 0",
+            (canteen_id, dish_id or CANTEEN_WIDE)
+        ).fetchone()
+        return date.fromisoformat(row[0]) if row[0] else None
+
+    def stats(self):
+        """Canteens, dishes and reviews recorded"""
+        conn = self._connection()
+        canteens, dishes, reviews = conn.execute(
+            "SELECT COALESCE(SUM(dish_id = ?), 0), COALESCE(SUM(dish_id != ?), 0), "
+            "COALESCE(SUM(CASE WHEN dish_id = ? THEN reviews END), 0) FROM sentiment_totals WHERE reviews > 0",
+            (CANTEEN_WIDE,) * 3
+        ).fetchone()
+        return {"path": self.path, "canteens": canteens, "dishes": dishes, "reviews": reviews}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # Autocommit mode; record() manages its own transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                with self._schema_lock:
+                    self._prepare_schema(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _prepare_schema(self, conn):
+        """Create the tables, rebuilding the aggregates if they were made by an older release"""
+        conn.execute(REVIEWS_SCHEMA)
+        if conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another worker may have migrated while this one waited for the lock
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                for table in AGGREGATE_TABLES + RETIRED_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in AGGREGATE_SCHEMA:
+                    conn.execute(statement)
+                deltas = _Deltas()
+                for row in conn.execute("SELECT * FROM reviews"):
+                    deltas.add(tuple(row), 1)
+                deltas.apply(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                print(f"Sentiment aggregates rebuilt for schema version {SCHEMA_VERSION}")
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _recorded(self, conn, review_ids):
+        """{review_id: row} of the reviews already recorded"""
+        recorded = {}
+        for i in range(0, len(review_ids), LOOKUP_CHUNK):
+            chunk = review_ids[i:i + LOOKUP_CHUNK]
+            for row in conn.execute(
+                f"SELECT * FROM reviews WHERE review_id IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                recorded[row[0]] = tuple(row)
+        return recorded
+
+
+class _Deltas:
+    """Summed changes to the aggregate tables, applied with one upsert per row"""
+
+    def __init__(self):
+        self.totals = {}  # {(canteen_id, dish_id): [reviews, positive, neutral, negative, score_sum]}
+        self.keywords = {}  # {(canteen_id, dish_id, keyword): [polarity, count]}
+        self.aspects = {}  # {(canteen_id, dish_id, aspect): [count, score_sum]}
+        self.buckets = {}  # {(canteen_id, dish_id, period, start): [reviews, positive, neutral, negative, score_sum]}
+
+    def add(self, row, sign):
+        """Add (sign 1) or take back (sign -1) one review row's contribution"""
+        _, canteen_id, dish_id, day, sentiment, score, keywords, aspects = row
+        keywords = json.loads(keywords)
+        aspects = json.loads(aspects)
+        week = _week_start(date.fromisoformat(day)).isoformat()
+        for scope in {CANTEEN_WIDE, dish_id or CANTEEN_WIDE}:
+            for sums in (
+                self.totals.setdefault((canteen_id, scope), [0, 0, 0, 0, 0.0]),
+                self.buckets.setdefault((canteen_id, scope, 'day', day), [0, 0, 0, 0, 0.0]),
+                self.buckets.setdefault((canteen_id, scope, 'week', week), [0, 0, 0, 0, 0.0])
+            ):
+                sums[0] += sign
+                sums[1 + SENTIMENTS.index(sentiment)] += sign
+                sums[4] += sign * score
+            for keyword, polarity in keywords:
+                self.keywords.setdefault((canteen_id, scope, keyword), [polarity, 0])[1] += sign
+            for aspect, aspect_score in aspects.items():
+                sums = self.aspects.setdefault((canteen_id, scope, aspect), [0, 0.0])
+                sums[0] += sign
+                sums[1] += sign * aspect_score
+
+    def apply(self, conn):
+        conn.executemany(
+            "INSERT INTO sentiment_totals VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (canteen_id, dish_id) DO UPDATE SET "
+            "reviews = reviews + excluded.reviews, positive = positive + excluded.positive, "
+            "neutral = neutral + excluded.neutral, negative = negative + excluded.negative, "
+            "score_sum = score_sum + excluded.score_sum",
+            [(*key, *sums) for key, sums in self.totals.items()]
+        )
+        conn.executemany(
+            "INSERT INTO keyword_counts VALUES (?, ?, ?, ?, ?) ON CONFLICT (canteen_id, dish_id, keyword) DO UPDATE SET "
+            "polarity = excluded.polarity, count = count + excluded.count",
+            [(*key, polarity, count) for key, (polarity, count) in self.keywords.items()]
+        )
+        conn.executemany(
+            "INSERT INTO aspect_scores VALUES (?, ?, ?, ?, ?) ON CONFLICT (canteen_id, dish_id, aspect) DO UPDATE SET "
+            "count = count + excluded.count, score_sum = score_sum + excluded.score_sum",
+            [(*key, *sums) for key, sums in self.aspects.items()]
+        )
+        conn.executemany(
+            "INSERT INTO trend_buckets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (canteen_id, dish_id, period, start) DO UPDATE SET "
+            "reviews = reviews + excluded.reviews, positive = positive + excluded.positive, "
+            "neutral = neutral + excluded.neutral, negative = negative + excluded.negative, "
+            "score_sum = score_sum + excluded.score_sum",
+            [(*key, *sums) for key, sums in self.buckets.items()]
+        )
+
+
+def _review_row(entry):
+    """The reviews table row of an entry (keywords and aspects as canonical JSON)"""
+    return (
+        str(entry['review_id']),
+        str(entry['canteen_id']),
+        None if entry.get('dish_id') is None else str(entry['dish_id']),
+        entry['day'],
+        entry['sentiment'],
+        float(entry['score']),
+        json.dumps([list(pair) for pair in entry['keywords']]),
+        json.dumps(entry['aspects'], sort_keys=True)
+    )
+
+
+def _week_start(day):
+    """Monday of a date's week"""
+    return day - timedelta(days=day.weekday())
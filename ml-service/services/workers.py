@@ -0,0 +1,65 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Imported once by the fork server, so pool workers start with them loaded
+WORKER_PRELOAD = ['services.forecasting', 'services.sentiment', 'statsmodels.tsa.holtwinters']
+
+_pool = None  # Shared ProcessPoolExecutor of this process, created on first use
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _start_context():
+    """
+    Start method for pool workers
+
+    A fork server where available rather than a plain fork: the service runs
+    job, warm-up and model watcher threads, and forking it would copy import
+    and allocator locks they hold into the children. Windows has no fork
+    server, so workers are spawned there.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # Only applies when the fork server starts, i.e. before the first pool
+    context.set_forkserver_preload(WORKER_PRELOAD)
+    return context
+
+
+def _shared_pool(max_workers):
+    """This process's pool, replaced by a larger one when more workers are asked for"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or max_workers > _pool_size:
+            if _pool is not None:
+                # Work already submitted to it still finishes
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_start_context())
+            _pool_size = max_workers
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next call starts a new one"""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_size = None, 0
+
+
+def pool_map(fn, items, max_workers, chunksize=1):
+    """
+    fn over items on the shared process pool, yielding results in order
+
+    The pool's worker processes are started on first use and kept for
+    later calls, so batches don't pay process start-up and the
+    WORKER_PRELOAD imports every time. fn must be module-level (picklable).
+    """
+    pool = _shared_pool(max_workers)
+    try:
+        yield from pool.map(fn, items, chunksize=chunksize)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
@@ -5,12 +5,15 @@ import {
   getPopularDishes,
   forecastDishDemand,
   forecastCanteenDemand,
+  forecastBatchDemand,
   analyzeSentiment,
   analyzeBatchSentiment,
   getDishSentimentSummary,
   getCanteenSentimentSummary,
+  getCanteenDishRankings,
   trainRecommendationModel,
   trainForecastingModel,
+  getTrainingJob,
   checkMLServiceHealth
 } from '../controllers/mlController.js';
 import { protect, authorize } from '../middleware/auth.js';
@@ -57,6 +60,14 @@ router.post(
   forecastCanteenDemand
 );
 
+// Forecast demand for every dish of several canteens
+router.post(
+  '/forecast/batch',
+  protect,
+  authorize('canteen_owner'),
+  forecastBatchDemand
+);
+
 // Train forecasting model (admin only)
 router.post(
   '/forecast/train',
@@ -65,6 +76,14 @@ router.post(
   trainForecastingModel
 );
 
+// Training job status (admin only)
+router.get(
+  '/jobs/:jobId',
+  protect,
+  authorize('canteen_owner'),
+  getTrainingJob
+);
+
 // ==================== SENTIMENT ANALYSIS ROUTES ====================
 
 // Analyze single text
@@ -84,4 +103,12 @@ router.get(
   getCanteenSentimentSummary
 );
 
+// Best and worst reviewed dishes of a canteen
+router.get(
+  '/sentiment/canteen/:canteenId/dishes',
+  protect,
+  authorize('canteen_owner'),
+  getCanteenDishRankings
+);
+
 export default router;
@@ -230,6 +230,7 @@ async function populateDummyData() {
       
       const trainingData = orderData.map(order => ({
         student: order.student.toString(),
+        canteen: order.canteen ? order.canteen.toString() : null,
         items: order.items.map(item => ({
           dish: item.dish._id.toString(),
           quantity: item.quantity
@@ -244,9 +245,19 @@ async function populateDummyData() {
       );
 
       if (response.data.success) {
-        console.log(`  ✓ Model trained successfully`);
-        console.log(`    - Users: ${response.data.metrics.users_count}`);
-        console.log(`    - Items: ${response.data.metrics.items_count}`);
+        // Training runs as a background job; poll until it finishes
+        let job = response.data.job;
+        while (job.status === 'queued' || job.status === 'running') {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          job = (await axios.get(`${ML_SERVICE_URL}/api/jobs/${job.job_id}`, { timeout: 5000 })).data.job;
+        }
+        if (job.status === 'succeeded') {
+          console.log(`  ✓ Model trained successfully`);
+          console.log(`    - Users: ${job.result.users_count}`);
+          console.log(`    - Items: ${job.result.items_count}`);
+        } else {
+          console.log(`  ⚠ Recommendation training failed: ${job.error}`);
+        }
       }
     } catch (error) {
       console.log(`  ⚠ Recommendation training failed: ${error.message}`);
@@ -3,6 +3,21 @@ import dotenv from 'dotenv';
 
 dotenv.config();
 
+const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001';
+
+// Training runs as a background job on the ML service; poll until it finishes
+async function waitForJob(jobId, intervalMs = 2000) {
+  while (true) {
+    const response = await fetch(`${ML_SERVICE_URL}/api/jobs/${jobId}`);
+    const { job } = await response.json();
+    if (job.status === 'succeeded' || job.status === 'failed') {
+      return job;
+    }
+    console.log(`   ... ${job.status} (${Math.round(job.progress * 100)}%${job.stage ? `, ${job.stage}` : ''})`);
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
 async function trainModels() {
   try {
     await mongoose.connect(process.env.MONGODB_URI);
@@ -23,9 +38,10 @@ async function trainModels() {
       process.exit(1);
     }
 
-    // Format orders for ML service
+    // Format orders for ML service; each canteen's orders train its own model
     const formattedOrders = orders.map(o => ({
       student: o.student.toString(),
+      canteen: o.canteen ? o.canteen.toString() : null,
       items: o.items.map(item => ({
         dish: item.dish.toString()
       })),
@@ -34,7 +50,6 @@ async function trainModels() {
 
     // Call ML service training endpoint
     console.log('🤖 Training recommendation model...');
-    const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001';
     const trainResponse = await fetch(`${ML_SERVICE_URL}/api/recommendations/train`, {
       method: 'POST',
       headers: {
@@ -47,11 +62,17 @@ async function trainModels() {
     console.log('✅ Model training response:', trainResult);
 
     if (trainResult.success) {
-      console.log('\n🎉 Recommendation model trained successfully!');
-      console.log(`   - Users: ${trainResult.metrics.users_count}`);
-      console.log(`   - Items: ${trainResult.metrics.items_count}`);
-      console.log(`   - Popular items: ${trainResult.metrics.popular_items_count}`);
-      console.log(`   - Association rules: ${trainResult.metrics.association_rules_count}`);
+      const job = await waitForJob(trainResult.job.job_id);
+      if (job.status === 'succeeded') {
+        console.log(`\n🎉 Recommendation model trained successfully in ${job.run_seconds}s!`);
+        console.log(`   - Users: ${job.result.users_count}`);
+        console.log(`   - Items: ${job.result.items_count}`);
+        console.log(`   - Popular items: ${job.result.popular_items_count}`);
+        console.log(`   - Association rules: ${job.result.association_rules_count}`);
+        console.log(`   - Canteen models: ${Object.keys(job.result.canteens || {}).length}`);
+      } else {
+        console.log(`❌ Training job failed: ${job.error}`);
+      }
     }
 
     await mongoose.disconnect();